@@ -0,0 +1,472 @@
+from collections import OrderedDict, deque
+
+from srs import ORIENTATIONS, KICKS, spawn_x
+from engine import (
+    GRID_WIDTH, GRID_HEIGHT, ACTION_LEFT, ACTION_RIGHT, ACTION_SOFT_DROP,
+    ACTION_ROTATE_CW, ACTION_ROTATE_CCW, ACTION_HARD_DROP, ACTION_HOLD,
+)
+
+# =================================================================
+# Placement-search autoplayer. For the current piece it finds every
+# final resting place the engine's moves can actually reach: straight
+# drops for each rotation x column, plus (when the stack has overhangs)
+# slides and SRS kicks off the floor for tucks and spins. Each result
+# board is scored with a weighted heuristic:
+#
+#   score = HEIGHT * aggregate height + LINES * lines cleared
+#         + HOLES * holes + BUMPINESS * bumpiness
+#
+# The AI works on plain lists of row ints (same layout as BitBoard.rows)
+# so nothing here touches the live engine. Evaluations and decisions
+# are memoized in bounded LRU tables keyed by the board's hash.
+#
+# AIInput turns the decisions into engine actions, one per tick, and
+# plugs into bench.py/runner.py as the 'ai' input and into the game's
+# demo mode.
+# =================================================================
+
+# Weights from the classic 4-feature evaluator (aggregate height,
+# complete lines, holes, bumpiness)
+HEIGHT_WEIGHT = -0.510066
+LINES_WEIGHT = 0.760666
+HOLES_WEIGHT = -0.35663
+BUMPINESS_WEIGHT = -0.184483
+WEIGHTS = (HEIGHT_WEIGHT, LINES_WEIGHT, HOLES_WEIGHT, BUMPINESS_WEIGHT)
+
+CACHE_SIZE = 1 << 16
+BEAM_WIDTH = 4  # Candidates expanded per level of next-queue lookahead
+
+# Not an engine action: the controller keeps soft-dropping until the
+# piece lands, whatever gravity did in the meantime
+ACTION_SONIC_DROP = -1
+
+FULL_ROW = (1 << GRID_WIDTH) - 1
+
+# Orientation masks pre-shifted to every legal column:
+# SHIFTED[piece][rotation][x] -> one int per piece row
+SHIFTED = tuple(
+    tuple(tuple(tuple(mask << x for mask in o.masks)
+                for x in range(GRID_WIDTH - o.width + 1))
+          for o in states)
+    for states in ORIENTATIONS
+)
+
+# Highest and lowest filled row of each piece column:
+# COLUMNS[piece][rotation] -> ((column, top, bottom), ...)
+COLUMNS = tuple(
+    tuple(tuple((cx, min(y for x, y in o.cells if x == cx), max(y for x, y in o.cells if x == cx))
+                for cx in range(o.width))
+          for o in states)
+    for states in ORIENTATIONS
+)
+
+
+def fits(rows, shifted, x, y):
+    if x < 0 or x >= len(shifted):
+        return False
+    for mask in shifted[x]:
+        if y >= GRID_HEIGHT or (y >= 0 and rows[y] & mask):
+            return False
+        y += 1
+    return True
+
+
+def column_tops(rows):
+    # Index of the highest filled row per column, GRID_HEIGHT if empty
+    tops = [GRID_HEIGHT] * GRID_WIDTH
+    seen = 0
+    for y, row in enumerate(rows):
+        new = row & ~seen
+        while new:
+            low = new & -new
+            tops[low.bit_length() - 1] = y
+            new ^= low
+        seen |= row
+        if seen == FULL_ROW:
+            break
+    return tops
+
+
+def landing_y(rows, tops, shape_idx, rotation, x, y):
+    # Straight off the column tops when the piece is above them all,
+    # otherwise (under an overhang) row by row
+    land = min(tops[x + cx] - 1 - bottom for cx, _, bottom in COLUMNS[shape_idx][rotation])
+    if land >= y:
+        return land
+    shifted = SHIFTED[shape_idx][rotation]
+    while fits(rows, shifted, x, y + 1):
+        y += 1
+    return y
+
+
+def count_holes(rows):
+    # Empty cells with a filled cell somewhere above them
+    seen = 0
+    holes = 0
+    for row in rows:
+        seen |= row
+        holes += bin(seen & ~row).count("1")
+    return holes
+
+
+def evaluate(rows, lines, weights=WEIGHTS):
+    height_w, lines_w, holes_w, bumpiness_w = weights
+    heights = [0] * GRID_WIDTH
+    seen = 0
+    holes = 0
+    height = GRID_HEIGHT
+    for row in rows:
+        if seen or row:
+            new = row & ~seen
+            while new:
+                low = new & -new
+                heights[low.bit_length() - 1] = height
+                new ^= low
+            seen |= row
+            holes += bin(seen & ~row).count("1")
+        height -= 1
+    bumpiness = 0
+    for a, b in zip(heights, heights[1:]):
+        bumpiness += a - b if a > b else b - a
+    return (height_w * sum(heights) + lines_w * lines
+            + holes_w * holes + bumpiness_w * bumpiness)
+
+
+def place(rows, shifted, x, y):
+    # New row list with the piece added and full rows removed;
+    # returns (rows, lines cleared)
+    rows = list(rows)
+    for mask in shifted[x]:
+        if y >= 0:
+            rows[y] |= mask
+        y += 1
+    if FULL_ROW not in rows:
+        return rows, 0
+    kept = [row for row in rows if row != FULL_ROW]
+    lines = GRID_HEIGHT - len(kept)
+    return [0] * lines + kept, lines
+
+
+def reachable(rows, tops, shape_idx, rotation, x, y, tucks=True):
+    # Every final resting place reachable from (rotation, x, y), as a
+    # list of (rotation, x, y) plus the parent links for path_to().
+    #
+    # First the straight drops: each rotation the piece can turn into
+    # where it is, slid to every column it can reach, then dropped.
+    # Without overhangs that is every reachable spot; with them
+    # (`tucks`) the landed states are searched further by sliding and
+    # rotating along the floor and dropping again, for tucks and spins
+    shifted = SHIFTED[shape_idx]
+    kicks = KICKS[shape_idx]
+    start = (rotation, x, y)
+    parents = {start: None}
+
+    turned = [start]
+    cw = rotated(rows, shifted, kicks, start, 0)
+    ccw = rotated(rows, shifted, kicks, start, 1)
+    flip = cw and rotated(rows, shifted, kicks, cw, 0)
+    for state, prev, action in ((cw, start, ACTION_ROTATE_CW), (ccw, start, ACTION_ROTATE_CCW),
+                                (flip, cw, ACTION_ROTATE_CW)):
+        if state is not None and state not in parents:
+            parents[state] = (prev, action)
+            turned.append(state)
+
+    finals = []
+    for state in turned:
+        rot, sx, sy = state
+        shifted_rot = shifted[rot]
+        row = [state]
+        for action, dx in ((ACTION_LEFT, -1), (ACTION_RIGHT, 1)):
+            prev = state
+            px = sx + dx
+            while fits(rows, shifted_rot, px, sy):
+                here = (rot, px, sy)
+                if here in parents:
+                    break
+                parents[here] = (prev, action)
+                row.append(here)
+                prev = here
+                px += dx
+
+        for here in row:
+            land = (rot, here[1], landing_y(rows, tops, shape_idx, rot, here[1], sy))
+            if land == here:
+                finals.append(here)
+            elif land not in parents:
+                parents[land] = (here, ACTION_SONIC_DROP)
+                finals.append(land)
+
+    if not tucks:
+        return finals, parents
+
+    queue = deque(finals)
+    while queue:
+        state = queue.popleft()
+        rot, sx, sy = state
+        moves = [((rot, sx + dx, sy), action)
+                 for action, dx in ((ACTION_LEFT, -1), (ACTION_RIGHT, 1))
+                 if fits(rows, shifted[rot], sx + dx, sy)]
+        for direction in (0, 1):
+            turn = rotated(rows, shifted, kicks, state, direction)
+            if turn is not None:
+                moves.append((turn, ACTION_ROTATE_CW if direction == 0 else ACTION_ROTATE_CCW))
+
+        for here, action in moves:
+            if here in parents:
+                continue
+            parents[here] = (state, action)
+            rot, hx, hy = here
+            land = (rot, hx, landing_y(rows, tops, shape_idx, rot, hx, hy))
+            if land != here:
+                if land in parents:
+                    continue
+                parents[land] = (here, ACTION_SONIC_DROP)
+            finals.append(land)
+            queue.append(land)
+
+    return finals, parents
+
+
+def rotated(rows, shifted, kicks, state, direction):
+    # State after an SRS rotation (direction 0 = clockwise), or None
+    rot, x, y = state
+    target = (rot + 1) % 4 if direction == 0 else (rot - 1) % 4
+    if shifted[target] == shifted[rot]:
+        return None  # O piece, rotating changes nothing
+    for dx, dy in kicks[rot][direction]:
+        if fits(rows, shifted[target], x + dx, y + dy):
+            return (target, x + dx, y + dy)
+    return None
+
+
+def path_to(parents, state):
+    # Actions from the start state to `state`, ending in a hard drop
+    actions = []
+    while parents[state] is not None:
+        state, action = parents[state]
+        actions.append(action)
+    actions.reverse()
+    while actions and actions[-1] == ACTION_SONIC_DROP:
+        actions.pop()
+    actions.append(ACTION_HARD_DROP)
+    return actions
+
+
+class Placement:
+    __slots__ = ('shape_idx', 'rotation', 'x', 'y', 'hold', 'score', 'lines', 'actions')
+
+    def __init__(self, shape_idx, rotation, x, y, hold, score, lines, actions):
+        self.shape_idx = shape_idx
+        self.rotation = rotation
+        self.x = x
+        self.y = y
+        self.hold = hold
+        self.score = score
+        self.lines = lines
+        self.actions = actions
+
+    def __repr__(self):
+        return (f"Placement(piece={self.shape_idx}, rotation={self.rotation}, x={self.x}, "
+                f"y={self.y}, hold={self.hold}, score={self.score:.3f})")
+
+
+class LRUCache:
+    def __init__(self, max_size=CACHE_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self):
+        self.entries.clear()
+
+
+class AI:
+    def __init__(self, weights=WEIGHTS, depth=1, use_hold=True, beam=BEAM_WIDTH,
+                 cache_size=CACHE_SIZE):
+        self.weights = weights
+        self.depth = depth
+        self.use_hold = use_hold
+        self.beam = beam
+        self.evaluations = LRUCache(cache_size)  # board -> heuristic score
+        self.decisions = LRUCache(cache_size)    # (board, pieces) -> Placement
+
+    def candidates(self, rows, shape_idx, start=None, tops=None, holes=None):
+        # [(score, lines, (rotation, x, y), parents)] for every reachable
+        # final placement of one piece, best first. `tops`/`holes` can
+        # come from a BitBoard's incremental features instead of a scan
+        if start is None:
+            start = (0, spawn_x(shape_idx, GRID_WIDTH), 0)
+        rotation, x, y = start
+        if not fits(rows, SHIFTED[shape_idx][rotation], x, y):
+            return []
+
+        if tops is None:
+            tops = column_tops(rows)
+            holes = count_holes(rows)
+        finals, parents = reachable(rows, tops, shape_idx, rotation, x, y, holes > 0)
+        heights = [GRID_HEIGHT - top for top in tops]
+        result = []
+        for state in finals:
+            score, lines = self.score(rows, tops, heights, holes, shape_idx, state)
+            result.append((score, lines, state, parents))
+        result.sort(key=lambda c: c[0], reverse=True)
+        return result
+
+    def score(self, rows, tops, heights, holes, shape_idx, state):
+        # Heuristic for the board after `state` locks. A piece dropped
+        # straight onto the column tops without clearing lines only
+        # changes its own columns, so that common case is scored from
+        # the tops alone; anything else goes through evaluate()
+        rot, x, y = state
+        shifted = SHIFTED[shape_idx][rot][x]
+        row = y
+        for mask in shifted:
+            if row >= 0 and rows[row] | mask == FULL_ROW:
+                break
+            row += 1
+        else:
+            heights = heights[:]
+            for cx, top, bottom in COLUMNS[shape_idx][rot]:
+                column = x + cx
+                gap = tops[column] - 1 - (y + bottom)
+                if gap < 0:
+                    break  # Tucked under an overhang
+                holes += gap
+                heights[column] = GRID_HEIGHT - y - top
+            else:
+                height_w, _, holes_w, bumpiness_w = self.weights
+                bumpiness = 0
+                for a, b in zip(heights, heights[1:]):
+                    bumpiness += a - b if a > b else b - a
+                return height_w * sum(heights) + holes_w * holes + bumpiness_w * bumpiness, 0
+
+        after, lines = place(rows, SHIFTED[shape_idx][rot], x, y)
+        key = hash(tuple(after))
+        score = self.evaluations.get(key)
+        if score is None:
+            score = evaluate(after, lines, self.weights)
+            self.evaluations.put(key, score)
+        return score, lines
+
+    def best_score(self, rows, queue):
+        # Best heuristic reachable by placing the pieces in `queue` in order
+        candidates = self.candidates(rows, queue[0])
+        if not candidates:
+            return float('-inf')
+        if len(queue) == 1:
+            return candidates[0][0]
+        return max(self.best_score(self.after(rows, queue[0], c[2]), queue[1:])
+                   for c in candidates[:self.beam])
+
+    @staticmethod
+    def after(rows, shape_idx, state):
+        rot, x, y = state
+        return place(rows, SHIFTED[shape_idx][rot], x, y)[0]
+
+    def plan(self, rows, shape_idx, start, lookahead, hold, tops=None, holes=None):
+        candidates = self.candidates(rows, shape_idx, start, tops, holes)
+        if not candidates:
+            return None
+        if lookahead:
+            scored = [(self.best_score(self.after(rows, shape_idx, c[2]), lookahead), c)
+                      for c in candidates[:self.beam]]
+            score, best = max(scored, key=lambda s: s[0])
+        else:
+            best = candidates[0]
+            score = best[0]
+        _, lines, state, parents = best
+        rotation, x, y = state
+        actions = [ACTION_HOLD] if hold else path_to(parents, state)
+        return Placement(shape_idx, rotation, x, y, hold, score, lines, actions)
+
+    def choose(self, engine):
+        # Best Placement for the engine's current piece; with hold, its
+        # actions are just [ACTION_HOLD] and the caller asks again for
+        # the piece that comes in
+        piece = engine.current_piece
+        grid = engine.grid
+        rows = grid.rows
+        upcoming = [p.shape_idx for p in engine.next_pieces]
+        lookahead = upcoming[:self.depth - 1]
+        hold_piece = engine.held_piece.shape_idx if engine.held_piece else None
+        can_hold = self.use_hold and engine.can_hold
+
+        key = (hash(tuple(rows)), piece.shape_idx, piece.rotation, piece.x, piece.y,
+               tuple(lookahead), hold_piece if can_hold else -1)
+        placement = self.decisions.get(key)
+        if placement is not None:
+            return placement
+
+        placement = self.plan(rows, piece.shape_idx, (piece.rotation, piece.x, piece.y),
+                              lookahead, False, grid.tops, grid.hole_count)
+        if can_hold:
+            # Holding swaps in the held piece, or the next one when empty
+            if hold_piece is None:
+                swap, swap_lookahead = upcoming[0], upcoming[1:self.depth]
+            else:
+                swap, swap_lookahead = hold_piece, lookahead
+            if swap != piece.shape_idx:
+                alternative = self.plan(rows, swap, None, swap_lookahead, True,
+                                        grid.tops, grid.hole_count)
+                if alternative is not None and (placement is None or alternative.score > placement.score):
+                    placement = alternative
+
+        if placement is None:
+            placement = Placement(piece.shape_idx, piece.rotation, piece.x, piece.y,
+                                  False, float('-inf'), 0, [ACTION_HARD_DROP])
+        self.decisions.put(key, placement)
+        return placement
+
+
+class AIInput:
+    # Input policy (same interface as bench.py's): returns the next
+    # engine action for this tick, or None while waiting on a cooldown
+    def __init__(self, seed=None, ai=None):
+        self.ai = ai or AI()
+        self.piece = None
+        self.queue = []
+
+    def __call__(self, engine):
+        piece = engine.current_piece
+        if piece is not self.piece:
+            self.piece = piece
+            self.queue = list(self.ai.choose(engine).actions)
+
+        while self.queue:
+            action = self.queue[0]
+            if action == ACTION_SONIC_DROP:
+                if engine.grid.collides(piece.masks, piece.x, piece.y + 1):
+                    self.queue.pop(0)
+                    continue
+                # Stays queued until the piece lands
+                return ACTION_SOFT_DROP if self.ready(engine, piece, ACTION_SOFT_DROP) else None
+            if not self.ready(engine, piece, action):
+                return None
+            return self.queue.pop(0)
+        return None
+
+    @staticmethod
+    def ready(engine, piece, action):
+        if action in (ACTION_ROTATE_CW, ACTION_ROTATE_CCW):
+            return engine.ticks - piece.last_rotate_tick >= piece.rotate_cooldown
+        if action in (ACTION_LEFT, ACTION_RIGHT, ACTION_SOFT_DROP):
+            return engine.ticks - piece.last_move_tick >= piece.move_cooldown
+        return True
@@ -0,0 +1,203 @@
+import os
+import time
+import queue
+import threading
+from array import array
+
+import pygame
+
+# =================================================================
+# Audio subsystem. Nothing here blocks the game loop:
+#
+#  - The mixer is opened on a background thread, so the audio device
+#    doesn't hold up the first frame.
+#  - Sound effects are loaded and decoded on a background thread; a
+#    sound asked for before it's ready is simply skipped.
+#  - Each category gets its own reserved mixer channels, so a burst of
+#    move clicks can only ever take over the move channel, never the
+#    drop/UI ones.
+#  - Repeats of the same effect inside its MIN_INTERVAL are coalesced.
+#  - Music is streamed from disk by pygame.mixer.music instead of being
+#    decoded into memory; loading the stream also happens on the
+#    background thread.
+#
+# Files are looked up next to this module, not in the working dir.
+# =================================================================
+
+SOUND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sounds")
+
+# Sound effect -> category; every category has its own channels
+SOUNDS = {
+    'move': 'move',
+    'rotate': 'move',
+    'drop': 'sfx',
+    'hold': 'ui',
+    'gameover': 'ui',
+}
+CHANNELS = {'move': 1, 'sfx': 2, 'ui': 2}
+
+# Streamed background tracks
+MUSIC = {
+    'menu': "menu.wav",
+    'gameplay': "gameplay.wav",
+}
+
+# Seconds within which a repeat of the same effect is dropped
+MIN_INTERVAL = {'move': 0.04, 'rotate': 0.04, 'drop': 0.05}
+
+MUSIC_VOLUME = 0.5
+SFX_VOLUME = 0.7
+FALLBACK_TONE = 0.03  # Seconds of the beep used when a file is missing
+
+
+def music_type(path):
+    # The bundled .wav tracks are really MP3s; mixer.Sound sniffs the
+    # data but mixer.music goes by the name, so give it a hint
+    with open(path, 'rb') as f:
+        head = f.read(3)
+    if head == b'ID3' or head[:2] in (b'\xff\xfb', b'\xff\xf3', b'\xff\xf2'):
+        return "mp3"
+    return ""
+
+
+class SoundManager:
+    def __init__(self, sound_dir=SOUND_DIR, music_volume=MUSIC_VOLUME, sfx_volume=SFX_VOLUME):
+        self.sound_dir = sound_dir
+        self.music_volume = music_volume
+        self.sfx_volume = sfx_volume
+        self.sounds = {}
+        self.missing = []
+        self.last_played = {}
+        self.current_music = None
+        self.channels = {}
+        self.next_channel = {}
+        self.jobs = queue.Queue()
+        self.lock = threading.Lock()
+        self.enabled = False  # Set once the mixer is up
+        self.failed = False   # No audio device: everything is a no-op
+
+        self.worker = threading.Thread(target=self._work, name="audio", daemon=True)
+        self.worker.start()
+        self.jobs.put((self._init_mixer, None))
+        for name in SOUNDS:
+            self.jobs.put((self._load, name))
+
+    def _init_mixer(self, _):
+        if not pygame.mixer.get_init():
+            try:
+                pygame.mixer.init()
+            except pygame.error:
+                self.failed = True
+                return
+
+        # Reserve the first channels per category; the rest stay free
+        # for anything else that calls Sound.play()
+        total = sum(CHANNELS.values())
+        pygame.mixer.set_num_channels(max(pygame.mixer.get_num_channels(), total + 2))
+        pygame.mixer.set_reserved(total)
+        index = 0
+        for category, count in CHANNELS.items():
+            self.channels[category] = [pygame.mixer.Channel(index + i) for i in range(count)]
+            self.next_channel[category] = 0
+            index += count
+        self.enabled = True
+
+    def _work(self):
+        while True:
+            job, arg = self.jobs.get()
+            if job is None:
+                return
+            try:
+                job(arg)
+            except pygame.error:
+                pass  # A bad file or a closed mixer mustn't kill the thread
+
+    def _load(self, name):
+        if not self.enabled:
+            return
+        path = os.path.join(self.sound_dir, f"{name}.wav")
+        try:
+            sound = pygame.mixer.Sound(path)
+        except (pygame.error, FileNotFoundError):
+            self.missing.append(name)
+            sound = self._fallback()
+        sound.set_volume(self.sfx_volume)
+        with self.lock:
+            self.sounds[name] = sound
+
+    def _fallback(self):
+        # Short square-wave beep in the mixer's own format
+        frequency, size, channels = pygame.mixer.get_init()
+        amplitude = (1 << (abs(size) - 1)) // 8
+        period = max(2, frequency // 440)
+        samples = int(frequency * FALLBACK_TONE)
+        code = {8: 'b', 16: 'h', 32: 'i'}.get(abs(size), 'h')
+        tone = array(code, (amplitude if i % period < period // 2 else -amplitude
+                            for i in range(samples) for _ in range(channels)))
+        return pygame.mixer.Sound(buffer=tone.tobytes())
+
+    def play(self, name):
+        if not self.enabled:
+            return
+        if name in MUSIC:
+            self.play_music(name)
+            return
+        sound = self.sounds.get(name)
+        if sound is None:
+            return  # Still loading
+
+        now = time.perf_counter()
+        interval = MIN_INTERVAL.get(name)
+        if interval and now - self.last_played.get(name, -interval) < interval:
+            return
+        self.last_played[name] = now
+
+        category = SOUNDS[name]
+        channels = self.channels[category]
+        channel = next((c for c in channels if not c.get_busy()), None)
+        if channel is None:
+            # All busy: cut the one that started longest ago
+            i = self.next_channel[category]
+            channel = channels[i]
+            self.next_channel[category] = (i + 1) % len(channels)
+        channel.play(sound)
+
+    def play_music(self, name, loops=-1):
+        if self.failed or name == self.current_music:
+            return
+        self.current_music = name
+        self.jobs.put((self._start_music, (name, loops)))
+
+    def _start_music(self, track):
+        name, loops = track
+        if not self.enabled or name != self.current_music:
+            return  # Superseded while queued
+        path = os.path.join(self.sound_dir, MUSIC[name])
+        if not os.path.exists(path):
+            pygame.mixer.music.stop()
+            return
+        pygame.mixer.music.load(path, music_type(path))
+        pygame.mixer.music.set_volume(self.music_volume)
+        pygame.mixer.music.play(loops)
+
+    def pause_music(self):
+        if self.enabled:
+            pygame.mixer.music.pause()
+
+    def resume_music(self):
+        if self.enabled:
+            pygame.mixer.music.unpause()
+
+    def stop_music(self):
+        self.current_music = None
+        if self.enabled:
+            pygame.mixer.music.stop()
+
+    def wait_loaded(self, timeout=None):
+        # Blocks until the queued loads are done (tools/tests only)
+        done = threading.Event()
+        self.jobs.put((lambda _: done.set(), None))
+        return done.wait(timeout)
+
+    def close(self):
+        self.jobs.put((None, None))
@@ -0,0 +1,352 @@
+import os
+import sys
+import json
+import time
+import random
+import platform
+import argparse
+
+from ai import AIInput
+from engine import (
+    GameEngine, ACTION_LEFT, ACTION_RIGHT, ACTION_SOFT_DROP, ACTION_ROTATE_CW,
+    ACTION_ROTATE_CCW, ACTION_HARD_DROP, ACTION_HOLD, ROTATE_COOLDOWN,
+)
+
+# =================================================================
+# Self-play benchmark. Plays N seeded headless games with scripted,
+# random or AI input and reports:
+#
+#   throughput  ticks/sec and pieces/sec of the bare engine
+#   latency     p50/p99/mean (microseconds) of the engine hot paths
+#               and of TetrisGame's draw_* functions, the latter
+#               drawing to an offscreen surface
+#
+# Results are written as JSON and can be compared against a stored
+# baseline; anything worse than the threshold is a regression and the
+# script exits with status 1. Timings are machine-specific, so no
+# baseline ships with the game: without one the script warns and exits
+# with status 2 rather than passing.
+#
+#   python bench.py --save-baseline            # record the baseline
+#   python bench.py                            # compare against it
+#   python bench.py --no-compare               # just measure
+# =================================================================
+
+RESULTS_FILE = "bench_results.json"
+BASELINE_FILE = "bench_baseline.json"
+DEFAULT_GAMES = 20
+DEFAULT_SEED = 1
+DEFAULT_THRESHOLD = 0.10   # 10% slower than the baseline fails
+NO_BASELINE_STATUS = 2     # Exit status when there's nothing to compare against
+MAX_TICKS = 20000          # Per game, so a bot that never tops out still ends
+DRAW_FRAMES = 3000
+FULL_FRAME_EVERY = 30      # Force a full redraw this often in the draw run
+
+DRAW_TIMED = ('draw_grid', 'draw_info_panel', 'draw_piece', 'draw_particles',
+              'draw_dirty_frame', 'draw_full_frame')
+
+# Random input: one action every few ticks, hard drops rare enough that
+# games last a while
+RANDOM_ACTIONS = (ACTION_LEFT, ACTION_RIGHT, ACTION_SOFT_DROP, ACTION_ROTATE_CW,
+                  ACTION_ROTATE_CCW, ACTION_HARD_DROP, ACTION_HOLD)
+RANDOM_WEIGHTS = (4, 4, 3, 3, 2, 1, 1)
+RANDOM_INPUT_RATE = 0.25
+
+# Scripted input: the same short routine for every piece, spread over
+# the columns so the stack builds up evenly
+SCRIPTS = (
+    (ACTION_LEFT, ACTION_LEFT, ACTION_LEFT, ACTION_LEFT),
+    (ACTION_ROTATE_CW, ACTION_LEFT, ACTION_LEFT),
+    (ACTION_LEFT,),
+    (ACTION_ROTATE_CCW,),
+    (),
+    (ACTION_RIGHT, ACTION_ROTATE_CW),
+    (ACTION_RIGHT, ACTION_RIGHT),
+    (ACTION_HOLD, ACTION_RIGHT, ACTION_RIGHT, ACTION_RIGHT),
+    (ACTION_RIGHT, ACTION_RIGHT, ACTION_RIGHT, ACTION_RIGHT, ACTION_SOFT_DROP),
+)
+
+
+class RandomInput:
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+
+    def __call__(self, engine):
+        if self.rng.random() < RANDOM_INPUT_RATE:
+            return self.rng.choices(RANDOM_ACTIONS, RANDOM_WEIGHTS)[0]
+        return None
+
+
+class ScriptedInput:
+    # Runs the next script for every new piece, then hard drops. Steps
+    # are spaced by the longest input cooldown so none get refused
+    def __init__(self, seed):
+        self.index = seed % len(SCRIPTS)
+        self.piece = None
+        self.queue = []
+        self.next_tick = 0
+
+    def __call__(self, engine):
+        if engine.current_piece is not self.piece:
+            self.piece = engine.current_piece
+            self.queue = list(SCRIPTS[self.index]) + [ACTION_HARD_DROP]
+            self.index = (self.index + 1) % len(SCRIPTS)
+        if not self.queue or engine.ticks < self.next_tick:
+            return None
+        self.next_tick = engine.ticks + ROTATE_COOLDOWN
+        return self.queue.pop(0)
+
+
+INPUTS = {'random': RandomInput, 'scripted': ScriptedInput, 'ai': AIInput}
+
+
+def game_seeds(count, seed):
+    rng = random.Random(seed)
+    return [rng.getrandbits(63) for _ in range(count)]
+
+
+def play(engine, policy, max_ticks=MAX_TICKS):
+    # Runs one game to the end (or max_ticks) feeding the policy's input
+    while not engine.game_over and engine.ticks < max_ticks:
+        action = policy(engine)
+        if action is not None:
+            engine.apply(action)
+        engine.step()
+        engine.events.clear()
+
+
+# -----------------------------------------------------------------
+# Latency sampling
+# -----------------------------------------------------------------
+
+class Timings:
+    def __init__(self):
+        self.samples = {}
+
+    def wrap(self, name, func):
+        samples = self.samples.setdefault(name, [])
+        clock = time.perf_counter_ns
+
+        def timed(*args, **kwargs):
+            start = clock()
+            result = func(*args, **kwargs)
+            samples.append(clock() - start)
+            return result
+        return timed
+
+    def instrument(self, obj, names):
+        # Shadows the bound methods on this instance only, so internal
+        # self.method() calls are timed too
+        for name in names:
+            setattr(obj, name, self.wrap(name, getattr(obj, name)))
+
+    def summary(self):
+        return {name: percentiles(samples) for name, samples in self.samples.items()}
+
+
+def percentiles(samples):
+    # Nearest-rank percentiles in microseconds
+    if not samples:
+        return {'count': 0, 'p50': 0.0, 'p99': 0.0, 'mean': 0.0}
+    ordered = sorted(samples)
+    n = len(ordered)
+
+    def rank(p):
+        return ordered[min(n - 1, max(0, int(p * n + 0.5) - 1))] / 1000
+    return {
+        'count': n,
+        'p50': round(rank(0.50), 3),
+        'p99': round(rank(0.99), 3),
+        'mean': round(sum(ordered) / n / 1000, 3),
+    }
+
+
+# -----------------------------------------------------------------
+# Benchmarks
+# -----------------------------------------------------------------
+
+def bench_throughput(seeds, input_name):
+    engine = GameEngine()
+    ticks = pieces = 0
+    start = time.perf_counter()
+    for seed in seeds:
+        engine.reset(seed)
+        play(engine, INPUTS[input_name](seed))
+        ticks += engine.ticks
+        pieces += engine.piece_count
+    seconds = time.perf_counter() - start
+    return {
+        'games': len(seeds),
+        'ticks': ticks,
+        'pieces': pieces,
+        'seconds': round(seconds, 4),
+        'ticks_per_sec': round(ticks / seconds, 1),
+        'pieces_per_sec': round(pieces / seconds, 1),
+    }
+
+
+def bench_engine_latency(seeds, input_name):
+    # Same games again, with the hot paths timed. collision and
+    # get_ghost_position are sampled once per tick, the way the
+    # renderer calls them every frame
+    timings = Timings()
+    engine = GameEngine()
+    timings.instrument(engine, ('rotate', 'hard_drop', 'lock_piece', 'get_ghost_position'))
+    collision = timings.wrap('collision', lambda piece, grid: piece.collision(grid))
+
+    for seed in seeds:
+        engine.reset(seed)
+        policy = INPUTS[input_name](seed)
+        while not engine.game_over and engine.ticks < MAX_TICKS:
+            action = policy(engine)
+            if action is not None:
+                engine.apply(action)
+            collision(engine.current_piece, engine.grid)
+            engine.get_ghost_position()
+            engine.step()
+            engine.events.clear()
+    return timings.summary()
+
+
+def bench_draw_latency(seeds, input_name, frames=DRAW_FRAMES):
+    # Drives a real TetrisGame with the dummy SDL drivers and draws to an
+    # offscreen surface, cycling through the seeded games
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    import pygame
+    import main
+    from scores import ScoreStore
+
+    # Scores go to a throwaway in-memory database
+    game = main.TetrisGame(max_fps=0, scores=ScoreStore(":memory:"))
+    game.load_assets()
+    game.screen = pygame.Surface((main.SCREEN_WIDTH, main.SCREEN_HEIGHT)).convert()
+    game.sound.play = lambda name: None
+    timings = Timings()
+    timings.instrument(game, DRAW_TIMED)
+
+    games = iter(seeds * (frames // len(seeds) + 1))
+    policy = None
+    for frame in range(frames):
+        if policy is None or game.engine.game_over or game.engine.ticks >= MAX_TICKS:
+            seed = next(games)
+            game.engine.reset(seed)
+            game.invalidate_layers()
+            game.particles.clear()
+            game.game_state = main.PLAYING
+            policy = INPUTS[input_name](seed)
+        action = policy(game.engine)
+        if action is not None:
+            game.engine.apply(action)
+        game.update()
+        if frame % FULL_FRAME_EVERY == 0:
+            game.drawn_state = None
+        game.draw(0.5)
+
+    pygame.quit()
+    return timings.summary()
+
+
+def run(games=DEFAULT_GAMES, seed=DEFAULT_SEED, input_name='random', draw=True):
+    seeds = game_seeds(games, seed)
+    results = {
+        'meta': {
+            'games': games,
+            'seed': seed,
+            'input': input_name,
+            'max_ticks': MAX_TICKS,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'time': time.strftime("%Y-%m-%d %H:%M:%S"),
+        },
+        'throughput': bench_throughput(seeds, input_name),
+        'latency_us': bench_engine_latency(seeds, input_name),
+    }
+    if draw:
+        results['latency_us'].update(bench_draw_latency(seeds, input_name))
+    return results
+
+
+# -----------------------------------------------------------------
+# Baseline comparison
+# -----------------------------------------------------------------
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    # Returns a list of (metric, baseline, current, change, regressed);
+    # throughput should go up, latencies should go down
+    rows = []
+    for key in ('ticks_per_sec', 'pieces_per_sec'):
+        old = baseline.get('throughput', {}).get(key)
+        new = results['throughput'][key]
+        if old:
+            change = new / old - 1
+            rows.append((key, old, new, change, change < -threshold))
+
+    old_latency = baseline.get('latency_us', {})
+    for name, stats in results['latency_us'].items():
+        for key in ('p50', 'p99'):
+            old = old_latency.get(name, {}).get(key)
+            new = stats[key]
+            if old:
+                change = new / old - 1
+                rows.append((f"{name}.{key}", old, new, change, change > threshold))
+    return rows
+
+
+def print_results(results):
+    t = results['throughput']
+    print(f"{t['games']} games, {t['ticks']} ticks, {t['pieces']} pieces in {t['seconds']}s")
+    print(f"  {t['ticks_per_sec']:>12.1f} ticks/sec")
+    print(f"  {t['pieces_per_sec']:>12.1f} pieces/sec")
+    print(f"  {'latency (us)':<22}{'p50':>10}{'p99':>10}{'mean':>10}{'count':>9}")
+    for name, stats in results['latency_us'].items():
+        print(f"  {name:<22}{stats['p50']:>10.2f}{stats['p99']:>10.2f}"
+              f"{stats['mean']:>10.2f}{stats['count']:>9}")
+
+
+def print_comparison(rows, threshold):
+    print(f"\nvs baseline (threshold {threshold:.0%}):")
+    for metric, old, new, change, regressed in rows:
+        flag = "REGRESSION" if regressed else ""
+        print(f"  {metric:<28}{old:>12.2f}{new:>12.2f}{change:>+9.1%}  {flag}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Advanced Tetris Pro benchmark")
+    parser.add_argument("--games", type=int, default=DEFAULT_GAMES, help="number of seeded games")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="seed for the game seeds")
+    parser.add_argument("--input", choices=sorted(INPUTS), default='random', help="input policy")
+    parser.add_argument("--no-draw", action="store_true", help="skip the draw_* measurements")
+    parser.add_argument("--out", default=RESULTS_FILE, help="where to write the JSON results")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown before failing, e.g. 0.1 for 10%%")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--no-compare", action="store_true", help="only measure, don't compare to a baseline")
+    args = parser.parse_args()
+
+    results = run(args.games, args.seed, args.input, draw=not args.no_draw)
+    print_results(results)
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nBaseline saved to {args.baseline}")
+        sys.exit(0)
+    if args.no_compare:
+        sys.exit(0)
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print(f"\nWARNING: no baseline at {args.baseline}, nothing was compared; "
+              f"run with --save-baseline to create one (or --no-compare to only measure)",
+              file=sys.stderr)
+        sys.exit(NO_BASELINE_STATUS)
+
+    rows = compare(results, baseline, args.threshold)
+    print_comparison(rows, args.threshold)
+    sys.exit(1 if any(row[4] for row in rows) else 0)
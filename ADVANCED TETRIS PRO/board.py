@@ -0,0 +1,363 @@
+# =================================================================
+# Bitboard grid: each row is an int with bit x set when column x is
+# filled, so collision, full-row and drop checks are a few shift/AND
+# operations. Cell colors live in a parallel bytearray of palette
+# indices (0 = empty) and are exposed through grid[y][x] like the old
+# list-of-lists grid, so draw code doesn't need to know the difference.
+#
+# The board also keeps its features up to date as pieces are placed
+# and rows cleared: the top filled row and hole count of every column
+# and the fill count of every row. Only the columns a piece touches are
+# updated on place(), and clear_rows() shifts them, so heights, holes,
+# wells and emptiness checks never need a full-grid scan.
+# =================================================================
+
+
+def shape_masks(shape):
+    # One bitmask per shape row, bit 0 = leftmost column of the shape
+    return tuple(sum(1 << x for x, cell in enumerate(row) if cell) for row in shape)
+
+
+_column_bottoms = {}
+
+
+def column_bottoms(masks):
+    # ((column, lowest row), ...) of a piece's masks, cached per shape
+    bottoms = _column_bottoms.get(masks)
+    if bottoms is None:
+        col_mask = 0
+        for mask in masks:
+            col_mask |= mask
+        bottoms = tuple((x, max(r for r, mask in enumerate(masks) if mask >> x & 1))
+                        for x in range(col_mask.bit_length()) if col_mask >> x & 1)
+        _column_bottoms[masks] = bottoms
+    return bottoms
+
+
+class BoardRow:
+    __slots__ = ('board', 'y')
+
+    def __init__(self, board, y):
+        self.board = board
+        self.y = y
+
+    def __len__(self):
+        return self.board.width
+
+    def __getitem__(self, x):
+        board = self.board
+        return board.palette[board.colors[self.y * board.width + x]]
+
+    def __setitem__(self, x, color):
+        self.board.set_cell(x, self.y, color)
+
+    def __iter__(self):
+        board = self.board
+        start = self.y * board.width
+        for idx in board.colors[start:start + board.width]:
+            yield board.palette[idx]
+
+
+class BitBoard:
+    def __init__(self, width, height, palette=()):
+        self.width = width
+        self.height = height
+        self.full_mask = (1 << width) - 1
+        self.palette = [None] + list(palette)
+        self.palette_index = {color: i for i, color in enumerate(self.palette)}
+        # Bumped by every write, so callers can cache anything derived
+        # from the board (like the ghost piece) and check it cheaply
+        self.version = 0
+        self.clear()
+
+    def clear(self):
+        self.rows = [0] * self.height
+        self.colors = bytearray(self.width * self.height)
+        self.tops = [self.height] * self.width   # Highest filled row per column
+        self.col_holes = [0] * self.width
+        self.row_fill = [0] * self.height
+        self.hole_count = 0
+        self.cell_count = 0
+        self.version += 1
+
+    # -- grid[y][x] compatibility --------------------------------------
+
+    def __len__(self):
+        return self.height
+
+    def __getitem__(self, y):
+        if y < 0:
+            y += self.height
+        return BoardRow(self, y)
+
+    def __iter__(self):
+        for y in range(self.height):
+            yield BoardRow(self, y)
+
+    def color_index(self, color):
+        idx = self.palette_index.get(color)
+        if idx is None:
+            idx = len(self.palette)
+            self.palette.append(color)
+            self.palette_index[color] = idx
+        return idx
+
+    def set_cell(self, x, y, color):
+        was_filled = self.rows[y] >> x & 1
+        if color is None:
+            self.rows[y] &= ~(1 << x)
+            self.colors[y * self.width + x] = 0
+        else:
+            self.rows[y] |= 1 << x
+            self.colors[y * self.width + x] = self.color_index(color)
+        change = (color is not None) - was_filled
+        self.row_fill[y] += change
+        self.cell_count += change
+        self.rescan_column(x)
+        self.version += 1
+
+    # -- bit operations --------------------------------------------------
+
+    def occupied(self, x, y):
+        # Walls and floor count as occupied; the space above the top doesn't
+        if x < 0 or x >= self.width or y >= self.height:
+            return True
+        return y >= 0 and bool(self.rows[y] >> x & 1)
+
+    def collides(self, masks, x, y):
+        rows = self.rows
+        full = self.full_mask
+        height = self.height
+        for r, mask in enumerate(masks):
+            if x >= 0:
+                shifted = mask << x
+            elif mask & ((1 << -x) - 1):
+                return True
+            else:
+                shifted = mask >> -x
+            if shifted & ~full:
+                return True
+            row = y + r
+            if row >= height:
+                return True
+            if row >= 0 and rows[row] & shifted:
+                return True
+        return False
+
+    def drop_distance(self, masks, x, y):
+        # How far a piece at a free (x, y) can fall before it lands.
+        # Above the stack that is just the gap to the column tops
+        bottoms = column_bottoms(masks)
+        if x >= 0 and x + bottoms[-1][0] < self.width:
+            tops = self.tops
+            distance = min(tops[x + column] - 1 - bottom - y for column, bottom in bottoms)
+            if distance >= 0:
+                return distance
+
+        rows = self.rows
+        height = self.height
+        distance = height
+        for r, mask in enumerate(masks):
+            shifted = mask << x if x >= 0 else mask >> -x
+            row = y + r + 1
+            d = 0
+            while d < distance and row < height and (row < 0 or not rows[row] & shifted):
+                d += 1
+                row += 1
+            distance = d
+        return distance
+
+    def place(self, masks, x, y, color):
+        # Writes a piece into the board, returns the (x, y) cells it filled
+        idx = self.color_index(color)
+        width = self.width
+        tops = self.tops
+        col_holes = self.col_holes
+        cells = []
+        # Bottom row first, so each column's cells come lowest to highest
+        for r in range(len(masks) - 1, -1, -1):
+            row = y + r
+            if not 0 <= row < self.height:
+                continue
+            mask = masks[r]
+            shifted = mask << x if x >= 0 else mask >> -x
+            self.rows[row] |= shifted
+            base = row * width
+            added = 0
+            for bx in range(width):
+                if shifted >> bx & 1:
+                    self.colors[base + bx] = idx
+                    cells.append((bx, row))
+                    added += 1
+                    top = tops[bx]
+                    if row < top:
+                        # New top: everything between it and the old top is covered
+                        gap = top - row - 1
+                        col_holes[bx] += gap
+                        self.hole_count += gap
+                        tops[bx] = row
+                    else:
+                        col_holes[bx] -= 1
+                        self.hole_count -= 1
+            self.row_fill[row] += added
+            self.cell_count += added
+        self.version += 1
+        return cells
+
+    def is_row_empty(self, y):
+        return not self.rows[y]
+
+    def is_row_full(self, y):
+        return self.rows[y] == self.full_mask
+
+    def is_empty(self):
+        return not self.cell_count
+
+    def clear_rows(self, ys):
+        # Drop the given (full) rows and shift everything above them down,
+        # moving the existing row ints / color bytes instead of rebuilding
+        width = self.width
+        full = all(self.row_fill[y] == width for y in ys)
+        cleared = set(ys)
+        for y in sorted(ys, reverse=True):
+            self.cell_count -= self.row_fill[y]
+            del self.rows[y]
+            del self.row_fill[y]
+            del self.colors[y * width:(y + 1) * width]
+        count = len(ys)
+        self.rows[0:0] = [0] * count
+        self.row_fill[0:0] = [0] * count
+        self.colors[0:0] = bytes(count * width)
+        self.version += 1
+
+        # Full rows are filled in every column, so they lie at or below
+        # each column's top: the column just moves down, holes and all,
+        # unless its top cell was in a cleared row
+        for x in range(width):
+            if full and self.tops[x] not in cleared:
+                self.tops[x] += count
+            else:
+                self.rescan_column(x)
+
+    def add_garbage(self, count, hole, color):
+        # Pushes the stack up `count` rows and fills the bottom with
+        # garbage rows open at column `hole`. True if filled cells were
+        # pushed off the top
+        width = self.width
+        overflow = any(self.rows[:count])
+        self.cell_count -= sum(self.row_fill[:count])
+        del self.rows[:count]
+        del self.row_fill[:count]
+        del self.colors[:count * width]
+
+        idx = self.color_index(color)
+        row = bytearray([idx]) * width
+        row[hole] = 0
+        self.rows.extend([self.full_mask & ~(1 << hole)] * count)
+        self.row_fill.extend([width - 1] * count)
+        self.colors.extend(bytes(row) * count)
+        self.cell_count += (width - 1) * count
+        self.version += 1
+        for x in range(width):
+            self.rescan_column(x)
+        return overflow
+
+    def rescan_column(self, x):
+        bit = 1 << x
+        rows = self.rows
+        top = self.height
+        holes = 0
+        for y in range(self.height - 1, -1, -1):
+            if rows[y] & bit:
+                top = y
+            else:
+                holes += 1
+        holes -= top  # Empty cells above the top aren't holes
+        self.hole_count += holes - self.col_holes[x]
+        self.col_holes[x] = holes
+        self.tops[x] = top
+
+    def full_rows(self, ys=None):
+        full = self.full_mask
+        rows = self.rows
+        if ys is None:
+            ys = range(self.height)
+        return [y for y in ys if rows[y] == full]
+
+    # -- snapshots ---------------------------------------------------------
+
+    def state(self):
+        # The whole board as immutable values (tuples/bytes), O(rows)
+        return (tuple(self.rows), bytes(self.colors), tuple(self.tops),
+                tuple(self.col_holes), tuple(self.row_fill), self.hole_count, self.cell_count)
+
+    def load_state(self, state):
+        rows, colors, tops, col_holes, row_fill, self.hole_count, self.cell_count = state
+        self.rows = list(rows)
+        self.colors = bytearray(colors)
+        self.tops = list(tops)
+        self.col_holes = list(col_holes)
+        self.row_fill = list(row_fill)
+        self.version += 1
+
+    def load_colors(self, colors):
+        # Rebuilds the board (rows and features) from palette indices
+        # alone, as stored by Snapshot.to_bytes()
+        width = self.width
+        self.clear()
+        self.colors = bytearray(colors)
+        for y in range(self.height):
+            cells = colors[y * width:(y + 1) * width]
+            self.rows[y] = sum(1 << x for x, idx in enumerate(cells) if idx)
+            self.row_fill[y] = width - cells.count(0)
+        self.cell_count = sum(self.row_fill)
+        for x in range(width):
+            self.rescan_column(x)
+
+    # -- features (read-only, kept up to date by place/clear_rows) -------
+
+    def column_height(self, x):
+        return self.height - self.tops[x]
+
+    def heights(self):
+        height = self.height
+        return [height - top for top in self.tops]
+
+    def max_height(self):
+        return self.height - min(self.tops)
+
+    def aggregate_height(self):
+        return self.height * self.width - sum(self.tops)
+
+    def holes(self, x=None):
+        # Total covered empty cells, or just column x's
+        return self.hole_count if x is None else self.col_holes[x]
+
+    def row_count(self, y):
+        return self.row_fill[y]
+
+    def bumpiness(self):
+        tops = self.tops
+        return sum(abs(a - b) for a, b in zip(tops, tops[1:]))
+
+    def wells(self):
+        # Depth of each column below its lower neighbour (walls count as
+        # infinitely tall), 0 where it isn't a well
+        heights = self.heights()
+        depths = []
+        for x, h in enumerate(heights):
+            left = heights[x - 1] if x > 0 else self.height
+            right = heights[x + 1] if x < self.width - 1 else self.height
+            depths.append(max(0, min(left, right) - h))
+        return depths
+
+    def features(self):
+        return {
+            'heights': self.heights(),
+            'max_height': self.max_height(),
+            'aggregate_height': self.aggregate_height(),
+            'holes': self.hole_count,
+            'bumpiness': self.bumpiness(),
+            'wells': self.wells(),
+            'row_fill': list(self.row_fill),
+        }
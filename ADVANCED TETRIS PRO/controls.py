@@ -0,0 +1,139 @@
+import pygame
+
+from engine import (
+    TICK_RATE, ACTION_LEFT, ACTION_RIGHT, ACTION_SOFT_DROP, ACTION_ROTATE_CW,
+    ACTION_ROTATE_CCW, ACTION_HARD_DROP, ACTION_HOLD,
+)
+
+# =================================================================
+# Keyboard input. Key presses and releases are stamped with the time
+# they were read and buffered; once per simulation tick the buffer is
+# played up to that tick's time and turned into engine actions:
+#
+#  - Taps move/rotate/drop once, even if released within the same tick.
+#  - A held direction moves once, waits DAS, then repeats every ARR
+#    (ARR 0 slides straight to the wall). The last direction pressed
+#    wins; releasing it goes back to the other one if that's still held.
+#  - Held soft drop falls SOFT_DROP_FACTOR times faster than gravity
+#    (0 drops straight to the floor).
+#
+# Because the keyboard does its own repeating, keyboard games run the
+# engine with no input cooldowns. DAS and ARR are timed from the key
+# stamps, not tick boundaries, so with high-rate polling (see
+# TetrisGame.run) a press is picked up within a millisecond or so and
+# acted on by the very next tick.
+# =================================================================
+
+# In ticks (TICK_RATE per second), like the engine's timers
+DAS = 10
+ARR = 2
+SOFT_DROP_FACTOR = 20
+
+POLL_RATE = 1000  # Hz, for high-rate polling
+
+KEY_ACTIONS = {
+    pygame.K_LEFT: ACTION_LEFT,
+    pygame.K_RIGHT: ACTION_RIGHT,
+    pygame.K_DOWN: ACTION_SOFT_DROP,
+    pygame.K_UP: ACTION_ROTATE_CW,
+    pygame.K_z: ACTION_ROTATE_CCW,
+    pygame.K_SPACE: ACTION_HARD_DROP,
+    pygame.K_c: ACTION_HOLD,
+}
+
+SHIFTS = (ACTION_LEFT, ACTION_RIGHT)
+
+
+class KeyboardInput:
+    def __init__(self, keymap=KEY_ACTIONS, das=DAS, arr=ARR, soft_drop_factor=SOFT_DROP_FACTOR):
+        self.keymap = keymap
+        self.das = das / TICK_RATE  # Seconds from here on
+        self.arr = arr / TICK_RATE
+        self.soft_drop_factor = soft_drop_factor
+        self.buffer = []  # (time, action, pressed), in arrival order
+        self.reset()
+
+    def reset(self):
+        self.buffer.clear()
+        self.held = set()
+        self.shift = None         # ACTION_LEFT/RIGHT being auto-repeated
+        self.next_shift = 0.0     # When it next moves
+        self.soft_drop = 0.0      # Rows of soft drop owed
+
+    def handle_event(self, event, now):
+        # Buffers a key event stamped with `now`; True if it was ours
+        if event.type not in (pygame.KEYDOWN, pygame.KEYUP) or event.key not in self.keymap:
+            return False
+        self.buffer.append((now, self.keymap[event.key], event.type == pygame.KEYDOWN))
+        return True
+
+    def tick(self, engine, now):
+        # Applies everything due by `now` (the time of the tick being run)
+        pending = 0
+        for stamp, action, pressed in self.buffer:
+            if stamp > now:
+                break
+            pending += 1
+            if pressed:
+                self.press(engine, action, stamp)
+            else:
+                self.release(action, stamp)
+        del self.buffer[:pending]
+
+        if self.shift is not None:
+            self.repeat(engine, now)
+        if ACTION_SOFT_DROP in self.held:
+            self.drop(engine)
+
+    def press(self, engine, action, stamp):
+        if action in self.held:
+            return  # OS key repeat
+        self.held.add(action)
+        if action in SHIFTS:
+            self.start_shift(action, stamp)
+            engine.apply(action)
+        elif action == ACTION_SOFT_DROP:
+            self.soft_drop = 1.0  # First row right away
+        else:
+            engine.apply(action)
+
+    def release(self, action, stamp):
+        self.held.discard(action)
+        if action == self.shift:
+            other = ACTION_RIGHT if action == ACTION_LEFT else ACTION_LEFT
+            if other in self.held:
+                self.start_shift(other, stamp)
+            else:
+                self.shift = None
+        elif action == ACTION_SOFT_DROP:
+            self.soft_drop = 0.0
+
+    def start_shift(self, action, stamp):
+        self.shift = action
+        self.next_shift = stamp + self.das
+
+    def repeat(self, engine, now):
+        if now < self.next_shift:
+            return
+        if self.arr == 0:
+            while engine.apply(self.shift):
+                pass
+            return
+        while self.next_shift <= now:
+            self.next_shift += self.arr
+            if not engine.apply(self.shift):
+                # Against a wall: wait for the next tick, don't bank moves
+                self.next_shift = max(self.next_shift, now)
+                break
+
+    def drop(self, engine):
+        if self.soft_drop_factor == 0:
+            while engine.apply(ACTION_SOFT_DROP):
+                pass
+            return
+        self.soft_drop += engine.gravity * self.soft_drop_factor
+        while self.soft_drop >= 1:
+            self.soft_drop -= 1
+            if not engine.apply(ACTION_SOFT_DROP):
+                self.soft_drop = 0.0
+                break
@@ -0,0 +1,591 @@
+import zlib
+import random
+
+from board import BitBoard
+from srs import ORIENTATIONS, KICKS, T_PIECE, spawn_x
+from scoring import (
+    NO_T_SPIN, T_SPIN, T_SPIN_MINI, SOFT_DROP_SCORE, HARD_DROP_SCORE,
+    score_clear, attack_for_clear, clear_name, level_for_lines, gravity_for_level,
+)
+
+# =================================================================
+# Headless game engine (no pygame). Owns the grid, bag, hold,
+# gravity, lock delay and scoring; TetrisGame in main.py only
+# renders it and feeds it input.
+# =================================================================
+
+# Constants
+GRID_WIDTH = 10
+GRID_HEIGHT = 20
+
+# Colors
+BLACK = (0, 0, 0)
+WHITE = (255, 255, 255)
+GRAY = (128, 128, 128)
+RED = (255, 0, 0)
+GREEN = (0, 255, 0)
+BLUE = (0, 0, 255)
+CYAN = (0, 255, 255)
+MAGENTA = (255, 0, 255)
+YELLOW = (255, 255, 0)
+ORANGE = (255, 165, 0)
+PURPLE = (128, 0, 128)
+GARBAGE_COLOR = (90, 90, 90)
+
+# Tetrimino shapes with colors: I, O, T, J, L, S, Z in their SRS
+# spawn orientation (see srs.py for all four rotations)
+SHAPES = [states[0].shape for states in ORIENTATIONS]
+
+SHAPES_COLORS = [CYAN, YELLOW, PURPLE, BLUE, ORANGE, GREEN, RED]
+
+# Every color a board can hold, in palette order (index 0 is empty):
+# fixed up front so palette indices mean the same in every engine,
+# snapshot and broadcast
+BOARD_PALETTE = SHAPES_COLORS + [GARBAGE_COLOR]
+
+NEXT_QUEUE_SIZE = 5
+
+# Simulation runs at a fixed rate; every timer below is in ticks
+TICK_RATE = 60
+LOCK_DELAY = 30
+MOVE_COOLDOWN = 6
+ROTATE_COOLDOWN = 12
+GARBAGE_DELAY = 30   # Ticks before received garbage can rise
+GARBAGE_CAP = 8      # Most garbage lines raised by one lock
+
+# Everything a replay has to agree on to re-simulate a game. The input
+# cooldowns are per engine (see GameEngine.ruleset): keyboard games set
+# them to 0 and leave auto-repeat to the input handler
+RULESET = (GRID_WIDTH, GRID_HEIGHT, NEXT_QUEUE_SIZE, TICK_RATE,
+           LOCK_DELAY, MOVE_COOLDOWN, ROTATE_COOLDOWN)
+FIXED_RULES = RULESET[:-2]
+
+# Player actions, as fed to GameEngine.apply() and stored in replays
+ACTION_LEFT = 0
+ACTION_RIGHT = 1
+ACTION_SOFT_DROP = 2
+ACTION_ROTATE_CW = 3
+ACTION_ROTATE_CCW = 4
+ACTION_HARD_DROP = 5
+ACTION_HOLD = 6
+ACTION_COUNT = 7
+
+
+def occupied(grid, x, y):
+    # Walls and floor are solid, the space above the grid is not
+    if isinstance(grid, BitBoard):
+        return grid.occupied(x, y)
+    if x < 0 or x >= GRID_WIDTH or y >= GRID_HEIGHT:
+        return True
+    return y >= 0 and grid[y][x] is not None
+
+
+class Tetrimino:
+    # Only the piece's own state lives on the instance; the shape data
+    # (orientations, kicks, masks, color) comes from the shared SRS
+    # tables. The engine reuses pieces (hold, ghost) instead of
+    # allocating new ones
+    __slots__ = ('shape_idx', 'rotation', 'orientation', 'x', 'y',
+                 'last_move_tick', 'last_rotate_tick', 'move_cooldown', 'rotate_cooldown',
+                 'last_drop_tick', 'lock_delay', 'lock_timer', 'locking', 't_spin', 't_spin_mini')
+
+    def __init__(self, shape_idx, x=None, y=0):
+        self.move_cooldown = MOVE_COOLDOWN
+        self.rotate_cooldown = ROTATE_COOLDOWN
+        self.lock_delay = LOCK_DELAY
+        self.reset(shape_idx, x, y)
+
+    def reset(self, shape_idx, x=None, y=0):
+        # Back to a fresh spawn-state piece; keeps the cooldown settings
+        self.shape_idx = shape_idx
+        self.set_rotation(0)
+        self.x = spawn_x(shape_idx, GRID_WIDTH) if x is None else x
+        self.y = y
+        # All timers are in simulation ticks (TICK_RATE per second)
+        self.last_move_tick = -self.move_cooldown
+        self.last_rotate_tick = -self.rotate_cooldown
+        self.last_drop_tick = 0
+        self.lock_timer = 0
+        self.locking = False
+        self.t_spin = False
+        self.t_spin_mini = False
+
+    def set_rotation(self, rotation):
+        self.rotation = rotation
+        self.orientation = ORIENTATIONS[self.shape_idx][rotation]
+
+    @property
+    def orientations(self):
+        return ORIENTATIONS[self.shape_idx]
+
+    @property
+    def kicks(self):
+        return KICKS[self.shape_idx]
+
+    @property
+    def color(self):
+        return SHAPES_COLORS[self.shape_idx]
+
+    @property
+    def shape(self):
+        return self.orientation.shape
+
+    @property
+    def masks(self):
+        return self.orientation.masks
+
+    # `now` is the engine tick of a player action; gravity passes None so
+    # it doesn't count against the input cooldowns.
+    # direction: 1 = clockwise, -1 = counter-clockwise
+    def rotate(self, grid, now=0, direction=1):
+        target = (self.rotation + direction) % 4
+        orientation = ORIENTATIONS[self.shape_idx][target]
+        offsets = KICKS[self.shape_idx][self.rotation][0 if direction == 1 else 1]
+
+        for kick, (dx, dy) in enumerate(offsets):
+            x = self.x + dx
+            y = self.y + dy
+            if not self.collides_at(grid, orientation, x, y):
+                self.x = x
+                self.y = y
+                self.set_rotation(target)
+                if self.shape_idx == T_PIECE:
+                    self.detect_t_spin(grid, kick)
+                self.last_rotate_tick = now
+                self.check_grounded(grid)
+                return True
+
+        return False
+
+    def detect_t_spin(self, grid, kick):
+        # 3-corner rule; both front corners (or the last SRS kick) make
+        # it a full T-spin, otherwise a mini
+        (fx1, fy1), (fx2, fy2), (bx1, by1), (bx2, by2) = self.orientation.corners
+        x, y = self.x, self.y
+        front = occupied(grid, x + fx1, y + fy1) + occupied(grid, x + fx2, y + fy2)
+        back = occupied(grid, x + bx1, y + by1) + occupied(grid, x + bx2, y + by2)
+        if front + back >= 3:
+            self.t_spin = front == 2 or kick == 4
+            self.t_spin_mini = not self.t_spin
+        else:
+            self.t_spin = False
+            self.t_spin_mini = False
+
+    def move(self, dx, dy, grid, now=None):
+        self.x += dx
+        self.y += dy
+
+        if self.collision(grid):
+            self.x -= dx
+            self.y -= dy
+            return False
+
+        if now is not None:
+            self.last_move_tick = now
+        self.t_spin = False
+        self.t_spin_mini = False
+
+        if dy != 0:
+            self.locking = False
+            self.lock_timer = 0
+        else:
+            self.check_grounded(grid)
+
+        return True
+
+    def hard_drop(self, grid, now=0):
+        # Returns how many rows the piece fell
+        if isinstance(grid, BitBoard):
+            distance = grid.drop_distance(self.orientation.masks, self.x, self.y)
+            if distance:
+                self.y += distance
+                self.last_move_tick = now
+                self.t_spin = False
+                self.t_spin_mini = False
+        else:
+            distance = 0
+            while self.move(0, 1, grid, now):
+                distance += 1
+        self.locking = True
+        self.lock_timer = self.lock_delay
+        self.last_drop_tick = now
+        return distance
+
+    def collision(self, grid):
+        return self.collides_at(grid, self.orientation, self.x, self.y)
+
+    def grounded(self, grid):
+        # Resting on the stack or the floor
+        return self.collides_at(grid, self.orientation, self.x, self.y + 1)
+
+    def check_grounded(self, grid):
+        # A locking piece that was slid or rotated off its ledge falls
+        # again, with a fresh lock delay when it next lands
+        if self.locking and not self.grounded(grid):
+            self.locking = False
+            self.lock_timer = 0
+
+    def collides_at(self, grid, orientation, x, y):
+        if isinstance(grid, BitBoard):
+            return grid.collides(orientation.masks, x, y)
+        for cx, cy in orientation.cells:
+            board_x = x + cx
+            board_y = y + cy
+            if (board_x < 0 or board_x >= GRID_WIDTH or
+                board_y >= GRID_HEIGHT or
+                (board_y >= 0 and grid[board_y][board_x] is not None)):
+                return True
+        return False
+
+    def update_lock_timer(self):
+        if self.locking:
+            self.lock_timer += 1
+            if self.lock_timer >= self.lock_delay:
+                return True
+        return False
+
+
+class GameEngine:
+    # Everything the renderer needs to react to (sounds, particles,
+    # shake) is reported through `events` as (name, payload) tuples
+    # instead of being done here; call drain_events() once per frame.
+
+    def __init__(self, seed=None, move_cooldown=MOVE_COOLDOWN, rotate_cooldown=ROTATE_COOLDOWN,
+                 state=None):
+        self.move_cooldown = move_cooldown
+        self.rotate_cooldown = rotate_cooldown
+        self.rng = random.Random(0)  # Seeded by reset() or restored from `state`
+        self.rng_cache = None
+        self.events = []
+        self.recorder = None  # Gets record(tick, action) for every input
+        self.ghost = Tetrimino(0)
+        if state is None:
+            self.reset(seed)
+            return
+        # Start mid-game from a snapshot.Snapshot, which fills in the rest
+        self.grid = BitBoard(GRID_WIDTH, GRID_HEIGHT, BOARD_PALETTE)
+        self.ghost_key = None
+        self.current_piece = self.make_piece(0)
+        self.next_pieces = [self.make_piece(0) for _ in range(NEXT_QUEUE_SIZE)]
+        self.held_piece = None
+        state.restore(self)
+
+    def reset(self, seed=None):
+        # Each game has its own seed so it can be replayed exactly
+        if seed is None:
+            seed = random.getrandbits(63)
+        self.seed = seed
+        self.rng.seed(seed)
+        self.bags = 0           # Bags shuffled so far: the RNG's position
+        self.rng_cache = None   # See rng_state()
+        self.grid = BitBoard(GRID_WIDTH, GRID_HEIGHT, BOARD_PALETTE)
+        self.ghost_key = None  # New board: the cached ghost is stale
+        self.bag = []
+        self.ticks = 0
+        self.current_piece = self.new_piece()
+        self.next_pieces = [self.new_piece() for _ in range(NEXT_QUEUE_SIZE)]
+        self.held_piece = None
+        self.can_hold = True
+        self.score = 0
+        self.level = 1
+        self.lines = 0
+        self.combo = -1
+        self.b2b = False
+        self.last_clear = ""
+        self.gravity = self.calculate_gravity()
+        self.drop_progress = 0.0
+        self.piece_count = 0
+        self.game_over = False
+        self.events = []
+        # Versus play: incoming [ready tick, lines, hole column] and the
+        # lines this player has sent but nobody has taken yet
+        self.garbage = []
+        self.attack = 0
+
+    @property
+    def ruleset(self):
+        return FIXED_RULES + (self.move_cooldown, self.rotate_cooldown)
+
+    def drain_events(self):
+        events = self.events
+        self.events = []
+        return events
+
+    def new_piece(self, reuse=None):
+        # `reuse` is a piece that's finished with (just locked), recycled
+        # instead of allocating a new one
+        if not self.bag:
+            self.bag = list(range(len(SHAPES)))
+            self.rng.shuffle(self.bag)
+            self.bags += 1
+            self.rng_cache = None
+
+        if reuse is None:
+            return self.make_piece(self.bag.pop())
+        reuse.reset(self.bag.pop())
+        return reuse
+
+    def rng_state(self):
+        # The RNG only moves when a bag is shuffled, so its state is
+        # fetched once per bag and shared by every snapshot taken in it
+        if self.rng_cache is None:
+            self.rng_cache = self.rng.getstate()
+        return self.rng_cache
+
+    def make_piece(self, shape_idx):
+        piece = Tetrimino(shape_idx)
+        piece.move_cooldown = self.move_cooldown
+        piece.rotate_cooldown = self.rotate_cooldown
+        return piece
+
+    def calculate_gravity(self):
+        # Rows per tick; above 1 the piece falls several rows each tick
+        return 1 / (gravity_for_level(self.level) * TICK_RATE)
+
+    def spawn(self, piece):
+        piece.x = spawn_x(piece.shape_idx, GRID_WIDTH)
+        piece.y = 0
+        self.current_piece = piece
+
+    # ---------------------------------------------------------------
+    # Player actions (return True when the piece actually changed)
+    # ---------------------------------------------------------------
+
+    def apply(self, action):
+        # Single entry point for input, so it can be recorded/replayed
+        if self.game_over:
+            return False
+        if self.recorder is not None:
+            self.recorder.record(self.ticks, action)
+        if action == ACTION_LEFT:
+            return self.move(-1)
+        if action == ACTION_RIGHT:
+            return self.move(1)
+        if action == ACTION_SOFT_DROP:
+            return self.soft_drop()
+        if action == ACTION_ROTATE_CW:
+            return self.rotate(1)
+        if action == ACTION_ROTATE_CCW:
+            return self.rotate(-1)
+        if action == ACTION_HARD_DROP:
+            return self.hard_drop()
+        if action == ACTION_HOLD:
+            return self.hold_piece()
+        raise ValueError(f"Unknown action: {action}")
+
+    def move(self, dx, dy=0):
+        piece = self.current_piece
+        if self.game_over or self.ticks - piece.last_move_tick < piece.move_cooldown:
+            return False
+        if piece.move(dx, dy, self.grid, self.ticks):
+            self.events.append(('move', (dx, dy)))
+            return True
+        return False
+
+    def soft_drop(self):
+        if self.move(0, 1):
+            self.score += SOFT_DROP_SCORE
+            return True
+        return False
+
+    def rotate(self, direction=1):
+        piece = self.current_piece
+        if self.game_over or self.ticks - piece.last_rotate_tick < piece.rotate_cooldown:
+            return False
+        if piece.rotate(self.grid, self.ticks, direction):
+            self.events.append(('rotate', (direction, piece.t_spin)))
+            return True
+        return False
+
+    def hard_drop(self):
+        if self.game_over:
+            return False
+        distance = self.current_piece.hard_drop(self.grid, self.ticks)
+        self.score += HARD_DROP_SCORE * distance
+        self.events.append(('drop', distance))
+        return True
+
+    def hold_piece(self):
+        if self.game_over or not self.can_hold:
+            return False
+
+        # The current and held pieces swap objects, both back to spawn state
+        current = self.current_piece
+        if self.held_piece is None:
+            piece = self.next_pieces.pop(0)
+            self.next_pieces.append(self.new_piece())
+        else:
+            piece = self.held_piece
+            piece.reset(piece.shape_idx)
+        current.reset(current.shape_idx)
+        self.held_piece = current
+
+        self.can_hold = False
+        self.spawn(piece)
+        self.events.append(('hold', self.held_piece.shape_idx))
+        return True
+
+    # ---------------------------------------------------------------
+    # Simulation
+    # ---------------------------------------------------------------
+
+    def get_ghost_position(self):
+        # Where the current piece would land, in the same rotation. One
+        # Tetrimino is kept and only re-dropped when the piece changes
+        # shape, rotation or column, or the board changes; falling along
+        # its own drop path doesn't move the landing spot
+        piece = self.current_piece
+        ghost = self.ghost
+        key = self.ghost_key
+        if (key is None or key[0] != piece.shape_idx or key[1] != piece.rotation
+                or key[2] != piece.x or key[3] != self.grid.version
+                or not key[4] <= piece.y <= ghost.y):
+            ghost.shape_idx = piece.shape_idx
+            ghost.set_rotation(piece.rotation)
+            ghost.x = piece.x
+            ghost.y = piece.y + self.grid.drop_distance(ghost.masks, piece.x, piece.y)
+            self.ghost_key = (piece.shape_idx, piece.rotation, piece.x, self.grid.version, piece.y)
+        return ghost
+
+    def lock_piece(self):
+        piece = self.current_piece
+        cells = self.grid.place(piece.masks, piece.x, piece.y, piece.color)
+        self.events.append(('lock', (cells, piece.color, piece.shape_idx, piece.rotation, piece.x, piece.y)))
+        lines = self.clear_lines(piece)
+        if not lines and self.garbage and self.raise_garbage():
+            self.end_game()
+            return
+
+        if not self.grid.is_row_empty(0):
+            self.end_game()
+            return
+
+        self.spawn(self.next_pieces.pop(0))
+        self.next_pieces.append(self.new_piece(reuse=piece))
+        self.can_hold = True
+        self.piece_count += 1
+
+        if self.current_piece.collision(self.grid):
+            self.end_game()
+
+    def end_game(self):
+        self.game_over = True
+        self.events.append(('game_over', self.score))
+
+    def clear_lines(self, piece):
+        # Only the rows the locked piece covers can have become full
+        top = max(piece.y, 0)
+        bottom = min(piece.y + piece.orientation.height, GRID_HEIGHT)
+        rows = self.grid.full_rows(range(top, bottom))
+        if rows:
+            self.grid.clear_rows(rows)
+
+        lines = len(rows)
+        if piece.t_spin:
+            t_spin = T_SPIN
+        elif piece.t_spin_mini:
+            t_spin = T_SPIN_MINI
+        else:
+            t_spin = NO_T_SPIN
+
+        self.combo = self.combo + 1 if lines else -1
+        perfect = lines > 0 and self.grid.is_empty()
+        b2b = self.b2b
+        points, self.b2b = score_clear(lines, t_spin, self.level, self.combo,
+                                       self.b2b, perfect)
+        self.score += points
+        if lines:
+            self.send_attack(attack_for_clear(lines, t_spin, self.combo, b2b, perfect))
+
+        if not lines and t_spin == NO_T_SPIN:
+            return 0
+
+        self.last_clear = clear_name(lines, t_spin)
+        self.lines += lines
+        level = level_for_lines(self.lines)
+        if level != self.level:
+            self.level = level
+            self.gravity = self.calculate_gravity()
+        self.events.append(('clear', (rows, self.last_clear, points, perfect, t_spin)))
+        return lines
+
+    # ---------------------------------------------------------------
+    # Garbage (versus play)
+    # ---------------------------------------------------------------
+
+    def receive_garbage(self, lines, hole):
+        self.garbage.append([self.ticks + GARBAGE_DELAY, lines, hole])
+
+    def pending_garbage(self):
+        return sum(entry[1] for entry in self.garbage)
+
+    def send_attack(self, attack):
+        # A clear cancels queued garbage first; what's left goes out
+        while attack and self.garbage:
+            entry = self.garbage[0]
+            cancelled = min(attack, entry[1])
+            entry[1] -= cancelled
+            attack -= cancelled
+            if not entry[1]:
+                self.garbage.pop(0)
+        self.attack += attack
+
+    def raise_garbage(self):
+        # Garbage that's due comes up after a lock that cleared nothing,
+        # at most GARBAGE_CAP lines at a time. True if it topped out
+        raised = 0
+        overflow = False
+        while self.garbage and self.garbage[0][0] <= self.ticks and raised < GARBAGE_CAP:
+            entry = self.garbage[0]
+            count = min(entry[1], GARBAGE_CAP - raised)
+            overflow |= self.grid.add_garbage(count, entry[2], GARBAGE_COLOR)
+            entry[1] -= count
+            raised += count
+            if not entry[1]:
+                self.garbage.pop(0)
+        if raised:
+            self.events.append(('garbage', raised))
+        return overflow
+
+    def checksum(self):
+        # CRC of everything that decides how the game goes on, so two
+        # simulations of the same inputs can be checked against each other
+        piece = self.current_piece
+        held = self.held_piece.shape_idx if self.held_piece else -1
+        state = (self.ticks, self.score, self.lines, self.level, self.combo, self.b2b,
+                 self.can_hold, self.game_over, self.drop_progress, held,
+                 piece.shape_idx, piece.rotation, piece.x, piece.y, piece.lock_timer, piece.locking,
+                 [p.shape_idx for p in self.next_pieces], self.garbage)
+        return zlib.crc32(repr(state).encode(), zlib.crc32(self.grid.colors))
+
+    def step(self):
+        # Advances the simulation by exactly one tick
+        if self.game_over:
+            return
+
+        self.ticks += 1
+        piece = self.current_piece
+        piece.check_grounded(self.grid)
+        self.drop_progress += self.gravity
+        while self.drop_progress >= 1:
+            self.drop_progress -= 1
+            if not piece.move(0, 1, self.grid):
+                piece.locking = True
+                self.drop_progress = 0.0
+                break
+
+        if piece.update_lock_timer():
+            self.lock_piece()
+
+    def run_ticks(self, count):
+        for _ in range(count):
+            self.step()
+
+    def fall_offset(self, alpha=0.0):
+        # Fraction of a row the current piece has fallen towards the next
+        # one, `alpha` ticks ahead; used by the renderer to interpolate
+        piece = self.current_piece
+        if self.game_over or piece.grounded(self.grid):
+            return 0.0
+        return min(self.drop_progress + alpha * self.gravity, 0.999)
+
@@ -0,0 +1,97 @@
+import pygame
+
+from engine import GRID_WIDTH, GRID_HEIGHT
+
+# =================================================================
+# Screen layout. The game was designed for a fixed 800x700 window and
+# every position the renderer uses is still written in those "design
+# pixels"; a Layout maps them onto the actual window:
+#
+#  - The design is scaled uniformly to fit the window and centred, so
+#    fullscreen and 4K just get a bigger picture, never a squashed one.
+#  - The block size is rounded down to whole pixels and the board is
+#    laid out on it, so tiles stay crisp and the grid lines up.
+#  - Panels are placed relative to the board edges.
+#
+# A Layout is built once per window size. TetrisGame rebuilds its tiles,
+# fonts, previews and static layers for it on resize, so each frame is
+# still plain blits at native resolution: no transform.scale, and the
+# same per-frame cost at any size. At 800x700 everything lands exactly
+# where the fixed layout had it.
+# =================================================================
+
+DESIGN_WIDTH = 800
+DESIGN_HEIGHT = 700
+DESIGN_BLOCK = 30
+MIDDLE = DESIGN_HEIGHT // 2
+BOARD_BOTTOM = 50   # Gap under the board
+MIN_BLOCK = 8       # Smaller windows just cut the picture off
+
+FONT_SIZE = 24
+BIG_FONT_SIZE = 48
+MIN_FONT_SIZE = 8
+
+# Side panels: x from the board's left/right edge
+HOLD_X = 150
+HOLD_PREVIEW_X = 130
+NEXT_X = 30
+NEXT_PREVIEW_X = 50
+
+# Versus: opponents as mini boards down the right edge, incoming
+# garbage as a bar left of the board
+MINI_BLOCK = 6
+MINI_MARGIN = 8
+MINI_TOP = 50
+MINI_GAP = 20
+GARBAGE_BAR_GAP = 12
+GARBAGE_BAR_WIDTH = 6
+
+
+class Layout:
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.size = (width, height)
+        self.scale = min(width / DESIGN_WIDTH, height / DESIGN_HEIGHT)
+        self.block = block = max(MIN_BLOCK, int(DESIGN_BLOCK * self.scale))
+        # Design y = 0, with the scaled design centred vertically
+        self.top = max(0, (height - self.px(DESIGN_HEIGHT)) // 2)
+
+        board_width = GRID_WIDTH * block
+        board_height = GRID_HEIGHT * block
+        self.grid_x = (width - board_width) // 2
+        self.grid_y = self.top + self.px(DESIGN_HEIGHT) - board_height - self.px(BOARD_BOTTOM)
+        self.board_rect = pygame.Rect(self.grid_x, self.grid_y, board_width, board_height)
+        right = self.board_rect.right
+        self.hold_panel_rect = pygame.Rect(0, 0, self.grid_x - 2, height)
+        self.next_panel_rect = pygame.Rect(right + 2, 0, width - right - 2, height)
+        self.hold_x = self.grid_x - self.px(HOLD_X)
+        self.hold_preview_x = self.grid_x - self.px(HOLD_PREVIEW_X)
+        self.next_x = right + self.px(NEXT_X)
+        self.next_preview_x = right + self.px(NEXT_PREVIEW_X)
+
+        self.font_size = max(MIN_FONT_SIZE, self.px(FONT_SIZE))
+        self.big_font_size = max(MIN_FONT_SIZE, self.px(BIG_FONT_SIZE))
+
+        self.mini_block = max(2, self.px(MINI_BLOCK))
+        self.mini_x = width - GRID_WIDTH * self.mini_block - self.px(MINI_MARGIN)
+        self.mini_y = self.y(MINI_TOP)
+        self.mini_step = GRID_HEIGHT * self.mini_block + self.px(MINI_GAP)
+        self.garbage_bar = pygame.Rect(self.grid_x - self.px(GARBAGE_BAR_GAP), self.grid_y,
+                                       max(2, self.px(GARBAGE_BAR_WIDTH)), board_height)
+
+    def px(self, value):
+        # A design-pixel length at this scale
+        return round(value * self.scale)
+
+    def y(self, design_y):
+        # A design-pixel y position on this screen
+        return self.top + self.px(design_y)
+
+    def centered(self, surface, design_y):
+        # Position that centres `surface` horizontally at `design_y`
+        return (self.width // 2 - surface.get_width() // 2, self.y(design_y))
+
+    def cell(self, x, y):
+        # Screen position of board cell (x, y)
+        return (self.grid_x + x * self.block, self.grid_y + y * self.block)
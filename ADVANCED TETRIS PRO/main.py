@@ -1,47 +1,49 @@
+import time
+IMPORT_START = time.perf_counter()
+
 import pygame
 import random
-import time
 import math
 import os
+import sys
+import json
 from collections import defaultdict
 
-# Initialize pygame
-pygame.init()
+from audio import SoundManager
+from particles import ParticleSystem
+from profiler import Profiler
+from scores import ScoreStore, DEFAULT_PLAYER
+from replay import ReplayWriter, ReplayReader, ReplayPlayer
+# snapshot, spectate, telemetry and versus (which brings in asyncio) are
+# imported where their modes start, so plain games don't pay for them
+from render_cache import TileAtlas, TextCache, TILE_NORMAL, TILE_ACTIVE, TILE_GHOST
+from layout import Layout, DESIGN_BLOCK, MIDDLE
+
+from controls import KeyboardInput, KEY_ACTIONS, DAS, ARR, SOFT_DROP_FACTOR, POLL_RATE
+from engine import (
+    GameEngine, GRID_WIDTH, GRID_HEIGHT, SHAPES, SHAPES_COLORS, TICK_RATE,
+    BLACK, WHITE, GRAY, RED, YELLOW, ORANGE,
+)
+
 
 # Constants
+# Starting window size; the window can be resized or fullscreen, and
+# everything on screen is laid out for its actual size (see layout.py)
 SCREEN_WIDTH = 800
 SCREEN_HEIGHT = 700
-GRID_WIDTH = 10
-GRID_HEIGHT = 20
-BLOCK_SIZE = 30
-GRID_OFFSET_X = (SCREEN_WIDTH - GRID_WIDTH * BLOCK_SIZE) // 2
-GRID_OFFSET_Y = SCREEN_HEIGHT - GRID_HEIGHT * BLOCK_SIZE - 50
+MAX_PARTICLES = 2000
 
-# Colors
-BLACK = (0, 0, 0)
-WHITE = (255, 255, 255)
-GRAY = (128, 128, 128)
-RED = (255, 0, 0)
-GREEN = (0, 255, 0)
-BLUE = (0, 0, 255)
-CYAN = (0, 255, 255)
-MAGENTA = (255, 0, 255)
-YELLOW = (255, 255, 0)
-ORANGE = (255, 165, 0)
-PURPLE = (128, 0, 128)
+# The simulation always steps at TICK_RATE; rendering runs on its own,
+# capped at MAX_FPS (0 = uncapped) and interpolated between ticks
+TICK = 1 / TICK_RATE
+MAX_FPS = 120
+MAX_FRAME_TIME = 0.25  # Longest real-time gap simulated in one frame
 
-# Tetrimino shapes with colors
-SHAPES = [
-    [[1, 1, 1, 1]],  # I
-    [[1, 1], [1, 1]],  # O
-    [[1, 1, 1], [0, 1, 0]],  # T
-    [[1, 1, 1], [1, 0, 0]],  # J
-    [[1, 1, 1], [0, 0, 1]],  # L
-    [[0, 1, 1], [1, 1, 0]],  # S
-    [[1, 1, 0], [0, 1, 1]]   # Z
-]
+RECORD_REPLAYS = True  # Stream every game to replays/ as it's played
 
-SHAPES_COLORS = [CYAN, YELLOW, PURPLE, BLUE, ORANGE, GREEN, RED]
+FONT_NAME = 'arial'
+# Resolved font path, so later starts skip the system font scan
+FONT_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".fontcache")
 
 # Game states
 MENU = 0
@@ -49,488 +51,639 @@ PLAYING = 1
 PAUSED = 2
 GAME_OVER = 3
 
-# =================================================================
-# NEW: Sound Manager (Handles missing files gracefully)
-# =================================================================
 
-class SoundManager:
-    def __init__(self):
-        self.sounds = {
-            'rotate': self._load_sound("rotate.wav", [128]*1000),
-            'move': self._load_sound("move.wav", [64]*500),
-            'drop': self._load_sound("drop.wav", [200]*1500),
-            'hold': self._load_sound("hold.wav", [150]*800),
-            'menu': self._load_sound("menu.wav", [150]*800),
-            'gameplay': self._load_sound("gameplay.wav", [150]*800),
-            'gameover': self._load_sound("gameover.wav", [150]*800),
-            
-        }
-        self.music_volume = 0.5  # 50% volume for music
-        self.sfx_volume = 0.7    # 70% volume for sound effects
-        self.current_music = None
-        
-    def _load_sound(self, filename, fallback_beep):
-        try:
-            return pygame.mixer.Sound(f"sounds/{filename}")
-        except:
-            return pygame.mixer.Sound(buffer=bytearray(fallback_beep))
-    
-    def play(self, name):
-        sound = self.sounds.get(name)
-        if sound:
-            sound.set_volume(self.sfx_volume)
-            sound.play()
-    
-# =================================================================
-# NEW: Particle System for Visual Effects
-# =================================================================
-class Particle:
-    def __init__(self, x, y, color):
-        self.x = x
-        self.y = y
-        self.color = color
-        self.size = random.randint(2, 5)
-        self.life = random.uniform(0.5, 1.5)
-        self.velocity = [random.uniform(-2, 2), random.uniform(-5, -1)]
-        
-    def update(self, dt):
-        self.life -= dt
-        self.x += self.velocity[0]
-        self.y += self.velocity[1]
-        return self.life > 0
-        
-    def draw(self, screen):
-        alpha = int(255 * (self.life / 1.5))
-        s = pygame.Surface((self.size*2, self.size*2), pygame.SRCALPHA)
-        pygame.draw.circle(s, (*self.color[:3], alpha), (self.size, self.size), self.size)
-        screen.blit(s, (self.x - self.size, self.y - self.size))
+def font_path(name=FONT_NAME):
+    # Path of a system font (None = pygame's default font), looked up
+    # once with the slow SysFont scan and then read from FONT_CACHE
+    try:
+        with open(FONT_CACHE) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+    if name in cache and (cache[name] is None or os.path.exists(cache[name])):
+        return cache[name]
 
-class Tetrimino:
-    def __init__(self, shape_idx, x=GRID_WIDTH//2-2, y=0):
-        self.shape = SHAPES[shape_idx]
-        self.color = SHAPES_COLORS[shape_idx]
-        self.x = x
-        self.y = y
-        self.rotation = 0
-        self.shape_idx = shape_idx
-        self.last_move_time = 0
-        self.last_rotate_time = 0
-        self.move_cooldown = 0.1
-        self.rotate_cooldown = 0.2
-        self.last_drop_time = 0
-        self.lock_delay = 0.5
-        self.lock_timer = 0
-        self.locking = False
-        self.t_spin = False
+    path = pygame.font.match_font(name)
+    cache[name] = path
+    try:
+        with open(FONT_CACHE, "w") as f:
+            json.dump(cache, f)
+    except OSError:
+        pass  # Read-only install: just scan again next time
+    return path
+
+
+class StartupTimer:
+    # Wall time of each startup phase, for --startup-times
+    def __init__(self, start=IMPORT_START):
+        self.start = start
+        self.last = start
+        self.phases = []
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def report(self):
+        lines = [f"  {phase:<14}{seconds * 1000:>9.1f} ms" for phase, seconds in self.phases]
+        lines.append(f"  {'total':<14}{(self.last - self.start) * 1000:>9.1f} ms")
+        return "\n".join(lines)
 
-    def rotate(self, grid):
-        original_rotation = self.rotation
-        original_shape = self.shape
-        
-        self.rotation = (self.rotation + 1) % 4
-        self.shape = [list(row) for row in zip(*self.shape[::-1])]
-        
-        kick_offsets = [
-            [(0, 0), (-1, 0), (-1, 1), (0, -2), (-1, -2)],
-            [(0, 0), (1, 0), (1, -1), (0, 2), (1, 2)],
-            [(0, 0), (1, 0), (1, 1), (0, -2), (1, -2)],
-            [(0, 0), (-1, 0), (-1, -1), (0, 2), (-1, 2)]
-        ]
-        
-        for dx, dy in kick_offsets[original_rotation]:
-            self.x += dx
-            self.y += dy
-            
-            if not self.collision(grid):
-                if self.shape_idx == 2:
-                    corners = 0
-                    test_positions = [
-                        (self.x, self.y),
-                        (self.x + len(self.shape[0]) - 1, self.y),
-                        (self.x, self.y + len(self.shape) - 1),
-                        (self.x + len(self.shape[0]) - 1, self.y + len(self.shape) - 1)
-                    ]
-                    
-                    for tx, ty in test_positions:
-                        if (tx < 0 or tx >= GRID_WIDTH or ty >= GRID_HEIGHT or 
-                            (ty >= 0 and grid[ty][tx] is not None)):
-                            corners += 1
-                    
-                    self.t_spin = (corners >= 3 and time.time() - self.last_rotate_time < 0.1)
-                
-                self.last_rotate_time = time.time()
-                return True
-            
-            self.x -= dx
-            self.y -= dy
-        
-        self.rotation = original_rotation
-        self.shape = original_shape
-        return False
-    
-    def move(self, dx, dy, grid):
-        self.x += dx
-        self.y += dy
-        
-        if self.collision(grid):
-            self.x -= dx
-            self.y -= dy
-            return False
-        
-        self.last_move_time = time.time()
-        
-        if dy != 0:
-            self.locking = False
-            self.lock_timer = 0
-        
-        return True
-    
-    def hard_drop(self, grid):
-        while self.move(0, 1, grid):
-            pass
-        self.locking = True
-        self.lock_timer = self.lock_delay
-        self.last_drop_time = time.time()
-    
-    def collision(self, grid):
-        for y, row in enumerate(self.shape):
-            for x, cell in enumerate(row):
-                if cell:
-                    board_x = self.x + x
-                    board_y = self.y + y
-                    
-                    if (board_x < 0 or board_x >= GRID_WIDTH or 
-                        board_y >= GRID_HEIGHT or 
-                        (board_y >= 0 and grid[board_y][board_x] is not None)):
-                        return True
-        return False
-    
-    def update_lock_timer(self, dt):
-        if self.locking:
-            self.lock_timer += dt
-            if self.lock_timer >= self.lock_delay:
-                return True
-        return False
-    
-    def draw(self, screen, ghost=False):
-        color = self.color
-        alpha = 100 if ghost else 255
-        s = pygame.Surface((BLOCK_SIZE, BLOCK_SIZE), pygame.SRCALPHA)
-        s.fill((color[0], color[1], color[2], alpha))
-        
-        for y, row in enumerate(self.shape):
-            for x, cell in enumerate(row):
-                if cell:
-                    pos_x = GRID_OFFSET_X + (self.x + x) * BLOCK_SIZE
-                    pos_y = GRID_OFFSET_Y + (self.y + y) * BLOCK_SIZE
-                    
-                    if ghost:
-                        pygame.draw.rect(screen, color, (pos_x, pos_y, BLOCK_SIZE, BLOCK_SIZE), 1)
-                    else:
-                        screen.blit(s, (pos_x, pos_y))
-                        highlight = pygame.Surface((BLOCK_SIZE//3, BLOCK_SIZE//3), pygame.SRCALPHA)
-                        highlight.fill((255, 255, 255, 50))
-                        screen.blit(highlight, (pos_x + 2, pos_y + 2))
-                        pygame.draw.rect(screen, WHITE, (pos_x, pos_y, BLOCK_SIZE, BLOCK_SIZE), 1)
 
 class TetrisGame:
    
-    def __init__(self):
-        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    def __init__(self, time_source=time.perf_counter, max_fps=MAX_FPS, replay=None, speed=1.0,
+                 startup=None, scores=None, controls=None, poll_rate=0, versus=None, practice=False,
+                 spectators=None, size=(SCREEN_WIDTH, SCREEN_HEIGHT), fullscreen=False,
+                 telemetry=None):
+        # Startup only brings up what the menu needs (display, fonts);
+        # the mixer and sounds load on the audio thread and the gameplay
+        # assets right after the first menu frame, see load_assets()
+        self.startup = startup or StartupTimer()
+        self.startup.mark('imports')
+        pygame.display.init()
+        pygame.font.init()
+        self.window_size = size  # When not fullscreen
+        self.fullscreen = fullscreen
+        self.screen = self.open_window()
         pygame.display.set_caption("Advanced Tetris Pro")
         self.clock = pygame.time.Clock()
-        self.font = pygame.font.SysFont('Arial', 24)
-        self.big_font = pygame.font.SysFont('Arial', 48)
-        self.high_score = self.load_high_score()  # Load high score when game starts
-        
-        # Initialize all essential attributes
-        self.game_state = MENU  # This fixes the immediate error
-        self.grid = []
-        self.current_piece = None
-        self.next_pieces = []
-        self.held_piece = None
-        self.bag = []
-        self.score = 0
-        self.level = 1
- #       self.lines_ed = 0
-        self.combo = -1
-        self.b2b = False
-        self.particles = []
+        self.time_source = time_source  # Monotonic seconds, injectable for tests
+        self.max_fps = max_fps
+        self.startup.mark('display')
+        self.font_file = font_path()
+        self.text = TextCache()
+        self.overlays = {}
+        self.mini_boards = {}
+        self.pending_size = None  # Window size to lay out for, from VIDEORESIZE
+        self.set_layout(*self.screen.get_size())
+        self.startup.mark('fonts')
+        self.scores = scores or ScoreStore()
+        self.high_score = self.scores.best(self.scores.player)
+        
+        # All game rules live in the headless engine; this class only
+        # renders it, plays sounds/effects for its events and feeds input
+        # With `replay` (a ReplayPlayer) the game plays it back at `speed`
+        # instead of taking keyboard input
+        self.replay = replay
+        self.speed = speed
+        # The keyboard handler does its own auto-repeat, so keyboard games
+        # have no engine input cooldowns
+        self.engine = replay.engine if replay else GameEngine(move_cooldown=0, rotate_cooldown=0)
+        self.controls = controls or KeyboardInput()
+        self.poll_rate = poll_rate  # Input polls per second between frames (0 = once a frame)
+        self.replay_writer = None
+        self.autoplay = None  # AIInput while the demo is running
+        # With `versus` (a VersusClient) the game waits for a match on
+        # the relay and then plays it; `session` is the VersusSession
+        self.versus = versus
+        self.session = None
+        self.desyncs_seen = 0
+        # Practice mode: BACKSPACE takes back the last piece (SHIFT to
+        # redo); such games aren't recorded or scored
+        self.undo = None
+        if practice and versus is None and replay is None:
+            from snapshot import UndoBuffer  # Only needed for practice
+            self.undo = UndoBuffer()
+        # With `spectators` (a started SpectatorServer) every tick is
+        # broadcast to viewers, see spectate.py
+        self.spectators = spectators
+        # With `telemetry` (a telemetry.EventBus) every tick's engine
+        # events are published to it; same games as get scored
+        self.telemetry = telemetry
+        self.game_state = MENU
+        self.particles = None
+        self.assets_ready = False
+        self.frame_dt = 1 / 60
         self.screen_shake = 0
         
-        # NEW: Enhanced systemsoundself.music = MusicManager()
         self.sound = SoundManager()
+        self.profiler = Profiler(self)
+        self.startup.mark('audio')
         self.reset_game()
-        self.particles = []
-        self.screen_shake = 0
-        self.high_score = self.load_high_score()
-
+        if self.replay:
+            self.load_assets()
+            self.game_state = PLAYING
+    
+    def load_assets(self):
+        # Board layers, previews and the particle pool (which imports
+        # NumPy); run after the first menu frame, or on demand
+        if self.assets_ready:
+            return
+        self.build_static_layers()
+        self.particles = ParticleSystem(capacity=MAX_PARTICLES,
+                                        scale=self.layout.block / DESIGN_BLOCK)
+        self.assets_ready = True
+        self.startup.mark('assets')
+    
+    # -----------------------------------------------------------------
+    # Window size. Everything drawn at a size-dependent scale (tiles,
+    # fonts, previews, static layers) is rebuilt once per resize, so
+    # frames are drawn natively at any resolution, never scaled.
+    # -----------------------------------------------------------------
+    
+    def open_window(self):
+        if self.fullscreen:
+            return pygame.display.set_mode((0, 0), pygame.FULLSCREEN)
+        return pygame.display.set_mode(self.window_size, pygame.RESIZABLE)
+    
+    def set_layout(self, width, height):
+        self.layout = layout = Layout(width, height)
+        self.font = pygame.font.Font(self.font_file, layout.font_size)
+        self.big_font = pygame.font.Font(self.font_file, layout.big_font_size)
+        self.tiles = TileAtlas(layout.block)
+        self.text.clear()
+        self.overlays.clear()
+        self.mini_boards.clear()
+    
+    def resize(self, width, height):
+        if not self.fullscreen:
+            self.window_size = (width, height)
+            if self.screen.get_size() != (width, height):
+                self.screen = self.open_window()
+        self.relayout()
+    
+    def toggle_fullscreen(self):
+        self.fullscreen = not self.fullscreen
+        self.screen = self.open_window()
+        self.relayout()
+    
+    def relayout(self):
+        self.set_layout(*self.screen.get_size())
+        if self.assets_ready:
+            self.build_static_layers()
+            self.particles.clear()
+            self.particles.scale = self.layout.block / DESIGN_BLOCK
+        self.drawn_state = None
 
-    def load_high_score(self):
-        try:
-            with open("highscore.txt", "r") as f:
-                return int(f.read())
-        except:
-            return 0
-            
-    def save_high_score(self):
-        with open("highscore.txt", "w") as f:
-            f.write(str(max(self.score, self.high_score)))
+    
+    def scored(self):
+        # Replays were recorded when played; practice games don't count
+        return self.replay is None and (self.undo is None or bool(self.autoplay))
+    
+    def game_mode(self):
+        # (player, mode) the current game is recorded under
+        if self.autoplay:
+            return 'ai', 'demo'
+        return self.scores.player, 'versus' if self.session else 'play'
+    
+    def record_score(self):
+        # Queued for the score store's writer thread, so game over
+        # never waits on the disk
+        if not self.scored():
+            return
+        player, mode = self.game_mode()
+        self.scores.record(self.engine, player=player, mode=mode)
+        if not self.autoplay:
+            self.high_score = max(self.engine.score, self.high_score)
 
     def add_particles(self, x, y, color, count=10):
-        for _ in range(count):
-            self.particles.append(
-                Particle(
-                    GRID_OFFSET_X + x * BLOCK_SIZE + BLOCK_SIZE//2,
-                    GRID_OFFSET_Y + y * BLOCK_SIZE + BLOCK_SIZE//2,
-                    color
-                )
-            )
+        if self.particles is None:
+            return
+        px, py = self.layout.cell(x, y)
+        half = self.layout.block // 2
+        self.particles.emit(px + half, py + half, color, count)
     
     def screen_shake_effect(self, intensity=5):
         self.screen_shake = intensity
 
     def reset_game(self):
-        self.grid = [[None for _ in range(GRID_WIDTH)] for _ in range(GRID_HEIGHT)]
-        self.current_piece = self.new_piece()
-        self.next_pieces = [self.new_piece() for _ in range(5)]
-        self.held_piece = None
-        self.can_hold = True
-        self.score = 0
-        self.level = 1
-        self.combo = -1
+        self.stop_recording()
+        if self.replay is None:
+            self.engine.reset()
+        self.invalidate_layers()
         self.game_state = MENU
-        self.bag = list(range(len(SHAPES)))
-        random.shuffle(self.bag)
-        self.gravity = self.calculate_gravity()
-        self.drop_timer = 0
-        self.piece_count = 0
-        self.b2b = False
-        self.particles = []
+        self.controls.reset()
+        if self.undo is not None:
+            self.undo.clear()
+        if self.particles is not None:
+            self.particles.clear()
         self.screen_shake = 0
         if self.game_state == MENU:
-          self.sound.play('menu') 
-
-    def new_piece(self):
-        if not self.bag:
-            self.bag = list(range(len(SHAPES)))
-            random.shuffle(self.bag)
-        
-        shape_idx = self.bag.pop()
-        return Tetrimino(shape_idx)
-     # Try loading music
+          self.sound.play_music('menu')
 
-    def calculate_gravity(self):
-        return 0.5  # Fixed slow speed
+    def handle_engine_events(self):
+        for name, payload in self.engine.drain_events():
+            if name == 'move':
+                self.sound.play('move')
+            elif name == 'rotate':
+                self.sound.play('rotate')
+            elif name == 'drop':
+                self.sound.play('drop')
+                self.screen_shake_effect(2)
+            elif name == 'hold':
+                self.sound.play('hold')
+            elif name == 'lock':
+                cells, color = payload[:2]
+                self.pending_cells.extend(cells)
+                for x, y in cells:
+                    self.add_particles(x, y, color)
+            elif name == 'clear':
+                rows = payload[0]
+                self.stack_dirty = True
+                for y in rows:
+                    for x in range(GRID_WIDTH):
+                        self.add_particles(x, y, WHITE, count=3)
+                self.screen_shake_effect(2 + 2 * len(rows))
+            elif name == 'garbage':
+                self.stack_dirty = True
+                self.screen_shake_effect(2 + payload)
+            elif name == 'game_over':
+                self.stop_recording()
+                self.game_state = GAME_OVER
+                self.sound.stop_music()
+                self.sound.play('gameover')
+                self.record_score()
+    
+    # -----------------------------------------------------------------
+    # Layered rendering: `background` holds what never changes (board
+    # frame, grid lines), `backdrop` is background + locked stack + side
+    # panels and is only repainted when those change. Every frame just
+    # the ghost, falling piece and particles go on top, and only the
+    # rectangles that actually changed are sent to display.update().
+    # -----------------------------------------------------------------
 
-    def hold_piece(self):
-        if not self.can_hold:
-            return
-        
-        if self.held_piece is None:
-            self.held_piece = Tetrimino(self.current_piece.shape_idx)
-            self.current_piece = self.next_pieces.pop(0)
-            self.next_pieces.append(self.new_piece())
-        else:
-            held_idx = self.held_piece.shape_idx
-            self.held_piece = Tetrimino(self.current_piece.shape_idx)
-            self.current_piece = Tetrimino(held_idx)
+    def build_static_layers(self):
+        layout = self.layout
+        self.board_rect = layout.board_rect
+        self.hold_panel_rect = layout.hold_panel_rect
+        self.next_panel_rect = layout.next_panel_rect
+        
+        self.background = pygame.Surface(layout.size).convert()
+        self.background.fill(BLACK)
+        frame = max(2, layout.px(2))
+        pygame.draw.rect(self.background, GRAY, self.board_rect.inflate(2 * frame, 2 * frame), 0)
+        line = max(1, layout.px(1))
+        for x in range(GRID_WIDTH + 1):
+            pygame.draw.line(self.background, (50, 50, 50), 
+                            layout.cell(x, 0), layout.cell(x, GRID_HEIGHT), line)
+        for y in range(GRID_HEIGHT + 1):
+            pygame.draw.line(self.background, (50, 50, 50), 
+                            layout.cell(0, y), layout.cell(GRID_WIDTH, y), line)
         
-        self.can_hold = False
-        self.current_piece.x = GRID_WIDTH // 2 - len(self.current_piece.shape[0]) // 2
-        self.current_piece.y = 0
+        self.backdrop = self.background.copy()
+        self.preview_surfaces = [self.render_preview(shape, SHAPES_COLORS[i])
+                                 for i, shape in enumerate(SHAPES)]
+        self.invalidate_layers()
     
+    def invalidate_layers(self):
+        self.stack_dirty = True
+        self.pending_cells = []
+        self.hold_key = None
+        self.next_key = None
+        self.dynamic_rects = []
+        self.dynamic_key = None
+        self.particles_drawn = False
+        self.drawn_state = None
     
-    def get_ghost_position(self):
-        ghost = Tetrimino(self.current_piece.shape_idx, 
-                         self.current_piece.x, self.current_piece.y)
-        while not ghost.collision(self.grid):
-            ghost.y += 1
-        ghost.y -= 1
-        return ghost
+    def draw_block(self, surface, color, pos_x, pos_y, style=TILE_NORMAL):
+        surface.blit(self.tiles.get(color, style), (pos_x, pos_y))
     
-    def lock_piece(self):
-        for y, row in enumerate(self.current_piece.shape):
+    def render_preview(self, shape, color):
+        block = self.layout.block
+        s = pygame.Surface((len(shape[0]) * block, len(shape) * block), pygame.SRCALPHA)
+        for y, row in enumerate(shape):
             for x, cell in enumerate(row):
                 if cell:
-                    board_x = self.current_piece.x + x
-                    board_y = self.current_piece.y + y
-                    if 0 <= board_y < GRID_HEIGHT:
-                        self.grid[board_y][board_x] = self.current_piece.color
-                        self.add_particles(board_x, board_y, self.current_piece.color)
-
-        
-        
-        if any(self.grid[0]):
-            self.game_state = GAME_OVER
-            self.sound.play('gameover')
-            self.save_high_score()
-            return
-            
-        self.current_piece = self.next_pieces.pop(0)
-        self.next_pieces.append(self.new_piece())
-        self.can_hold = True
-        self.piece_count += 1
-        
-        self.current_piece.x = GRID_WIDTH // 2 - len(self.current_piece.shape[0]) // 2
-        self.current_piece.y = 0
-
-        if any(self.grid[0]):
-         self.game_state = GAME_OVER
-         self.sound.play('gameover')
-         self.save_high_score()  # Save when game ends
-         return
-        
-        if any(self.grid[0]):
-         self.sound.play('gameover')
-
+                    self.draw_block(s, color, x * block, y * block)
+        return s.convert_alpha()
+    
     def draw_grid(self):
-        pygame.draw.rect(self.screen, GRAY, 
-                         (GRID_OFFSET_X - 2, GRID_OFFSET_Y - 2, 
-                          GRID_WIDTH * BLOCK_SIZE + 4, GRID_HEIGHT * BLOCK_SIZE + 4), 0)
-        
-        for y in range(GRID_HEIGHT):
-            for x in range(GRID_WIDTH):
-                if self.grid[y][x] is not None:
-                    pygame.draw.rect(self.screen, self.grid[y][x], 
-                                    (GRID_OFFSET_X + x * BLOCK_SIZE, 
-                                     GRID_OFFSET_Y + y * BLOCK_SIZE, 
-                                     BLOCK_SIZE, BLOCK_SIZE))
-                    pygame.draw.rect(self.screen, WHITE, 
-                                    (GRID_OFFSET_X + x * BLOCK_SIZE, 
-                                     GRID_OFFSET_Y + y * BLOCK_SIZE, 
-                                     BLOCK_SIZE, BLOCK_SIZE), 1)
+        # Repaints the locked stack into the backdrop: everything after a
+        # line clear or reset, otherwise only the cells that just locked.
+        # Returns the changed rect, or None when the stack didn't change.
+        grid = self.engine.grid
+        if self.stack_dirty:
+            self.backdrop.blit(self.background, self.board_rect, self.board_rect)
+            cells = [(x, y) for y in range(GRID_HEIGHT) if not grid.is_row_empty(y)
+                     for x in range(GRID_WIDTH) if grid[y][x] is not None]
+            changed = self.board_rect
+        elif self.pending_cells:
+            cells = self.pending_cells
+            changed = None
+        else:
+            return None
         
-        for x in range(GRID_WIDTH + 1):
-            pygame.draw.line(self.screen, (50, 50, 50), 
-                            (GRID_OFFSET_X + x * BLOCK_SIZE, GRID_OFFSET_Y), 
-                            (GRID_OFFSET_X + x * BLOCK_SIZE, GRID_OFFSET_Y + GRID_HEIGHT * BLOCK_SIZE))
+        block = self.layout.block
+        for x, y in cells:
+            rect = pygame.Rect(self.layout.cell(x, y), (block, block))
+            self.draw_block(self.backdrop, grid[y][x], rect.x, rect.y)
+            changed = rect if changed is None else changed.union(rect)
         
-        for y in range(GRID_HEIGHT + 1):
-            pygame.draw.line(self.screen, (50, 50, 50), 
-                            (GRID_OFFSET_X, GRID_OFFSET_Y + y * BLOCK_SIZE), 
-                            (GRID_OFFSET_X + GRID_WIDTH * BLOCK_SIZE, GRID_OFFSET_Y + y * BLOCK_SIZE))
+        self.stack_dirty = False
+        self.pending_cells = []
+        return changed
     
     def draw_info_panel(self):
+        # Both side panels live in the backdrop and are re-rendered only
+        # when what they show changes; returns the rects that changed
+        engine = self.engine
+        layout = self.layout
+        changed = []
+        
         # Next pieces
-        next_text = self.font.render("NEXT:", True, WHITE)
-        self.screen.blit(next_text, (GRID_OFFSET_X + GRID_WIDTH * BLOCK_SIZE + 30, 50))
-        
-        for i, piece in enumerate(self.next_pieces[:5]):
-            for y, row in enumerate(piece.shape):
-                for x, cell in enumerate(row):
-                    if cell:
-                        pos_x = GRID_OFFSET_X + GRID_WIDTH * BLOCK_SIZE + 50 + x * BLOCK_SIZE
-                        pos_y = 100 + i * 100 + y * BLOCK_SIZE
-                        pygame.draw.rect(self.screen, piece.color, 
-                                        (pos_x, pos_y, BLOCK_SIZE, BLOCK_SIZE))
-                        pygame.draw.rect(self.screen, WHITE, 
-                                        (pos_x, pos_y, BLOCK_SIZE, BLOCK_SIZE), 1)
+        next_key = tuple(piece.shape_idx for piece in engine.next_pieces[:5])
+        if next_key != self.next_key:
+            self.next_key = next_key
+            self.backdrop.blit(self.background, self.next_panel_rect, self.next_panel_rect)
+            next_text = self.text.render(self.font, "NEXT:", WHITE)
+            self.backdrop.blit(next_text, (layout.next_x, layout.y(50)))
+            for i, shape_idx in enumerate(next_key):
+                self.backdrop.blit(self.preview_surfaces[shape_idx],
+                                   (layout.next_preview_x, layout.y(100 + i * 100)))
+            changed.append(self.next_panel_rect)
+        
+        held = engine.held_piece.shape_idx if engine.held_piece else None
+        hold_key = (held, engine.score, engine.level, engine.lines, engine.combo,
+                    engine.current_piece.t_spin, engine.b2b, engine.last_clear, self.high_score)
+        if hold_key == self.hold_key:
+            return changed
+        self.hold_key = hold_key
+        self.backdrop.blit(self.background, self.hold_panel_rect, self.hold_panel_rect)
+        # Long labels must not spill into the board
+        self.backdrop.set_clip(self.hold_panel_rect)
         
         # Hold piece
-        hold_text = self.font.render("HOLD:", True, WHITE)
-        self.screen.blit(hold_text, (GRID_OFFSET_X - 150, 50))
-        
-        if self.held_piece:
-            for y, row in enumerate(self.held_piece.shape):
-                for x, cell in enumerate(row):
-                    if cell:
-                        pos_x = GRID_OFFSET_X - 130 + x * BLOCK_SIZE
-                        pos_y = 100 + y * BLOCK_SIZE
-                        pygame.draw.rect(self.screen, self.held_piece.color, 
-                                        (pos_x, pos_y, BLOCK_SIZE, BLOCK_SIZE))
-                        pygame.draw.rect(self.screen, WHITE, 
-                                        (pos_x, pos_y, BLOCK_SIZE, BLOCK_SIZE), 1)
+        hold_text = self.text.render(self.font, "HOLD:", WHITE)
+        self.backdrop.blit(hold_text, (layout.hold_x, layout.y(50)))
+        
+        if held is not None:
+            self.backdrop.blit(self.preview_surfaces[held], (layout.hold_preview_x, layout.y(100)))
         
         # Score and level
-        score_text = self.font.render(f"SCORE: {self.score}", True, WHITE)
-        level_text = self.font.render(f"LEVEL: {self.level}", True, WHITE)
-        high_score_text = self.font.render(f"HIGH: {self.high_score}", True, YELLOW)
+        score_text = self.text.render(self.font, f"SCORE: {engine.score}", WHITE)
+        level_text = self.text.render(self.font, f"LEVEL: {engine.level}", WHITE)
+        lines_text = self.text.render(self.font, f"LINES: {engine.lines}", WHITE)
+        high_score_text = self.text.render(self.font, f"HIGH: {self.high_score}", YELLOW)
         
-        self.screen.blit(score_text, (GRID_OFFSET_X - 150, 250))
-        self.screen.blit(level_text, (GRID_OFFSET_X - 150, 300))
-        self.screen.blit(high_score_text, (GRID_OFFSET_X - 150, 200))
+        self.backdrop.blit(score_text, (layout.hold_x, layout.y(250)))
+        self.backdrop.blit(level_text, (layout.hold_x, layout.y(300)))
+        self.backdrop.blit(lines_text, (layout.hold_x, layout.y(350)))
+        self.backdrop.blit(high_score_text, (layout.hold_x, layout.y(200)))
         
         # Combo
-        if self.combo > 0:
-            combo_text = self.font.render(f"COMBO: {self.combo}", True, WHITE)
-            self.screen.blit(combo_text, (GRID_OFFSET_X - 150, 400))
+        if engine.combo > 0:
+            combo_text = self.text.render(self.font, f"COMBO: {engine.combo}", WHITE)
+            self.backdrop.blit(combo_text, (layout.hold_x, layout.y(400)))
         
         # T-spin indicator
-        if self.current_piece.t_spin:
-            tspin_text = self.font.render("T-SPIN!", True, YELLOW)
-            self.screen.blit(tspin_text, (GRID_OFFSET_X - 150, 450))
+        if engine.current_piece.t_spin:
+            tspin_text = self.text.render(self.font, "T-SPIN!", YELLOW)
+            self.backdrop.blit(tspin_text, (layout.hold_x, layout.y(450)))
         
         # Back-to-back indicator
-        if self.b2b:
-            b2b_text = self.font.render("B2B", True, ORANGE)
-            self.screen.blit(b2b_text, (GRID_OFFSET_X - 150, 500))
-
-        high_score_text = self.font.render(f"HIGH: {self.high_score}", True, YELLOW)
-        self.screen.blit(high_score_text, (GRID_OFFSET_X - 150, 200))    
+        if engine.b2b:
+            b2b_text = self.text.render(self.font, "B2B", ORANGE)
+            self.backdrop.blit(b2b_text, (layout.hold_x, layout.y(500)))
+        
+        # Last line clear / T-spin
+        if engine.last_clear:
+            clear_text = self.text.render(self.font, engine.last_clear, YELLOW)
+            self.backdrop.blit(clear_text, (layout.hold_x, layout.y(550)))
+        
+        self.backdrop.set_clip(None)
+        changed.append(self.hold_panel_rect)
+        return changed
     
     def draw_menu(self):
-        title = self.big_font.render("ADVANCED TETRIS PRO", True, WHITE)
-        start_text = self.font.render("Press ENTER to Start", True, WHITE)
-        controls_text1 = self.font.render("Controls:", True, WHITE)
-        controls_text2 = self.font.render("Left/Right: Move", True, WHITE)
-        controls_text3 = self.font.render("Up: Rotate", True, WHITE)
-        controls_text4 = self.font.render("Down: Soft Drop", True, WHITE)
-        controls_text5 = self.font.render("Space: Hard Drop", True, WHITE)
-        controls_text6 = self.font.render("C: Hold", True, WHITE)
-        controls_text7 = self.font.render("P: Pause", True, WHITE)
-        
-        self.screen.blit(title, (SCREEN_WIDTH // 2 - title.get_width() // 2, 100))
-        self.screen.blit(start_text, (SCREEN_WIDTH // 2 - start_text.get_width() // 2, 300))
-        self.screen.blit(controls_text1, (SCREEN_WIDTH // 2 - controls_text1.get_width() // 2, 400))
-        self.screen.blit(controls_text2, (SCREEN_WIDTH // 2 - controls_text2.get_width() // 2, 450))
-        self.screen.blit(controls_text3, (SCREEN_WIDTH // 2 - controls_text3.get_width() // 2, 480))
-        self.screen.blit(controls_text4, (SCREEN_WIDTH // 2 - controls_text4.get_width() // 2, 510))
-        self.screen.blit(controls_text5, (SCREEN_WIDTH // 2 - controls_text5.get_width() // 2, 540))
-        self.screen.blit(controls_text6, (SCREEN_WIDTH // 2 - controls_text6.get_width() // 2, 570))
-        self.screen.blit(controls_text7, (SCREEN_WIDTH // 2 - controls_text7.get_width() // 2, 600))
+        title = self.text.render(self.big_font, "ADVANCED TETRIS PRO", WHITE)
+        start_text = self.text.render(self.font, "Press ENTER to Start" if self.versus is None
+                                      else "Waiting for opponents...", WHITE)
+        controls_text1 = self.text.render(self.font, "Controls:", WHITE)
+        controls_text2 = self.text.render(self.font, "Left/Right: Move", WHITE)
+        controls_text3 = self.text.render(self.font, "Up/Z: Rotate Right/Left", WHITE)
+        controls_text4 = self.text.render(self.font, "Down: Soft Drop", WHITE)
+        controls_text5 = self.text.render(self.font, "Space: Hard Drop", WHITE)
+        controls_text6 = self.text.render(self.font, "C: Hold", WHITE)
+        controls_text7 = self.text.render(self.font, "P: Pause   D: Demo" if self.undo is None
+                                          else "P: Pause   D: Demo   Backspace: Undo", WHITE)
+        
+        self.screen.blit(title, self.layout.centered(title, 100))
+        self.screen.blit(start_text, self.layout.centered(start_text, 300))
+        self.screen.blit(controls_text1, self.layout.centered(controls_text1, 400))
+        self.screen.blit(controls_text2, self.layout.centered(controls_text2, 450))
+        self.screen.blit(controls_text3, self.layout.centered(controls_text3, 480))
+        self.screen.blit(controls_text4, self.layout.centered(controls_text4, 510))
+        self.screen.blit(controls_text5, self.layout.centered(controls_text5, 540))
+        self.screen.blit(controls_text6, self.layout.centered(controls_text6, 570))
+        self.screen.blit(controls_text7, self.layout.centered(controls_text7, 600))
+    
+    def get_overlay(self, alpha):
+        overlay = self.overlays.get(alpha)
+        if overlay is None:
+            overlay = pygame.Surface(self.layout.size, pygame.SRCALPHA)
+            overlay.fill((0, 0, 0, alpha))
+            self.overlays[alpha] = overlay
+        return overlay
     
     def draw_pause(self):
-        pause_text = self.big_font.render("PAUSED", True, WHITE)
-        continue_text = self.font.render("Press P to Continue", True, WHITE)
-        quit_text = self.font.render("Q: Quit to Menu", True, RED)
+        pause_text = self.text.render(self.big_font, "PAUSED", WHITE)
+        continue_text = self.text.render(self.font, "Press P to Continue", WHITE)
+        quit_text = self.text.render(self.font, "Q: Quit to Menu", RED)
         
-        s = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-        s.fill((0, 0, 0, 128))
-        self.screen.blit(s, (0, 0))
+        self.screen.blit(self.get_overlay(128), (0, 0))
         
-        self.screen.blit(pause_text, (SCREEN_WIDTH // 2 - pause_text.get_width() // 2, SCREEN_HEIGHT // 2 - 50))
-        self.screen.blit(continue_text, (SCREEN_WIDTH // 2 - continue_text.get_width() // 2, SCREEN_HEIGHT // 2 + 20))
-        self.screen.blit(quit_text, (SCREEN_WIDTH // 2 - quit_text.get_width() // 2, SCREEN_HEIGHT // 2 + 90))
+        self.screen.blit(pause_text, self.layout.centered(pause_text, MIDDLE - 50))
+        self.screen.blit(continue_text, self.layout.centered(continue_text, MIDDLE + 20))
+        self.screen.blit(quit_text, self.layout.centered(quit_text, MIDDLE + 90))
     
     def draw_game_over(self):
-        over_text = self.big_font.render("GAME OVER", True, RED)
-        score_text = self.font.render(f"Final Score: {self.score}", True, WHITE)
-        high_score_text = self.font.render(f"High Score: {max(self.score, self.high_score)}", True, YELLOW)
-        restart_text = self.font.render("Press ENTER to Restart", True, WHITE)
-        
-        s = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-        s.fill((0, 0, 0, 180))
-        self.screen.blit(s, (0, 0))
-        
-        self.screen.blit(over_text, (SCREEN_WIDTH // 2 - over_text.get_width() // 2, SCREEN_HEIGHT // 2 - 100))
-        self.screen.blit(score_text, (SCREEN_WIDTH // 2 - score_text.get_width() // 2, SCREEN_HEIGHT // 2 - 20))
-        self.screen.blit(high_score_text, (SCREEN_WIDTH // 2 - high_score_text.get_width() // 2, SCREEN_HEIGHT // 2 + 40))
-        self.screen.blit(restart_text, (SCREEN_WIDTH // 2 - restart_text.get_width() // 2, SCREEN_HEIGHT // 2 + 100))
+        won = self.session is not None and self.session.winner() == self.session.player
+        over_text = self.text.render(self.big_font, "YOU WIN" if won else "GAME OVER", YELLOW if won else RED)
+        score_text = self.text.render(self.font, f"Final Score: {self.engine.score}", WHITE)
+        high_score_text = self.text.render(self.font, f"High Score: {max(self.engine.score, self.high_score)}", YELLOW)
+        restart_text = self.text.render(self.font, "Press ENTER to Restart" if self.versus is None
+                                        else "Match over", WHITE)
+        
+        self.screen.blit(self.get_overlay(180), (0, 0))
+        
+        self.screen.blit(over_text, self.layout.centered(over_text, MIDDLE - 100))
+        self.screen.blit(score_text, self.layout.centered(score_text, MIDDLE - 20))
+        self.screen.blit(high_score_text, self.layout.centered(high_score_text, MIDDLE + 40))
+        self.screen.blit(restart_text, self.layout.centered(restart_text, MIDDLE + 100))
+    
+    def draw_piece(self, piece, ghost=False, offset_y=0):
+        # Returns the screen rect covered by the piece; offset_y shifts it
+        # down by a few pixels for smooth falling between ticks
+        tile = self.tiles.get(piece.color, TILE_GHOST if ghost else TILE_ACTIVE)
+        block = self.layout.block
+        left, top = self.layout.cell(piece.x, piece.y)
+        top += offset_y
+        for x, y in piece.orientation.cells:
+            self.screen.blit(tile, (left + x * block, top + y * block))
+        
+        return pygame.Rect(left, top, len(piece.shape[0]) * block, len(piece.shape) * block)
+    
+    def draw_overlays(self):
+        # Opaque extras drawn over every frame; returns their rects
+        return self.draw_versus() + self.draw_hud()
+    
+    def draw_versus(self):
+        if self.session is None or self.game_state == MENU:
+            return []
+        layout = self.layout
+        rects = []
+        for i, mirror in enumerate(self.session.mirrors.values()):
+            engine = mirror.engine
+            key = (engine.ticks, engine.game_over, mirror.left)
+            cached = self.mini_boards.get(mirror.player)
+            if cached is None or cached[0] != key:
+                cached = self.mini_boards[mirror.player] = (key, self.render_mini_board(mirror))
+            pos = (layout.mini_x, layout.mini_y + i * layout.mini_step)
+            rects.append(self.screen.blit(cached[1], pos))
+        
+        # Incoming garbage, bottom up
+        bar = layout.garbage_bar
+        self.screen.fill(BLACK, bar)
+        pending = min(self.engine.pending_garbage(), GRID_HEIGHT) * layout.block
+        if pending:
+            self.screen.fill(RED, (bar.x, bar.bottom - pending, bar.width, pending))
+        rects.append(bar)
+        return rects
+    
+    def render_mini_board(self, mirror):
+        engine = mirror.engine
+        block = self.layout.mini_block
+        surface = pygame.Surface((GRID_WIDTH * block, GRID_HEIGHT * block))
+        surface.fill(BLACK)
+        grid = engine.grid
+        cells = [(x, y, grid[y][x]) for y in range(GRID_HEIGHT) if not grid.is_row_empty(y)
+                 for x in range(GRID_WIDTH) if grid[y][x] is not None]
+        if not engine.game_over:
+            piece = engine.current_piece
+            cells += [(piece.x + x, piece.y + y, piece.color) for x, y in piece.orientation.cells]
+        for x, y, color in cells:
+            if y >= 0:
+                surface.fill(color, (x * block, y * block, block - 1, block - 1))
+        if not mirror.alive:
+            surface.blit(self.get_overlay(160), (0, 0))
+        pygame.draw.rect(surface, GRAY, surface.get_rect(), 1)
+        return surface
+    
+    def draw_hud(self):
+        # Profiler overlay, opaque and on top of everything (F3)
+        if not self.profiler.hud:
+            return []
+        return [self.profiler.draw_hud(self.screen)]
+    
+    def draw_particles(self):
+        if self.particles is None:
+            return []
+        self.particles.update(self.frame_dt)
+        rects = self.particles.draw(self.screen)
+        self.particles_drawn = bool(rects)
+        return rects
     
-    def update(self, dt):
+    def start_recording(self):
+        if (RECORD_REPLAYS and self.replay is None and self.undo is None
+                and self.replay_writer is None and self.engine.ticks == 0):
+            self.replay_writer = ReplayWriter.for_engine(self.engine)
+    
+    def stop_recording(self):
+        # Finished games get a footer; anything else is left truncated
+        if self.replay_writer is not None:
+            if self.engine.game_over:
+                self.replay_writer.finish(self.engine)
+            else:
+                self.replay_writer.close()
+            self.replay_writer = None
+            self.engine.recorder = None
+    
+    def update(self, now=None):
+        # One fixed simulation tick; `now` is the time it stands for
+        if self.versus is not None:
+            self.receive_versus()
         if self.game_state == PLAYING:
-            self.drop_timer += dt
-            if self.drop_timer >= self.gravity:
-                if not self.current_piece.move(0, 1, self.grid):
-                    self.current_piece.locking = True
-                self.drop_timer = 0
-            
-            if self.current_piece.update_lock_timer(dt):
-                self.lock_piece()
+            if self.replay:
+                self.replay.step()
+            else:
+                telemetry = self.telemetry if self.scored() else None
+                if telemetry is not None:
+                    if self.engine.ticks == 0:
+                        telemetry.begin(self.engine, *self.game_mode())
+                    mark = len(self.engine.events)
+                if self.autoplay:
+                    action = self.autoplay(self.engine)
+                    if action is not None:
+                        self.engine.apply(action)
+                else:
+                    self.controls.tick(self.engine, self.time_source() if now is None else now)
+                self.engine.step()
+                if telemetry is not None:
+                    telemetry.publish(self.engine, mark)
+                if self.undo is not None and not self.autoplay:
+                    self.save_undo()
+                if self.session is not None:
+                    self.session.after_tick()
+        if self.session is not None:
+            self.update_versus()
+        if self.spectators is not None:
+            self.spectators.publish(self.engine)
+        self.handle_engine_events()
+    
+    def save_undo(self):
+        # One snapshot per piece, taken as it spawns
+        engine = self.engine
+        latest = self.undo.latest
+        if not engine.game_over and (latest is None or latest.piece_count != engine.piece_count):
+            from snapshot import Snapshot
+            self.undo.push(Snapshot.of(engine))
     
-    def draw(self):
-        self.screen.fill(BLACK)
+    def rewind(self, redo=False):
+        # Practice mode: back to the start of the previous piece (or, after
+        # a top out, of the piece that topped out)
+        if redo:
+            snapshot = self.undo.redo()
+        elif self.game_state == GAME_OVER:
+            snapshot = self.undo.latest
+        else:
+            snapshot = self.undo.undo()
+        if snapshot is None:
+            return
+        snapshot.restore(self.engine)
+        self.controls.reset()
+        self.invalidate_layers()
+        if self.game_state == GAME_OVER:
+            self.sound.play_music('gameplay')
+        self.game_state = PLAYING
+        self.sound.play('hold')
+    
+    def receive_versus(self):
+        for data in self.versus.poll():
+            if self.session is not None:
+                self.session.receive(data)
+                continue
+            from versus import VersusSession, MSG_START, parse as parse_message
+            kind, values = parse_message(data)
+            if kind == MSG_START:
+                # Room is full: everyone starts from the same seed
+                seed, players, player = values
+                self.load_assets()
+                self.reset_game()
+                self.session = VersusSession(player, players, seed, engine=self.engine)
+                self.game_state = PLAYING
+                self.sound.play_music('gameplay')
+    
+    def update_versus(self):
+        session = self.session
+        session.advance_mirrors()
+        self.versus.send(session.drain())
+        if self.game_state == PLAYING and session.finished:
+            self.game_state = GAME_OVER  # Last one standing
+            self.sound.stop_music()
+            self.record_score()
+        for player, tick in session.desyncs[self.desyncs_seen:]:
+            print(f"Desync: player {player + 1} at tick {tick}", file=sys.stderr)
+        self.desyncs_seen = len(session.desyncs)
+    
+    def draw(self, alpha=0.0):
+        # `alpha` is how far (0..1) real time is past the last tick
+        if self.pending_size is not None:
+            # Relayout once per drawn frame, however many resize events
+            # a window drag sent
+            self.resize(*self.pending_size)
+            self.pending_size = None
         
         # Apply screen shake
         shake_offset = (
@@ -539,104 +692,258 @@ class TetrisGame:
         )
         self.screen_shake = max(0, self.screen_shake - 1)
         
-        # Draw particles
-        for p in self.particles[:]:
-            if not p.update(1/60):
-                self.particles.remove(p)
-            else:
-                p.draw(self.screen)
-        
+        if self.game_state != self.drawn_state:
+            self.draw_full_frame(alpha)
+        elif self.game_state == PLAYING:
+            self.draw_dirty_frame(alpha)
+        elif self.particles or self.particles_drawn or self.profiler.hud:
+            # Menu/pause/game over are static apart from fading particles
+            # (and the profiler HUD)
+            self.draw_full_frame()
+    
+    def draw_full_frame(self, alpha=0.0):
+        self.dynamic_rects = []
         if self.game_state == MENU:
+            self.screen.fill(BLACK)
+            self.dynamic_rects = self.draw_particles()
             self.draw_menu()
-        elif self.game_state == GAME_OVER:
-            self.draw_grid()
-            self.draw_info_panel()
-            self.draw_game_over()
         else:
             self.draw_grid()
             self.draw_info_panel()
-            ghost = self.get_ghost_position()
-            ghost.draw(self.screen, ghost=True)
-            self.current_piece.draw(self.screen)
+            self.screen.blit(self.backdrop, (0, 0))
+            if self.game_state != GAME_OVER:
+                ghost = self.engine.get_ghost_position()
+                self.dynamic_rects.append(self.draw_piece(ghost, ghost=True))
+                self.dynamic_rects.append(self.draw_piece(self.engine.current_piece,
+                                                          offset_y=self.fall_offset(alpha)))
+                self.dynamic_key = None
+            self.dynamic_rects.extend(self.draw_particles())
             
             if self.game_state == PAUSED:
                 self.draw_pause()
+            elif self.game_state == GAME_OVER:
+                self.draw_game_over()
         
+        self.draw_overlays()
+        self.drawn_state = self.game_state
         pygame.display.flip()
     
-    def load_high_score(self):
-      try:
-          with open("highscore.txt", "r") as f:
-              return int(f.read())
-      except (FileNotFoundError, ValueError):
-          return 0  # Return 0 if file doesn't exist or is invalid
-
-    def save_high_score(self):
-        with open("highscore.txt", "w") as f:
-            f.write(str(max(self.score, self.high_score)))
-
+    def fall_offset(self, alpha):
+        return int(self.engine.fall_offset(alpha) * self.layout.block)
+    
+    def draw_dirty_frame(self, alpha=0.0):
+        changed = self.draw_info_panel()
+        stack_rect = self.draw_grid()
+        if stack_rect:
+            changed.append(stack_rect)
+        
+        piece = self.engine.current_piece
+        ghost = self.engine.get_ghost_position()
+        offset_y = self.fall_offset(alpha)
+        pose = (piece.shape_idx, piece.rotation, piece.x, piece.y, offset_y, ghost.y)
+        if not changed and not self.particles and not self.particles_drawn and pose == self.dynamic_key:
+            overlays = self.draw_overlays()
+            if overlays:
+                pygame.display.update(overlays)
+            return  # Nothing moved: skip the whole frame
+        
+        # Erase last frame's piece/particles, bring in repainted layers,
+        # then draw this frame's dynamic parts on top
+        dirty = self.dynamic_rects + changed
+        for rect in dirty:
+            self.screen.blit(self.backdrop, rect, rect)
+        
+        self.dynamic_key = pose
+        self.dynamic_rects = [self.draw_piece(ghost, ghost=True),
+                              self.draw_piece(piece, offset_y=offset_y)]
+        self.dynamic_rects.extend(self.draw_particles())
+        pygame.display.update(dirty + self.dynamic_rects + self.draw_overlays())
+    
+    def handle_event(self, event, now):
+        if event.type == pygame.QUIT:
+            self.running = False
+        elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+            self.drawn_state = None  # Window contents lost, repaint everything
+        elif event.type == pygame.VIDEORESIZE:
+            self.pending_size = (max(1, event.w), max(1, event.h))
+        elif event.type in (pygame.KEYDOWN, pygame.KEYUP) and event.key in KEY_ACTIONS:
+            if self.game_state == PLAYING and self.replay is None and self.autoplay is None:
+                self.controls.handle_event(event, now)
+        elif event.type == pygame.KEYDOWN:
+            if event.key == pygame.K_F3:
+                self.profiler.toggle_hud()
+                self.drawn_state = None  # Repaint what the HUD covered
+            elif event.key == pygame.K_F11:
+                self.toggle_fullscreen()
+            elif event.key == pygame.K_p and self.versus is None:
+                if self.game_state == PLAYING:
+                    self.game_state = PAUSED
+                    self.controls.reset()
+                    self.sound.play('hold')
+                    self.sound.pause_music()
+                elif self.game_state == PAUSED:
+                    self.sound.play('hold')
+                    self.sound.resume_music()
+                    self.game_state = PLAYING
+            elif (event.key == pygame.K_BACKSPACE and self.undo is not None and not self.autoplay
+                  and self.game_state in (PLAYING, GAME_OVER)):
+                self.rewind(redo=bool(event.mod & pygame.KMOD_SHIFT))
+            elif event.key == pygame.K_q and self.game_state == PAUSED:
+                self.game_state = MENU
+                self.sound.resume_music()
+                self.sound.play_music('menu')
+            elif event.key == pygame.K_RETURN and self.versus is None:
+                    self.load_assets()
+                    if self.game_state == GAME_OVER or self.autoplay:
+                        self.reset_game()
+                        self.sound.play('gameover')
+                    self.autoplay = None
+                    self.game_state = PLAYING
+                    self.start_recording()
+                    self.sound.resume_music()
+                    self.sound.play_music('gameplay')
+            elif (event.key == pygame.K_d and self.game_state in (MENU, GAME_OVER)
+                  and self.replay is None and self.versus is None):
+                # Demo: the AI plays a fresh game
+                from ai import AIInput  # Only needed for the demo
+                self.load_assets()
+                self.reset_game()
+                self.autoplay = AIInput()
+                self.game_state = PLAYING
+                self.sound.play_music('gameplay')
+    
+    def poll(self, now):
+        # Reads the pending input, stamped with `now`, then runs every
+        # tick that has come due
+        for event in pygame.event.get():
+            self.handle_event(event, now)
+        self.accumulator += min(now - self.last_time, MAX_FRAME_TIME) * self.speed
+        self.last_time = now
+        while self.accumulator >= TICK:
+            self.accumulator -= TICK
+            self.update(now - self.accumulator / self.speed)
+    
+    def poll_until(self, deadline):
+        # High-rate polling: rather than sleeping through to the next
+        # frame, check for input every 1/poll_rate seconds so presses get
+        # a precise stamp and ticks run as soon as they're due
+        interval = 1 / self.poll_rate
+        while self.running:
+            now = self.time_source()
+            if now >= deadline:
+                return
+            time.sleep(min(interval, deadline - now))
+            self.poll(self.time_source())
+    
     def run(self):
-        running = True
-        last_time = time.time()
-        
-        while running:
-            dt = time.time() - last_time
-            last_time = time.time()
-            
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    running = False
-                elif event.type == pygame.KEYDOWN:
-                    current_time = time.time()
-                    
-                    if event.key == pygame.K_LEFT:
-                        if current_time - self.current_piece.last_move_time > self.current_piece.move_cooldown:
-                            if self.current_piece.move(-1, 0, self.grid):
-                                self.sound.play('move')
-                    elif event.key == pygame.K_RIGHT:
-                        if current_time - self.current_piece.last_move_time > self.current_piece.move_cooldown:
-                            if self.current_piece.move(1, 0, self.grid):
-                                self.sound.play('move')
-                    elif event.key == pygame.K_UP:
-                        if current_time - self.current_piece.last_rotate_time > self.current_piece.rotate_cooldown:
-                            if self.current_piece.rotate(self.grid):
-                                self.sound.play('rotate')
-                    elif event.key == pygame.K_DOWN:
-                        if current_time - self.current_piece.last_move_time > self.current_piece.move_cooldown:
-                            if self.current_piece.move(0, 1, self.grid):
-                                self.sound.play('move')
-                    elif event.key == pygame.K_SPACE:
-                        self.current_piece.hard_drop(self.grid)
-                        self.sound.play('drop')
-                        self.screen_shake_effect(2)
-                    elif event.key == pygame.K_c:
-                        if self.can_hold:
-                            self.sound.play('hold')
-                            self.hold_piece()
-                    elif event.key == pygame.K_p:
-                        if self.game_state == PLAYING:
-                            self.game_state = PAUSED
-                            self.sound.play('hold')
-                        elif self.game_state == PAUSED:
-                            self.sound.play('hold')
-                            self.game_state = PLAYING
-                    elif event.key == pygame.K_q and self.game_state == PAUSED:
-                        self.game_state = MENU
-                        self.sound.play('menu')
-                    elif event.key == pygame.K_RETURN:
-                            if self.game_state == GAME_OVER:
-                                self.reset_game()
-                                self.sound.play('gameover')
-                            self.game_state = PLAYING
-                            self.sound.play('gameplay')
-            self.update(dt)
-            self.draw()
-            self.clock.tick(60)
-        
+        self.running = True
+        self.accumulator = 0.0
+        self.last_time = last_frame = self.time_source()
+        
+        while self.running:
+            now = self.time_source()
+            self.frame_dt = min(now - last_frame, MAX_FRAME_TIME)
+            last_frame = now
+            self.poll(now)
+            self.draw(self.accumulator / TICK)
+            if not self.assets_ready:
+                # The menu is up; build the rest while the player reads it
+                self.startup.mark('first_frame')
+                self.load_assets()
+            if self.poll_rate and self.max_fps:
+                self.poll_until(now + 1 / self.max_fps)
+            else:
+                self.clock.tick(self.max_fps)
+        
+        self.stop_recording()
+        if self.versus is not None:
+            self.versus.close()
+        if self.spectators is not None:
+            self.spectators.close()
+        if self.telemetry is not None:
+            self.telemetry.close()
+        self.sound.close()
+        self.scores.close()
+        pygame.quit()
+    
+    def startup_report(self):
+        # Cold start phases up to a fully loaded game, without the main loop
+        self.draw()
+        self.startup.mark('first_frame')
+        self.load_assets()
+        self.sound.wait_loaded()
+        self.startup.mark('sounds')
+        report = self.startup.report()
+        self.sound.close()
+        self.scores.close()
         pygame.quit()
+        return report
 
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Advanced Tetris Pro")
+    parser.add_argument("--replay", help="play back a recorded .tpr replay")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed multiplier")
+    parser.add_argument("--player", default=DEFAULT_PLAYER, help="name to record scores under")
+    parser.add_argument("--das", type=int, default=DAS, help="ticks before a held move repeats")
+    parser.add_argument("--arr", type=int, default=ARR, help="ticks between repeats (0 = instant)")
+    parser.add_argument("--sdf", type=float, default=SOFT_DROP_FACTOR,
+                        help="soft drop speed as a multiple of gravity (0 = instant)")
+    parser.add_argument("--poll", action="store_true",
+                        help=f"poll input at {POLL_RATE} Hz between frames for lower latency")
+    parser.add_argument("--versus", metavar="HOST:PORT",
+                        help="play a versus match on a relay (see versus.py)")
+    parser.add_argument("--practice", action="store_true",
+                        help="practice mode: BACKSPACE undoes the last piece, SHIFT+BACKSPACE redoes")
+    parser.add_argument("--spectate", metavar="[HOST:]PORT", nargs="?", const="",
+                        help="broadcast the game to spectators (default port: spectate.DEFAULT_PORT)")
+    parser.add_argument("--events", metavar="DIR", nargs="?", const="",
+                        help="log gameplay events to DIR as JSONL and binary (default: telemetry.EVENT_DIR)")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="record frame timings and write them to FILE (.csv or .json) on exit")
+    parser.add_argument("--size", metavar="WxH", default=f"{SCREEN_WIDTH}x{SCREEN_HEIGHT}",
+                        help="window size (the window can also be resized)")
+    parser.add_argument("--fullscreen", action="store_true", help="start fullscreen (F11 toggles)")
+    parser.add_argument("--startup-times", action="store_true",
+                        help="print how long each startup phase takes and exit")
+    args = parser.parse_args()
+    width, _, height = args.size.lower().partition("x")
+    
     # Create required directories
     os.makedirs("sounds", exist_ok=True)
-    game = TetrisGame()
-    game.run()
\ No newline at end of file
+    player = ReplayPlayer(ReplayReader.open(args.replay)) if args.replay else None
+    versus = None
+    if args.versus:
+        from versus import VersusClient, DEFAULT_HOST
+        host, _, port = args.versus.rpartition(":")
+        versus = VersusClient(host or DEFAULT_HOST, int(port))
+    spectators = None
+    if args.spectate is not None:
+        from spectate import SpectatorServer, DEFAULT_PORT, DEFAULT_HOST
+        host, _, port = (args.spectate or str(DEFAULT_PORT)).rpartition(":")
+        spectators = SpectatorServer().start(host or DEFAULT_HOST, int(port))
+    telemetry = None
+    if args.events is not None:
+        from telemetry import EventBus, JsonlSink, BinarySink, Aggregator, EVENT_DIR, format_summary
+        directory = args.events or EVENT_DIR
+        stats = Aggregator()
+        telemetry = EventBus([JsonlSink(directory), BinarySink(directory=directory), stats])
+    game = TetrisGame(replay=player, speed=args.speed, scores=ScoreStore(player=args.player),
+                      controls=KeyboardInput(das=args.das, arr=args.arr, soft_drop_factor=args.sdf),
+                      poll_rate=POLL_RATE if args.poll else 0, versus=versus, practice=args.practice,
+                      spectators=spectators, size=(int(width), int(height)),
+                      fullscreen=args.fullscreen, telemetry=telemetry)
+    if args.startup_times:
+        print(game.startup_report())
+    else:
+        if args.profile:
+            game.profiler.record()
+        try:
+            game.run()
+        finally:
+            # Even if the game crashed: that's when the profile matters
+            game.profiler.disable()
+            if args.profile:
+                game.profiler.export(args.profile)
+        if telemetry is not None:
+            print(format_summary(stats.summary()))
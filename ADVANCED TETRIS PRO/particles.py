@@ -0,0 +1,170 @@
+import random
+from array import array
+
+import pygame
+
+np = None  # NumPy, imported by the first ParticleSystem that wants it
+
+# =================================================================
+# Pooled particle system. Positions, velocities, lifetimes, sizes and
+# colors live in preallocated arrays (NumPy when available, `array`
+# otherwise) with the live particles packed at the front, so an update
+# is one vectorized step and dead particles are dropped without
+# list.remove(). Circles are pre-rendered per size/alpha bucket.
+# NumPy is only imported when a system is created, not with the module.
+# =================================================================
+
+MAX_LIFE = 1.5
+FRAME_RATE = 60  # Old per-frame velocities were tuned for 60 FPS
+
+
+def load_numpy():
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:  # Pure-Python fallback below
+            return None
+        np = numpy
+    return np
+
+
+class ParticleSystem:
+    def __init__(self, capacity=2000, alpha_buckets=16, use_numpy=True, scale=1.0):
+        self.capacity = capacity
+        self.scale = scale  # Size and speed multiplier, for the screen layout
+        self.alpha_buckets = alpha_buckets
+        self.numpy = use_numpy and load_numpy() is not None
+        self.count = 0
+        self.colors = []
+        self.color_index = {}
+        self.sprites = {}
+
+        if self.numpy:
+            self.x = np.zeros(capacity, np.float32)
+            self.y = np.zeros(capacity, np.float32)
+            self.vx = np.zeros(capacity, np.float32)
+            self.vy = np.zeros(capacity, np.float32)
+            self.life = np.zeros(capacity, np.float32)
+            self.size = np.zeros(capacity, np.int16)
+            self.color = np.zeros(capacity, np.int16)
+            self.rng = np.random.default_rng()
+        else:
+            self.x = array('f', bytes(4 * capacity))
+            self.y = array('f', bytes(4 * capacity))
+            self.vx = array('f', bytes(4 * capacity))
+            self.vy = array('f', bytes(4 * capacity))
+            self.life = array('f', bytes(4 * capacity))
+            self.size = array('h', bytes(2 * capacity))
+            self.color = array('h', bytes(2 * capacity))
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.count = 0
+
+    def _color_idx(self, color):
+        color = tuple(color[:3])
+        idx = self.color_index.get(color)
+        if idx is None:
+            idx = self.color_index[color] = len(self.colors)
+            self.colors.append(color)
+        return idx
+
+    def emit(self, x, y, color, count=10):
+        # Spawns up to `count` particles; anything over capacity is dropped
+        start = self.count
+        n = min(count, self.capacity - start)
+        if n <= 0:
+            return 0
+        end = start + n
+        color_idx = self._color_idx(color)
+        scale = self.scale
+        speed = FRAME_RATE * scale
+
+        if self.numpy:
+            rng = self.rng
+            self.x[start:end] = x
+            self.y[start:end] = y
+            self.vx[start:end] = rng.uniform(-2, 2, n) * speed
+            self.vy[start:end] = rng.uniform(-5, -1, n) * speed
+            self.life[start:end] = rng.uniform(0.5, MAX_LIFE, n)
+            self.size[start:end] = rng.integers(2, 6, n) * scale
+            self.color[start:end] = color_idx
+        else:
+            for i in range(start, end):
+                self.x[i] = x
+                self.y[i] = y
+                self.vx[i] = random.uniform(-2, 2) * speed
+                self.vy[i] = random.uniform(-5, -1) * speed
+                self.life[i] = random.uniform(0.5, MAX_LIFE)
+                self.size[i] = int(random.randint(2, 5) * scale)
+                self.color[i] = color_idx
+
+        self.count = end
+        return n
+
+    def update(self, dt):
+        n = self.count
+        if not n:
+            return
+
+        if self.numpy:
+            life = self.life[:n]
+            life -= dt
+            self.x[:n] += self.vx[:n] * dt
+            self.y[:n] += self.vy[:n] * dt
+            alive = life > 0
+            k = int(alive.sum())
+            if k < n:
+                for arr in (self.x, self.y, self.vx, self.vy, self.life, self.size, self.color):
+                    arr[:k] = arr[:n][alive]
+            self.count = k
+            return
+
+        # Fallback: update in place, swap dead particles with the last live one
+        x, y, vx, vy, life = self.x, self.y, self.vx, self.vy, self.life
+        i = 0
+        while i < n:
+            life[i] -= dt
+            if life[i] > 0:
+                x[i] += vx[i] * dt
+                y[i] += vy[i] * dt
+                i += 1
+                continue
+            n -= 1
+            for arr in (x, y, vx, vy, life, self.size, self.color):
+                arr[i] = arr[n]
+        self.count = n
+
+    def sprite(self, size, bucket, color_idx):
+        key = (size, bucket, color_idx)
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            alpha = 255 * (bucket + 1) // self.alpha_buckets
+            sprite = pygame.Surface((size * 2, size * 2), pygame.SRCALPHA)
+            pygame.draw.circle(sprite, (*self.colors[color_idx], alpha), (size, size), size)
+            self.sprites[key] = sprite = sprite.convert_alpha()
+        return sprite
+
+    def draw(self, screen):
+        # Returns the rects drawn, for dirty-rect updates
+        n = self.count
+        if not n:
+            return []
+
+        buckets = self.alpha_buckets
+        if self.numpy:
+            size = self.size[:n]
+            bucket = np.clip((self.life[:n] / MAX_LIFE * buckets).astype(np.int16) - 1, 0, buckets - 1)
+            px = (self.x[:n] - size).astype(np.int32).tolist()
+            py = (self.y[:n] - size).astype(np.int32).tolist()
+            items = zip(size.tolist(), bucket.tolist(), self.color[:n].tolist(), px, py)
+        else:
+            items = ((self.size[i], min(buckets - 1, max(0, int(self.life[i] / MAX_LIFE * buckets) - 1)),
+                      self.color[i], int(self.x[i] - self.size[i]), int(self.y[i] - self.size[i]))
+                     for i in range(n))
+
+        sprite = self.sprite
+        return screen.blits([(sprite(s, b, c), (x, y)) for s, b, c, x, y in items])
@@ -0,0 +1,266 @@
+import csv
+import sys
+import json
+import time
+from collections import deque, defaultdict
+
+import pygame
+
+# =================================================================
+# In-game frame profiler. While enabled it shadows the game's update,
+# draw and draw_* methods on the instance (the same trick bench.py
+# uses) with perf_counter spans, and closes one record per drawn frame:
+#
+#   frame      ms since the previous frame started
+#   update     ms in simulation ticks this frame (`updates` of them)
+#   draw       ms in draw(), plus one column per draw_* method
+#   particles  live particles
+#   allocs     surfaces created this frame (Surface() and text renders)
+#              by the game's own modules (see SURFACE_MODULES)
+#   dropped    frame slots missed against the max_fps target
+#
+# Disabled, the instance attributes are removed again and the game
+# runs its plain class methods: no wrappers, no per-frame cost.
+#
+# F3 in game toggles the HUD (and the profiler with it); main.py
+# --profile FILE records the whole session and writes FILE (.csv or
+# .json) on exit. The HUD only keeps the last HISTORY frames; a
+# recording keeps every frame in a list of its own (about 1 KB each).
+# =================================================================
+
+HISTORY = 1800          # Frames kept for the HUD
+HUD_REFRESH = 0.25      # Seconds between HUD text updates
+HUD_WINDOW = 60         # Frames averaged on the HUD
+HUD_POS = (8, 8)
+HUD_SIZE = (230, 180)
+HUD_BG = (16, 16, 16)
+HUD_FG = (220, 220, 220)
+
+BASE_FIELDS = ('frame', 'update', 'updates', 'draw', 'particles', 'allocs', 'dropped')
+
+# Modules whose Surface() calls are counted, besides the game's own
+SURFACE_MODULES = ('render_cache', 'particles')
+
+
+class CountingPygame:
+    # Stands in for the `pygame` name of those modules while profiling.
+    # Surface() is counted but still makes a plain pygame.Surface, and
+    # pygame itself is never touched, so other modules and isinstance()
+    # checks see nothing
+    created = 0
+
+    def __getattr__(self, name):
+        return getattr(pygame, name)
+
+    def Surface(self, *args, **kwargs):
+        CountingPygame.created += 1
+        return pygame.Surface(*args, **kwargs)
+
+
+class Profiler:
+    def __init__(self, game, font=None, history=HISTORY):
+        self.game = game
+        self.font = font
+        self.frames = deque(maxlen=history)
+        self.session = None  # Every frame since record(), else None
+        self.enabled = False
+        self.hud = False
+        self.always_on = False  # Keep recording with the HUD off
+        self.draw_names = sorted(name for name in dir(type(game))
+                                 if name.startswith('draw_') and callable(getattr(type(game), name)))
+        self.spans = defaultdict(float)
+        self.updates = 0
+        self.last_frame = None
+        self.last_allocs = 0
+        self.hud_surface = None
+        self.hud_time = 0.0
+        self.patched = []  # Modules whose `pygame` is a CountingPygame
+
+    # ---------------------------------------------------------------
+    # Instrumentation
+    # ---------------------------------------------------------------
+    def enable(self):
+        if self.enabled:
+            return
+        self.enabled = True
+        self.spans.clear()
+        self.updates = 0
+        self.last_frame = None
+        names = SURFACE_MODULES + (type(self.game).__module__,)
+        self.patched = [sys.modules[name] for name in names
+                        if getattr(sys.modules.get(name), 'pygame', None) is pygame]
+        for module in self.patched:
+            module.pygame = CountingPygame()
+        self.last_allocs = self.allocations()
+
+        game = self.game
+        for name in self.draw_names:
+            setattr(game, name, self.span(name, getattr(game, name)))
+        update, draw = game.update, game.draw
+        spans, clock = self.spans, time.perf_counter
+
+        def timed_update(*args, **kwargs):
+            start = clock()
+            result = update(*args, **kwargs)
+            spans['update'] += clock() - start
+            self.updates += 1
+            return result
+
+        def timed_draw(*args, **kwargs):
+            start = clock()
+            result = draw(*args, **kwargs)
+            spans['draw'] += clock() - start
+            self.end_frame(start)
+            return result
+
+        game.update = timed_update
+        game.draw = timed_draw
+
+    def record(self):
+        # Profile from now on and keep every frame for export(), with
+        # or without the HUD
+        self.always_on = True
+        self.session = []
+        self.enable()
+
+    def disable(self):
+        if not self.enabled:
+            return
+        self.enabled = False
+        for module in self.patched:
+            module.pygame = pygame
+        self.patched = []
+        for name in self.draw_names + ['update', 'draw']:
+            self.game.__dict__.pop(name, None)
+
+    def span(self, name, method):
+        spans, clock = self.spans, time.perf_counter
+
+        def timed(*args, **kwargs):
+            start = clock()
+            result = method(*args, **kwargs)
+            spans[name] += clock() - start
+            return result
+        return timed
+
+    def allocations(self):
+        return CountingPygame.created + self.game.text.misses
+
+    def end_frame(self, start):
+        # Called as each draw() returns; `start` is when it began
+        game = self.game
+        frame = start - self.last_frame if self.last_frame is not None else 0.0
+        self.last_frame = start
+
+        allocs = self.allocations()
+        dropped = int(frame * game.max_fps) - 1 if game.max_fps else 0
+        record = {
+            'frame': frame * 1000,
+            'update': self.spans.pop('update', 0.0) * 1000,
+            'updates': self.updates,
+            'draw': self.spans.pop('draw', 0.0) * 1000,
+            'particles': len(game.particles) if game.particles is not None else 0,
+            'allocs': allocs - self.last_allocs,
+            'dropped': max(0, dropped),
+        }
+        for name in self.draw_names:
+            record[name] = self.spans.get(name, 0.0) * 1000
+        self.frames.append(record)
+        if self.session is not None:
+            self.session.append(record)
+        self.spans.clear()
+        self.updates = 0
+        self.last_allocs = allocs
+
+    # ---------------------------------------------------------------
+    # HUD
+    # ---------------------------------------------------------------
+    def toggle_hud(self):
+        self.hud = not self.hud
+        if self.hud:
+            self.enable()
+        elif not self.always_on:
+            self.disable()
+        self.hud_surface = None
+        return self.hud
+
+    def hud_lines(self):
+        frames = list(self.frames)[-HUD_WINDOW:]
+        if not frames:
+            return ["profiling..."]
+        n = len(frames)
+
+        def mean(field):
+            return sum(f[field] for f in frames) / n
+
+        frame = mean('frame')
+        lines = [
+            f"fps {1000 / frame:6.1f}" if frame else "fps      -",
+            f"frame  {frame:6.2f} ms  max {max(f['frame'] for f in frames):6.2f}",
+            f"update {mean('update'):6.2f} ms  x{mean('updates'):.1f}",
+            f"draw   {mean('draw'):6.2f} ms  max {max(f['draw'] for f in frames):6.2f}",
+        ]
+        costly = sorted(self.draw_names, key=mean, reverse=True)[:5]
+        lines += [f"  {name[5:]:<12}{mean(name):6.3f}" for name in costly]
+        lines += [
+            f"particles {frames[-1]['particles']}",
+            f"allocs/frame {mean('allocs'):.2f}",
+            f"dropped {sum(f['dropped'] for f in frames)} / {n}",
+        ]
+        return lines
+
+    def draw_hud(self, screen):
+        # Blits the HUD onto `screen`; returns the rect it covers
+        now = time.perf_counter()
+        if self.hud_surface is None or now - self.hud_time >= HUD_REFRESH:
+            if self.font is None:
+                self.font = pygame.font.Font(None, 18)
+            surface = pygame.Surface(HUD_SIZE)
+            surface.fill(HUD_BG)
+            y = 4
+            for line in self.hud_lines():
+                surface.blit(self.font.render(line, True, HUD_FG), (6, y))
+                y += self.font.get_linesize()
+            self.hud_surface = surface
+            self.hud_time = now
+        return screen.blit(self.hud_surface, HUD_POS)
+
+    # ---------------------------------------------------------------
+    # Export
+    # ---------------------------------------------------------------
+    def fields(self):
+        return list(BASE_FIELDS) + self.draw_names
+
+    def recorded(self):
+        # The frames export() writes: the whole recording, or without
+        # one just what the HUD still holds
+        return self.session if self.session is not None else list(self.frames)
+
+    def summary(self):
+        frames = self.recorded()
+        summary = {'frames': len(frames), 'target_fps': self.game.max_fps,
+                   'kept': "session" if self.session is not None else f"last {self.frames.maxlen} frames"}
+        for field in ('frame', 'update', 'draw'):
+            values = sorted(f[field] for f in frames)
+            if values:
+                summary[field] = {
+                    'mean': sum(values) / len(values),
+                    'p50': values[len(values) // 2],
+                    'p95': values[min(len(values) - 1, int(len(values) * 0.95))],
+                    'max': values[-1],
+                }
+        summary['dropped'] = sum(f['dropped'] for f in frames)
+        summary['allocs'] = sum(f['allocs'] for f in frames)
+        return summary
+
+    def export(self, path):
+        # .json gets a summary and every frame, anything else is CSV
+        if path.endswith(".json"):
+            with open(path, "w") as f:
+                json.dump({'summary': self.summary(), 'frames': self.recorded()}, f, indent=1)
+            return
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, self.fields())
+            writer.writeheader()
+            for record in self.recorded():
+                writer.writerow({k: round(v, 4) if isinstance(v, float) else v for k, v in record.items()})
@@ -0,0 +1,84 @@
+import pygame
+from collections import OrderedDict
+
+# =================================================================
+# Surface caches for the draw path: block tiles are rendered once per
+# (color, style) and text once per (font, string, color), so drawing
+# a frame is just blits with no Surface allocation.
+# =================================================================
+
+TILE_NORMAL = 0     # Locked stack and previews
+TILE_ACTIVE = 1     # Falling piece, with the highlight corner
+TILE_GHOST = 2      # Landing preview, outline only
+
+WHITE = (255, 255, 255)
+
+
+class TileAtlas:
+    def __init__(self, block_size):
+        self.block_size = block_size
+        self.tiles = {}
+
+    def get(self, color, style=TILE_NORMAL):
+        key = (color, style)
+        tile = self.tiles.get(key)
+        if tile is None:
+            tile = self.tiles[key] = self.render(color, style)
+        return tile
+
+    def render(self, color, style):
+        size = self.block_size
+        rect = (0, 0, size, size)
+        border = max(1, size // 30)  # 1px at the original 30px blocks
+        if style == TILE_GHOST:
+            tile = pygame.Surface((size, size), pygame.SRCALPHA)
+            pygame.draw.rect(tile, color, rect, border)
+            return tile.convert_alpha()
+
+        tile = pygame.Surface((size, size))
+        tile.fill(color)
+        if style == TILE_ACTIVE:
+            highlight = pygame.Surface((size // 3, size // 3), pygame.SRCALPHA)
+            highlight.fill((255, 255, 255, 50))
+            tile.blit(highlight, (2 * border, 2 * border))
+        pygame.draw.rect(tile, WHITE, rect, border)
+        return tile.convert()
+
+    def clear(self):
+        self.tiles.clear()
+
+
+class TextCache:
+    # Bounded LRU of rendered text surfaces
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, color, antialias=True):
+        key = (font, text, color, antialias)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+
+        self.misses += 1
+        surface = font.render(text, antialias, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_size:
+            self.surfaces.popitem(last=False)
+        return surface
+
+    def clear(self):
+        self.surfaces.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self.surfaces),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
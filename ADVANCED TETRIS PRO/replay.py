@@ -0,0 +1,247 @@
+import os
+import sys
+import time
+
+from engine import GameEngine, RULESET, FIXED_RULES, ACTION_COUNT
+
+# =================================================================
+# Compact binary replays. A game is fully determined by its seed, its
+# ruleset and the (tick, action) inputs, so that is all we store:
+#
+#   header:  b'TPRP', version byte, varint seed,
+#            varint field count, one varint per RULESET field
+#   records: varint (tick_delta << 3 | action), action 0..6
+#   footer:  END record (action 7), then varint final tick, score,
+#            lines and pieces, used to verify a re-simulation
+#
+# Writers stream to disk through a small buffer, readers decode in
+# chunks, so neither ever holds a whole game in memory.
+# =================================================================
+
+MAGIC = b'TPRP'
+VERSION = 1
+ACTION_BITS = 3
+ACTION_END = (1 << ACTION_BITS) - 1
+# Next to the game, like sounds/ and scores.db, whatever the working directory
+REPLAY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "replays")
+REPLAY_EXT = ".tpr"
+
+assert ACTION_COUNT <= ACTION_END
+
+
+class ReplayError(ValueError):
+    pass
+
+
+def encode_varint(value, out):
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_varint(data, pos):
+    # (value, position after it) of the varint at data[pos]
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+class ReplayWriter:
+    def __init__(self, fileobj, seed, ruleset=RULESET, buffer_size=4096):
+        self.file = fileobj
+        self.buffer_size = buffer_size
+        self.buffer = bytearray(MAGIC)
+        self.buffer.append(VERSION)
+        encode_varint(seed, self.buffer)
+        encode_varint(len(ruleset), self.buffer)
+        for value in ruleset:
+            encode_varint(value, self.buffer)
+        self.last_tick = 0
+        self.finished = False
+
+    @classmethod
+    def open(cls, path, seed, **kwargs):
+        return cls(open(path, 'wb'), seed, **kwargs)
+
+    @classmethod
+    def for_engine(cls, engine, directory=REPLAY_DIR):
+        # New replay file for the engine's current game, hooked up as its recorder
+        os.makedirs(directory, exist_ok=True)
+        name = time.strftime("%Y%m%d-%H%M%S") + f"-{engine.seed}{REPLAY_EXT}"
+        writer = cls.open(os.path.join(directory, name), engine.seed, ruleset=engine.ruleset)
+        engine.recorder = writer
+        return writer
+
+    def record(self, tick, action):
+        encode_varint((tick - self.last_tick) << ACTION_BITS | action, self.buffer)
+        self.last_tick = tick
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def finish(self, engine):
+        # Writes the footer and closes the file
+        if self.finished:
+            return
+        self.record(engine.ticks, ACTION_END)
+        for value in (engine.ticks, engine.score, engine.lines, engine.piece_count):
+            encode_varint(value, self.buffer)
+        self.finished = True
+        self.close()
+
+    def flush(self):
+        if self.buffer:
+            self.file.write(self.buffer)
+            self.buffer.clear()
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+
+class ReplayReader:
+    def __init__(self, fileobj, chunk_size=4096):
+        self.file = fileobj
+        self.chunk_size = chunk_size
+        self.data = b''
+        self.pos = 0
+        self.footer = None
+
+        if self._read(len(MAGIC)) != MAGIC:
+            raise ReplayError("Not a replay file")
+        version = self._read(1)[0]
+        if version != VERSION:
+            raise ReplayError(f"Unsupported replay version {version}")
+        self.seed = self.read_varint()
+        self.ruleset = tuple(self.read_varint() for _ in range(self.read_varint()))
+
+    @classmethod
+    def open(cls, path, **kwargs):
+        return cls(open(path, 'rb'), **kwargs)
+
+    def _fill(self):
+        chunk = self.file.read(self.chunk_size)
+        self.data = self.data[self.pos:] + chunk
+        self.pos = 0
+        return bool(chunk)
+
+    def _read(self, count):
+        while len(self.data) - self.pos < count:
+            if not self._fill():
+                raise EOFError
+        out = self.data[self.pos:self.pos + count]
+        self.pos += count
+        return out
+
+    def read_varint(self):
+        value = 0
+        shift = 0
+        while True:
+            if self.pos >= len(self.data) and not self._fill():
+                raise EOFError
+            byte = self.data[self.pos]
+            self.pos += 1
+            value |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return value
+            shift += 7
+
+    def __iter__(self):
+        # Yields absolute (tick, action); a truncated file (game quit
+        # mid-way or crash) just ends early with no footer
+        tick = 0
+        while True:
+            try:
+                value = self.read_varint()
+            except EOFError:
+                return
+            tick += value >> ACTION_BITS
+            action = value & ACTION_END
+            if action == ACTION_END:
+                try:
+                    self.footer = {
+                        'ticks': self.read_varint(),
+                        'score': self.read_varint(),
+                        'lines': self.read_varint(),
+                        'pieces': self.read_varint(),
+                    }
+                except EOFError:
+                    pass
+                return
+            yield tick, action
+
+    def close(self):
+        self.file.close()
+
+
+class ReplayPlayer:
+    # Re-simulates a replay: step() advances one tick (for rendering at
+    # any speed), run() fast-forwards to the end with no rendering
+    def __init__(self, reader, engine=None):
+        # Only the input cooldowns may differ from ours
+        if len(reader.ruleset) != len(RULESET) or reader.ruleset[:len(FIXED_RULES)] != FIXED_RULES:
+            raise ReplayError(f"Replay ruleset {reader.ruleset} doesn't match {RULESET}")
+        self.reader = reader
+        self.records = iter(reader)
+        self.engine = engine or GameEngine()
+        self.engine.move_cooldown, self.engine.rotate_cooldown = reader.ruleset[len(FIXED_RULES):]
+        self.engine.reset(reader.seed)
+        self.pending = next(self.records, None)
+        self.finished = False
+
+    def step(self):
+        engine = self.engine
+        while self.pending is not None and self.pending[0] <= engine.ticks:
+            engine.apply(self.pending[1])
+            self.pending = next(self.records, None)
+
+        footer = self.reader.footer
+        if engine.game_over or (self.pending is None and (footer is None or engine.ticks >= footer['ticks'])):
+            self.finished = True
+            return False
+        engine.step()
+        return True
+
+    def run(self):
+        while self.step():
+            pass
+        return self.engine
+
+    def verify(self):
+        # True when the re-simulated result matches the recorded footer
+        engine = self.run()
+        footer = self.reader.footer
+        return footer is not None and footer == {
+            'ticks': engine.ticks,
+            'score': engine.score,
+            'lines': engine.lines,
+            'pieces': engine.piece_count,
+        }
+
+
+def verify_file(path):
+    reader = ReplayReader.open(path)
+    try:
+        player = ReplayPlayer(reader)
+        return player.verify(), player.engine
+    finally:
+        reader.close()
+
+
+if __name__ == "__main__":
+    # Usage: python replay.py FILE...  (re-simulates and checks each replay)
+    failed = 0
+    for path in sys.argv[1:]:
+        ok, engine = verify_file(path)
+        failed += not ok
+        print(f"{'OK  ' if ok else 'FAIL'} {path}: score={engine.score} "
+              f"lines={engine.lines} pieces={engine.piece_count} ticks={engine.ticks}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,186 @@
+import os
+import sys
+import math
+import time
+import argparse
+import statistics
+import multiprocessing
+
+from engine import GameEngine
+from bench import INPUTS, MAX_TICKS, game_seeds, play
+
+# =================================================================
+# Parallel game runner for seed sweeps and bot evaluations. Seeded
+# headless games are fanned out over a process pool in chunks; each
+# worker keeps one GameEngine and sends back a small tuple per game
+# instead of the game itself, and the parent folds those into
+# aggregate statistics as they stream in, without keeping them.
+#
+# Game seeds are derived from one base seed in the parent, so a sweep
+# gives the same per-game results whatever the number of workers or
+# the order they finish in.
+#
+#   python runner.py --games 1000 --workers 8
+#   python runner.py --games 200 --scaling     # speedup per worker count
+# =================================================================
+
+DEFAULT_GAMES = 100
+DEFAULT_CHUNK = 8
+
+# Per-game result, as sent back by the workers
+FIELDS = ('seed', 'score', 'lines', 'pieces', 'ticks', 'seconds')
+DIGEST_MASK = (1 << 64) - 1
+
+_engine = None
+_policy = None
+
+
+def _init_worker(input_name):
+    global _engine, _policy
+    _engine = GameEngine()
+    _policy = INPUTS[input_name]
+
+
+def _play_game(seed):
+    start = time.perf_counter()
+    _engine.reset(seed)
+    play(_engine, _policy(seed), MAX_TICKS)
+    return (seed, _engine.score, _engine.lines, _engine.piece_count,
+            _engine.ticks, time.perf_counter() - start)
+
+
+def run_games(seeds, workers=None, input_name='random', chunk_size=DEFAULT_CHUNK):
+    # Yields one result tuple per seed, in completion order.
+    # workers=1 runs in this process (no pool), which is also the
+    # reference for the scaling benchmark
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        _init_worker(input_name)
+        for seed in seeds:
+            yield _play_game(seed)
+        return
+
+    with multiprocessing.Pool(workers, _init_worker, (input_name,)) as pool:
+        yield from pool.imap_unordered(_play_game, seeds, chunk_size)
+
+
+class Stats:
+    # Running aggregate over the streamed results: count, mean and sum
+    # of squared deviations (Welford) plus min/max per field, so memory
+    # doesn't grow with the number of games. The one exception is the
+    # median, which is exact and kept for the score only (an int per game)
+    def __init__(self):
+        n = len(FIELDS) - 1
+        self.count = 0
+        self.means = [0.0] * n
+        self.m2 = [0.0] * n
+        self.low = [math.inf] * n
+        self.high = [-math.inf] * n
+        self.scores = []
+        # Order-independent fingerprint of the games, for scaling()
+        self.digest = 0
+
+    def add(self, result):
+        self.count += 1
+        for i, value in enumerate(result[1:]):
+            delta = value - self.means[i]
+            self.means[i] += delta / self.count
+            self.m2[i] += delta * (value - self.means[i])
+            self.low[i] = min(self.low[i], value)
+            self.high[i] = max(self.high[i], value)
+        self.scores.append(result[1])
+        self.digest = (self.digest + hash(result[:5])) & DIGEST_MASK
+
+    def __len__(self):
+        return self.count
+
+    def summary(self):
+        summary = {'games': self.count}
+        if not self.count:
+            return summary
+        for i, name in enumerate(FIELDS[1:]):
+            summary[name] = {
+                'mean': self.means[i],
+                'median': statistics.median(self.scores) if name == 'score' else None,
+                'stdev': math.sqrt(self.m2[i] / self.count),
+                'min': self.low[i],
+                'max': self.high[i],
+            }
+        return summary
+
+
+def sweep(games=DEFAULT_GAMES, seed=1, workers=None, input_name='random',
+          chunk_size=DEFAULT_CHUNK, progress=None):
+    # Plays `games` seeded games and returns (Stats, wall seconds)
+    stats = Stats()
+    start = time.perf_counter()
+    for result in run_games(game_seeds(games, seed), workers, input_name, chunk_size):
+        stats.add(result)
+        if progress:
+            progress(len(stats), games)
+    return stats, time.perf_counter() - start
+
+
+def scaling(games=DEFAULT_GAMES, seed=1, input_name='random', chunk_size=DEFAULT_CHUNK, max_workers=None):
+    # Runs the same sweep with 1, 2, 4 ... workers; returns
+    # [(workers, seconds, games/sec, speedup, efficiency)]
+    max_workers = max_workers or os.cpu_count() or 1
+    counts = []
+    workers = 1
+    while workers < max_workers:
+        counts.append(workers)
+        workers *= 2
+    counts.append(max_workers)
+
+    rows = []
+    base = None
+    reference = None
+    for workers in counts:
+        stats, seconds = sweep(games, seed, workers, input_name, chunk_size)
+        # Same seeds must give the same games however they're split up
+        outcome = (len(stats), stats.digest)
+        if reference is None:
+            reference = outcome
+        elif outcome != reference:
+            raise RuntimeError(f"Results with {workers} workers differ from 1 worker")
+        base = base or seconds
+        speedup = base / seconds
+        rows.append((workers, seconds, games / seconds, speedup, speedup / workers))
+    return rows
+
+
+def print_summary(summary, seconds):
+    print(f"{summary['games']} games in {seconds:.2f}s ({summary['games'] / seconds:.1f} games/sec)")
+    print(f"  {'':<10}{'mean':>12}{'median':>12}{'stdev':>12}{'min':>12}{'max':>12}")
+    for name in FIELDS[1:]:
+        s = summary.get(name)
+        if s:
+            median = f"{s['median']:>12.2f}" if s['median'] is not None else f"{'-':>12}"
+            print(f"  {name:<10}{s['mean']:>12.2f}{median}{s['stdev']:>12.2f}"
+                  f"{s['min']:>12.2f}{s['max']:>12.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run seeded headless games in parallel")
+    parser.add_argument("--games", type=int, default=DEFAULT_GAMES)
+    parser.add_argument("--seed", type=int, default=1, help="base seed for the game seeds")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    parser.add_argument("--chunk", type=int, default=DEFAULT_CHUNK, help="games per work chunk")
+    parser.add_argument("--input", choices=sorted(INPUTS), default='random', help="input policy")
+    parser.add_argument("--scaling", action="store_true", help="benchmark speedup per worker count")
+    args = parser.parse_args()
+
+    if args.scaling:
+        print(f"{'workers':>8}{'seconds':>10}{'games/s':>10}{'speedup':>10}{'eff':>8}")
+        for workers, seconds, rate, speedup, efficiency in scaling(
+                args.games, args.seed, args.input, args.chunk, args.workers):
+            print(f"{workers:>8}{seconds:>10.2f}{rate:>10.1f}{speedup:>10.2f}{efficiency:>8.0%}")
+        sys.exit(0)
+
+    def progress(done, total):
+        if done % max(1, total // 20) == 0 or done == total:
+            print(f"\r{done}/{total}", end="", file=sys.stderr, flush=True)
+
+    stats, seconds = sweep(args.games, args.seed, args.workers, args.input, args.chunk, progress)
+    print(file=sys.stderr)
+    print_summary(stats.summary(), seconds)
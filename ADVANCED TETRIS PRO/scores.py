@@ -0,0 +1,224 @@
+import os
+import sys
+import time
+import queue
+import sqlite3
+import argparse
+import threading
+from contextlib import contextmanager
+
+from engine import TICK_RATE
+
+# =================================================================
+# Score store. Every finished game becomes one row in a local SQLite
+# database in WAL mode:
+#
+#  - Each insert is a transaction, so a crash mid-write loses at most
+#    that game and never corrupts earlier ones, and several running
+#    instances can share the file (readers never block the writer).
+#  - Writes go through a background thread that batches whatever is
+#    queued into one transaction; game over only enqueues a tuple.
+#  - Top-N and per-player queries are served by indexes.
+#  - The old single-number highscore.txt is imported once, as a
+#    'legacy' game with only a score.
+#
+#   python scores.py                  # top 10
+#   python scores.py --player ai -n 5
+# =================================================================
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scores.db")
+LEGACY_FILE = "highscore.txt"
+DEFAULT_PLAYER = "player"
+BUSY_TIMEOUT = 5.0  # Seconds to wait for another instance's write lock
+
+FIELDS = ('player', 'score', 'lines', 'level', 'pieces', 'duration', 'seed', 'mode', 'created')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id       INTEGER PRIMARY KEY,
+    player   TEXT NOT NULL,
+    score    INTEGER NOT NULL,
+    lines    INTEGER,
+    level    INTEGER,
+    pieces   INTEGER,
+    duration REAL,
+    seed     INTEGER,
+    mode     TEXT NOT NULL,
+    created  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS games_score ON games (score DESC);
+CREATE INDEX IF NOT EXISTS games_player_score ON games (player, score DESC);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def game_record(engine, player=DEFAULT_PLAYER, mode='play'):
+    # Row tuple (in FIELDS order) for a finished engine
+    return (player, engine.score, engine.lines, engine.level, engine.piece_count,
+            engine.ticks / TICK_RATE, engine.seed, mode, time.time())
+
+
+def legacy_files(name=LEGACY_FILE):
+    # highscore.txt used to be written to the working directory
+    paths = [os.path.abspath(name), os.path.join(os.path.dirname(DB_FILE), name)]
+    return list(dict.fromkeys(paths))
+
+
+class ScoreStore:
+    def __init__(self, path=DB_FILE, player=DEFAULT_PLAYER):
+        self.path = path
+        self.player = player
+        self.jobs = queue.Queue()
+        self.db = self._connect()  # Reads, on the caller's thread
+        self.migrate()
+
+        self.worker = threading.Thread(target=self._work, name="scores", daemon=True)
+        self.worker.start()
+
+    def _connect(self):
+        # One connection per thread; WAL lets them read while one writes
+        db = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.executescript(SCHEMA)
+        return db
+
+    def migrate(self, files=None):
+        # Import each old highscore.txt once; returns how many were imported
+        imported = 0
+        for path in files or legacy_files():
+            try:
+                with open(path) as f:
+                    score = int(f.read())
+            except (OSError, ValueError):
+                continue
+            key = f"imported:{path}"
+            with self._transaction(self.db):
+                if self.db.execute("SELECT 1 FROM meta WHERE key = ?", (key,)).fetchone():
+                    continue
+                self.db.execute("INSERT INTO meta VALUES (?, ?)", (key, str(score)))
+                if score > 0:
+                    self.db.execute(
+                        "INSERT INTO games (player, score, mode, created) VALUES (?, ?, 'legacy', ?)",
+                        (self.player, score, os.path.getmtime(path)))
+                    imported += 1
+        return imported
+
+    @contextmanager
+    def _transaction(self, db):
+        # BEGIN IMMEDIATE takes the write lock up front, so two instances
+        # can't both pass a check before either one writes
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    # ---------------------------------------------------------------
+    # Writes (background thread)
+    # ---------------------------------------------------------------
+    def record(self, engine, player=None, mode='play'):
+        # Queues a finished game; returns immediately
+        self.add(game_record(engine, player or self.player, mode))
+
+    def add(self, row):
+        self.jobs.put(row)
+
+    def _work(self):
+        db = self._connect()
+        while True:
+            batch = [self.jobs.get()]
+            while True:
+                try:
+                    batch.append(self.jobs.get_nowait())
+                except queue.Empty:
+                    break
+
+            rows = [row for row in batch if isinstance(row, tuple)]
+            if rows:
+                try:
+                    with self._transaction(db):
+                        db.executemany(f"INSERT INTO games ({', '.join(FIELDS)}) "
+                                       f"VALUES ({', '.join('?' * len(FIELDS))})", rows)
+                except sqlite3.Error as e:
+                    print(f"Could not save {len(rows)} game(s): {e}", file=sys.stderr)
+            for job in batch:
+                if isinstance(job, threading.Event):
+                    job.set()
+            if None in batch:
+                db.close()
+                return
+
+    def flush(self, timeout=None):
+        # Blocks until everything queued so far is written
+        done = threading.Event()
+        self.jobs.put(done)
+        return done.wait(timeout)
+
+    def close(self):
+        self.jobs.put(None)
+        self.worker.join()
+        self.db.close()
+
+    # ---------------------------------------------------------------
+    # Queries
+    # ---------------------------------------------------------------
+    def best(self, player=None):
+        if player is None:
+            row = self.db.execute("SELECT MAX(score) FROM games").fetchone()
+        else:
+            row = self.db.execute("SELECT MAX(score) FROM games WHERE player = ?", (player,)).fetchone()
+        return row[0] or 0
+
+    def top(self, n=10, player=None):
+        # Best n games as dicts, highest score first
+        columns = ', '.join(FIELDS)
+        if player is None:
+            cursor = self.db.execute(
+                f"SELECT {columns} FROM games ORDER BY score DESC LIMIT ?", (n,))
+        else:
+            cursor = self.db.execute(
+                f"SELECT {columns} FROM games WHERE player = ? ORDER BY score DESC LIMIT ?", (player, n))
+        return [dict(zip(FIELDS, row)) for row in cursor]
+
+    def player_stats(self, player=None):
+        player = player or self.player
+        row = self.db.execute(
+            "SELECT COUNT(*), MAX(score), AVG(score), SUM(lines), SUM(pieces), SUM(duration) "
+            "FROM games WHERE player = ? AND mode != 'legacy'", (player,)).fetchone()
+        games, best, mean, lines, pieces, duration = row
+        return {
+            'player': player,
+            'games': games,
+            'best': max(best or 0, self.best(player)),
+            'mean': mean or 0.0,
+            'lines': lines or 0,
+            'pieces': pieces or 0,
+            'duration': duration or 0.0,
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show the best recorded games")
+    parser.add_argument("-n", type=int, default=10, help="number of games")
+    parser.add_argument("--player", help="only this player's games")
+    parser.add_argument("--db", default=DB_FILE)
+    args = parser.parse_args()
+
+    store = ScoreStore(args.db)
+    print(f"{'#':>3}  {'player':<10}{'score':>9}{'lines':>7}{'level':>7}{'pieces':>8}{'time':>8}  date")
+    for i, game in enumerate(store.top(args.n, args.player), 1):
+        date = time.strftime("%Y-%m-%d %H:%M", time.localtime(game['created']))
+        duration = f"{game['duration']:.0f}s" if game['duration'] is not None else "-"
+        print(f"{i:>3}  {game['player']:<10}{game['score']:>9}{game['lines'] or 0:>7}"
+              f"{game['level'] or 0:>7}{game['pieces'] or 0:>8}{duration:>8}  {date}")
+    if args.player:
+        stats = store.player_stats(args.player)
+        print(f"\n{stats['games']} games, mean {stats['mean']:.0f}, "
+              f"{stats['lines']} lines, {stats['duration'] / 60:.1f} min played")
+    store.close()
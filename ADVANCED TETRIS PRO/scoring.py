@@ -0,0 +1,97 @@
+# =================================================================
+# Guideline scoring: line clears, T-spins, combos, back-to-back and
+# perfect clears. Pure functions so the engine (and benchmarks) can
+# call them without any game state.
+# =================================================================
+
+NO_T_SPIN = 0
+T_SPIN_MINI = 1
+T_SPIN = 2
+
+# Base points per cleared line count, multiplied by the level
+LINE_SCORES = {
+    NO_T_SPIN: (0, 100, 300, 500, 800),
+    T_SPIN_MINI: (100, 200, 400),
+    T_SPIN: (400, 800, 1200, 1600),
+}
+
+PERFECT_CLEAR_SCORES = (0, 800, 1200, 1800, 2000)
+B2B_PERFECT_TETRIS = 3200
+COMBO_SCORE = 50
+SOFT_DROP_SCORE = 1
+HARD_DROP_SCORE = 2
+LINES_PER_LEVEL = 10
+MAX_LEVEL = 20
+
+CLEAR_NAMES = ("", "SINGLE", "DOUBLE", "TRIPLE", "TETRIS")
+
+# Garbage lines sent in versus play, per cleared line count
+LINE_ATTACK = {
+    NO_T_SPIN: (0, 0, 1, 2, 4),
+    T_SPIN_MINI: (0, 0, 1),
+    T_SPIN: (0, 2, 4, 6),
+}
+COMBO_ATTACK = (0, 0, 1, 1, 2, 2, 3, 3, 4, 4, 4, 5)
+B2B_ATTACK = 1
+PERFECT_CLEAR_ATTACK = 10
+
+
+def is_difficult(lines, t_spin):
+    # Clears that start or keep a back-to-back chain
+    return lines == 4 or (lines > 0 and t_spin != NO_T_SPIN)
+
+
+def score_clear(lines, t_spin, level, combo, b2b, perfect=False):
+    # `combo` is the chain length after this lock (-1 = no chain),
+    # `b2b` whether a difficult clear is pending from before.
+    # Returns (points, b2b after this clear)
+    table = LINE_SCORES[t_spin]
+    points = table[min(lines, len(table) - 1)]
+    difficult = is_difficult(lines, t_spin)
+    if difficult and b2b:
+        points = points * 3 // 2
+    points *= level
+
+    if combo > 0:
+        points += COMBO_SCORE * combo * level
+
+    if perfect and lines:
+        if lines == 4 and b2b:
+            points += B2B_PERFECT_TETRIS * level
+        else:
+            points += PERFECT_CLEAR_SCORES[lines] * level
+
+    if lines:
+        b2b = difficult
+    return points, b2b
+
+
+def attack_for_clear(lines, t_spin, combo, b2b, perfect=False):
+    # Garbage lines a clear sends; same arguments as score_clear
+    if not lines:
+        return 0
+    table = LINE_ATTACK[t_spin]
+    attack = table[min(lines, len(table) - 1)]
+    if b2b and is_difficult(lines, t_spin):
+        attack += B2B_ATTACK
+    attack += COMBO_ATTACK[min(combo, len(COMBO_ATTACK) - 1)]
+    if perfect:
+        attack += PERFECT_CLEAR_ATTACK
+    return attack
+
+
+def clear_name(lines, t_spin):
+    if t_spin == T_SPIN:
+        return ("T-SPIN " + CLEAR_NAMES[lines]).strip()
+    if t_spin == T_SPIN_MINI:
+        return ("T-SPIN MINI " + CLEAR_NAMES[lines]).strip()
+    return CLEAR_NAMES[lines]
+
+
+def level_for_lines(lines, start_level=1):
+    return min(MAX_LEVEL, start_level + lines // LINES_PER_LEVEL)
+
+
+def gravity_for_level(level):
+    # Guideline curve: seconds per row at the given level
+    return (0.8 - (level - 1) * 0.007) ** (level - 1)
@@ -0,0 +1,366 @@
+import copy
+import time
+import zlib
+import struct
+import random
+import argparse
+from collections import deque
+
+from board import BitBoard
+from engine import (
+    GameEngine, GRID_WIDTH, GRID_HEIGHT, NEXT_QUEUE_SIZE, SHAPES, BOARD_PALETTE,
+)
+
+# =================================================================
+# Game state snapshots, for search AIs, practice undo and rollback.
+#
+# A Snapshot holds everything that decides how a GameEngine goes on
+# (board, pieces, bag, RNG position, score, timers, garbage) as
+# immutable values only: tuples, bytes and numbers. Taking one copies
+# the board's row ints and feature lists, O(rows); restoring copies
+# them back. Nothing is shared with the engine, so one snapshot can be
+# restored any number of times, into any engine.
+#
+# The RNG only moves when a bag is shuffled; its state is taken once
+# per bag and shared between snapshots, and serialised as just the
+# seed and the bag count, then rebuilt by re-running the shuffles.
+#
+# Snapshot.to_bytes() is the compact form (about 100 bytes mid-game):
+#
+#   header:  b'TPSN', version byte, fixed fields (see HEADER)
+#   body:    next queue, bag, garbage entries, last clear name,
+#            zlib'd board colors (palette indices, 0 = empty)
+#
+# Events and the replay recorder are not game state and aren't kept.
+#
+#   python snapshot.py        # clone/restore/serialise benchmark
+# =================================================================
+
+MAGIC = b'TPSN'
+VERSION = 1
+UNDO_LIMIT = 100     # Snapshots an UndoBuffer keeps
+RNG_CACHE_SIZE = 64  # Games whose rebuilt RNG state is remembered
+
+HEADER = struct.Struct(
+    '>4sB'      # magic, version
+    'QIIIIII'   # seed, bags, ticks, score, lines, pieces, attack
+    'HhBd'      # level, combo, flags, drop progress
+    'BB'        # move/rotate cooldown
+    'BBbb'      # piece: shape, rotation, x, y
+    'iiii'      # piece: last move, last rotate, last drop, lock timer
+    'b'         # held shape, -1 for none
+    'BBBB'      # next, bag, garbage and last clear lengths
+)
+GARBAGE = struct.Struct('>IBB')  # ready tick, lines, hole
+
+BENCH_TICKS = 3000   # How far into a game the benchmark state is
+BENCH_COUNT = 10000  # Repetitions per timed operation
+CHECK_TICKS = 600    # Ticks a clone is played alongside the original
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+_rng_states = {}  # seed -> (bags, state) of the last one rebuilt
+
+
+def rng_state(seed, bags):
+    # The engine RNG's state after `bags` bag shuffles, rebuilt by
+    # re-running them; carries on from the last state rebuilt for the
+    # same seed when it can (rollback loads nearby snapshots of one game)
+    rng = random.Random(seed)
+    done = 0
+    cached = _rng_states.get(seed)
+    if cached is not None and cached[0] <= bags:
+        done = cached[0]
+        rng.setstate(cached[1])
+    for _ in range(bags - done):
+        rng.shuffle(list(range(len(SHAPES))))
+    state = rng.getstate()
+    if len(_rng_states) >= RNG_CACHE_SIZE:
+        _rng_states.clear()
+    _rng_states[seed] = (bags, state)
+    return state
+
+
+class Snapshot:
+    # Read-only: build with Snapshot.of() or Snapshot.from_bytes()
+    __slots__ = ('seed', 'bags', 'rng', 'ticks', 'score', 'lines', 'level', 'combo', 'b2b',
+                 'last_clear', 'drop_progress', 'piece_count', 'game_over', 'can_hold',
+                 'attack', 'garbage', 'bag', 'board', 'piece', 'next', 'held', 'cooldowns')
+
+    @classmethod
+    def of(cls, engine):
+        snap = cls.__new__(cls)
+        snap.seed = engine.seed
+        snap.bags = engine.bags
+        snap.rng = engine.rng_state()
+        snap.ticks = engine.ticks
+        snap.score = engine.score
+        snap.lines = engine.lines
+        snap.level = engine.level
+        snap.combo = engine.combo
+        snap.b2b = engine.b2b
+        snap.last_clear = engine.last_clear
+        snap.drop_progress = engine.drop_progress
+        snap.piece_count = engine.piece_count
+        snap.game_over = engine.game_over
+        snap.can_hold = engine.can_hold
+        snap.attack = engine.attack
+        snap.garbage = tuple(tuple(entry) for entry in engine.garbage)
+        snap.bag = tuple(engine.bag)
+        snap.board = engine.grid.state()
+        p = engine.current_piece
+        snap.piece = (p.shape_idx, p.rotation, p.x, p.y, p.last_move_tick, p.last_rotate_tick,
+                      p.last_drop_tick, p.lock_timer, p.locking, p.t_spin, p.t_spin_mini)
+        # Queued and held pieces are always in spawn state: shapes will do
+        snap.next = tuple(piece.shape_idx for piece in engine.next_pieces)
+        snap.held = engine.held_piece.shape_idx if engine.held_piece else None
+        snap.cooldowns = (engine.move_cooldown, engine.rotate_cooldown)
+        return snap
+
+    def restore(self, engine):
+        # Puts `engine` back in this state, reusing its board and pieces
+        if (engine.move_cooldown, engine.rotate_cooldown) != self.cooldowns:
+            raise SnapshotError(f"snapshot cooldowns {self.cooldowns} don't match the engine's")
+        engine.seed = self.seed
+        if engine.rng_cache is not self.rng:
+            engine.rng.setstate(self.rng)
+            engine.rng_cache = self.rng
+        engine.bags = self.bags
+        engine.bag = list(self.bag)
+        engine.ticks = self.ticks
+        engine.score = self.score
+        engine.lines = self.lines
+        engine.level = self.level
+        engine.gravity = engine.calculate_gravity()
+        engine.combo = self.combo
+        engine.b2b = self.b2b
+        engine.last_clear = self.last_clear
+        engine.drop_progress = self.drop_progress
+        engine.piece_count = self.piece_count
+        engine.game_over = self.game_over
+        engine.can_hold = self.can_hold
+        engine.attack = self.attack
+        engine.garbage = [list(entry) for entry in self.garbage]
+        engine.grid.load_state(self.board)
+        engine.events = []
+
+        piece = engine.current_piece
+        (shape_idx, rotation, piece.x, piece.y, piece.last_move_tick, piece.last_rotate_tick,
+         piece.last_drop_tick, piece.lock_timer, piece.locking, piece.t_spin,
+         piece.t_spin_mini) = self.piece
+        piece.shape_idx = shape_idx
+        piece.set_rotation(rotation)
+        for piece, shape_idx in zip(engine.next_pieces, self.next):
+            piece.reset(shape_idx)
+        if self.held is None:
+            engine.held_piece = None
+        elif engine.held_piece is None:
+            engine.held_piece = engine.make_piece(self.held)
+        else:
+            engine.held_piece.reset(self.held)
+        return engine
+
+    def engine(self):
+        # A new engine in this state
+        move_cooldown, rotate_cooldown = self.cooldowns
+        return GameEngine(self.seed, move_cooldown, rotate_cooldown, state=self)
+
+    # ---------------------------------------------------------------
+    # Serialisation
+    # ---------------------------------------------------------------
+    def to_bytes(self):
+        flags = 0
+        for i, value in enumerate((self.b2b, self.can_hold, self.game_over) + self.piece[8:]):
+            flags |= bool(value) << i
+        last_clear = self.last_clear.encode()
+        out = bytearray(HEADER.pack(
+            MAGIC, VERSION, self.seed, self.bags, self.ticks, self.score, self.lines,
+            self.piece_count, self.attack, self.level, self.combo, flags, self.drop_progress,
+            *self.cooldowns, *self.piece[:8], -1 if self.held is None else self.held,
+            len(self.next), len(self.bag), len(self.garbage), len(last_clear)))
+        out += bytes(self.next)
+        out += bytes(self.bag)
+        for entry in self.garbage:
+            out += GARBAGE.pack(*entry)
+        out += last_clear
+        out += zlib.compress(self.board[1])
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data):
+        if len(data) < HEADER.size or data[:4] != MAGIC:
+            raise SnapshotError("not a snapshot")
+        fields = HEADER.unpack_from(data)
+        if fields[1] != VERSION:
+            raise SnapshotError(f"unsupported snapshot version {fields[1]}")
+        (_, _, seed, bags, ticks, score, lines, pieces, attack, level, combo, flags,
+         drop_progress, move_cooldown, rotate_cooldown, shape_idx, rotation, x, y,
+         last_move, last_rotate, last_drop, lock_timer, held,
+         next_count, bag_count, garbage_count, clear_length) = fields
+
+        snap = cls.__new__(cls)
+        snap.seed = seed
+        snap.bags = bags
+        snap.rng = rng_state(seed, bags)
+        snap.ticks = ticks
+        snap.score = score
+        snap.lines = lines
+        snap.piece_count = pieces
+        snap.attack = attack
+        snap.level = level
+        snap.combo = combo
+        snap.b2b, snap.can_hold, snap.game_over = (bool(flags >> i & 1) for i in range(3))
+        snap.drop_progress = drop_progress
+        snap.cooldowns = (move_cooldown, rotate_cooldown)
+        snap.piece = (shape_idx, rotation, x, y, last_move, last_rotate, last_drop, lock_timer,
+                      *(bool(flags >> i & 1) for i in range(3, 6)))
+        snap.held = None if held < 0 else held
+
+        pos = HEADER.size
+        snap.next = tuple(data[pos:pos + next_count])
+        pos += next_count
+        snap.bag = tuple(data[pos:pos + bag_count])
+        pos += bag_count
+        snap.garbage = tuple(GARBAGE.unpack_from(data, pos + i * GARBAGE.size)
+                             for i in range(garbage_count))
+        pos += garbage_count * GARBAGE.size
+        snap.last_clear = data[pos:pos + clear_length].decode()
+        pos += clear_length
+        try:
+            colors = zlib.decompress(data[pos:])
+        except zlib.error as e:
+            raise SnapshotError(f"bad board data: {e}") from None
+        if len(colors) != GRID_WIDTH * GRID_HEIGHT or len(snap.next) != NEXT_QUEUE_SIZE:
+            raise SnapshotError("snapshot is for a different board size")
+
+        # Only the colors are stored; rows and features are rebuilt
+        board = BitBoard(GRID_WIDTH, GRID_HEIGHT, BOARD_PALETTE)
+        board.load_colors(colors)
+        snap.board = board.state()
+        return snap
+
+
+def clone(engine):
+    # An independent copy of a running engine (without its events or
+    # replay recorder)
+    return Snapshot.of(engine).engine()
+
+
+class UndoBuffer:
+    # Practice mode undo/redo: the last `limit` snapshots, oldest
+    # dropped first. Pushing a new state forgets anything undone
+    def __init__(self, limit=UNDO_LIMIT):
+        self.past = deque(maxlen=limit)
+        self.undone = []
+
+    def __len__(self):
+        return len(self.past)
+
+    @property
+    def latest(self):
+        return self.past[-1] if self.past else None
+
+    def push(self, snapshot):
+        self.past.append(snapshot)
+        self.undone.clear()
+
+    def undo(self):
+        # The state before the latest one (or the latest itself when it's
+        # the oldest kept), None when empty
+        if len(self.past) > 1:
+            self.undone.append(self.past.pop())
+        return self.latest
+
+    def redo(self):
+        if not self.undone:
+            return None
+        self.past.append(self.undone.pop())
+        return self.latest
+
+    def clear(self):
+        self.past.clear()
+        self.undone.clear()
+
+
+# -----------------------------------------------------------------
+# Benchmark
+# -----------------------------------------------------------------
+
+def timed(fn, count):
+    # Mean microseconds per call
+    start = time.perf_counter()
+    for _ in range(count):
+        fn()
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def play(engine, policy, ticks):
+    for _ in range(ticks):
+        if engine.game_over:
+            return
+        action = policy(engine)
+        if action is not None:
+            engine.apply(action)
+        engine.step()
+
+
+def in_sync(a, b, ticks=CHECK_TICKS):
+    # Plays two engines with the same inputs; True if they never diverge
+    from ai import AIInput
+    policy_a, policy_b = AIInput(), AIInput()
+    for _ in range(ticks):
+        for engine, policy in ((a, policy_a), (b, policy_b)):
+            action = policy(engine)
+            if action is not None:
+                engine.apply(action)
+            engine.step()
+        if a.checksum() != b.checksum():
+            return False
+    return True
+
+
+def benchmark(seed, ticks=BENCH_TICKS, count=BENCH_COUNT):
+    from ai import AIInput
+    engine = GameEngine(seed)
+    play(engine, AIInput(), ticks)
+    snap = Snapshot.of(engine)
+    data = snap.to_bytes()
+    target = clone(engine)
+
+    copies = (clone(engine), Snapshot.from_bytes(data).engine())
+    results = {
+        'ticks': engine.ticks,
+        'pieces': engine.piece_count,
+        'bytes': len(data),
+        'us': {
+            'snapshot': timed(lambda: Snapshot.of(engine), count),
+            'restore': timed(lambda: snap.restore(target), count),
+            'clone': timed(lambda: clone(engine), count),
+            'to_bytes': timed(snap.to_bytes, count),
+            'from_bytes': timed(lambda: Snapshot.from_bytes(data), count),
+            'from_bytes_cold': timed(lambda: _rng_states.clear() or Snapshot.from_bytes(data),
+                                     max(1, count // 10)),
+            'deepcopy': timed(lambda: copy.deepcopy(engine), max(1, count // 10)),
+        },
+        'clone_in_sync': in_sync(clone(engine), copies[0]),
+        'bytes_in_sync': in_sync(engine, copies[1]),
+    }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Snapshot/clone benchmark")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--ticks", type=int, default=BENCH_TICKS, help="ticks played before measuring")
+    parser.add_argument("-n", "--count", type=int, default=BENCH_COUNT, help="repetitions per operation")
+    args = parser.parse_args()
+
+    results = benchmark(args.seed, args.ticks, args.count)
+    print(f"state after {results['ticks']} ticks, {results['pieces']} pieces; "
+          f"{results['bytes']} bytes serialised")
+    for name, us in results['us'].items():
+        print(f"  {name:<12}{us:>10.2f} us  {1e6 / us:>12.0f}/sec")
+    print(f"clone in sync: {results['clone_in_sync']}, from bytes in sync: {results['bytes_in_sync']}")
@@ -0,0 +1,558 @@
+import sys
+import time
+import zlib
+import socket
+import asyncio
+import argparse
+import threading
+from collections import deque
+
+from srs import ORIENTATIONS
+from engine import GameEngine, GRID_WIDTH, GRID_HEIGHT, TICK_RATE, SHAPES_COLORS
+from replay import encode_varint, decode_varint
+from versus import FRAME, DEFAULT_HOST, read_message, frame
+
+# =================================================================
+# Spectator broadcast. A game publishes its state once per tick and a
+# SpectatorServer streams it to any number of viewers over TCP, as
+# length-prefixed UPDATE messages (same framing as versus.py):
+#
+#   UPDATE   varint tick, flags byte, then one block per flag set:
+#     CELLS  varint count, count x varint (cell << 4 | color)
+#            cell = y * GRID_WIDTH + x, color = palette index (0 empty,
+#            1-7 SHAPES_COLORS, 8 garbage). Only colors 0-15 fit:
+#            a change to any higher index goes as BOARD instead
+#     BOARD  varint length, zlib'd palette indices, row by row
+#     PIECE  shape, rotation, x + 2, y + 2   (one byte each)
+#     QUEUE  count, one byte per shape
+#     HOLD   varint shape + 1 (0 = none)
+#     STATS  varint score, lines, level, combo + 1
+#     OVER   game over, no body
+#     KEY    keyframe: everything above is present, start afresh
+#
+# Only what changed since the last tick goes out, so a falling piece
+# costs a few bytes per move and a lock the cells it changed (or the
+# whole board, compressed, when a clear shifts most of it); ticks where
+# nothing changed send nothing. Every KEYFRAME_EVERY ticks there's a
+# keyframe, and a viewer joining mid-game gets the last keyframe plus
+# the updates since (queued as one message, so a late joiner doesn't
+# start out behind).
+#
+# The game thread only encodes the update and hands it to the server's
+# event loop; it never waits on a socket. Each viewer has its own
+# queue, and its socket buffers (kernel and asyncio) are bounded by
+# write_buffer, so a viewer that stops reading backs up into its queue
+# quickly. One that falls QUEUE_LIMIT updates behind is dropped to the
+# next keyframe instead of growing its queue (or the game waiting).
+#
+#   python main.py --spectate 7778                   # broadcast a game
+#   python spectate.py view --port 7778              # watch it in a terminal
+#   python spectate.py local --viewers 300           # AI game + viewers, one process
+#   python spectate.py local --slow 5                # ... with 5 viewers stalled past
+#                                                    # the limit, then caught up
+#   python spectate.py local --speed 0 --seconds 60  # as fast as possible (a short
+#                                                    # game fits in the buffers)
+# =================================================================
+
+DEFAULT_PORT = 7778
+KEYFRAME_EVERY = 2 * TICK_RATE
+QUEUE_LIMIT = 120   # Updates a viewer may fall behind before it's resynced
+WRITE_BUFFER = 16 * 1024  # Bytes buffered per viewer socket before its queue fills
+LOCAL_WRITE_BUFFER = 1024  # local_broadcast()'s, so stalled viewers back up in a few seconds of game
+STALLED_READ_LIMIT = 1024  # StreamReader limit of local_broadcast()'s stalled viewers
+CATCH_UP_TIMEOUT = 10.0     # Seconds local_broadcast() gives viewers to reach the last tick
+
+MSG_UPDATE = 1
+
+F_CELLS = 1
+F_BOARD = 2
+F_PIECE = 4
+F_QUEUE = 8
+F_HOLD = 16
+F_STATS = 32
+F_OVER = 64
+F_KEY = 128
+
+POSE_OFFSET = 2  # Kicks can put a piece just past the left wall or top
+CELL_COLOR_BITS = 4  # Palette index bits in a CELLS entry
+CELL_COLOR_MASK = (1 << CELL_COLOR_BITS) - 1
+
+
+class DeltaEncoder:
+    # Game-thread side: turns an engine's state into UPDATE messages,
+    # remembering what was last sent so only the changes go out
+    def __init__(self, keyframe_every=KEYFRAME_EVERY):
+        self.keyframe_every = keyframe_every
+        self.reset()
+
+    def reset(self):
+        self.colors = None
+        self.version = None
+        self.grid = None
+        self.pose = None
+        self.queue = None
+        self.hold = None
+        self.stats = None
+        self.over = False
+        self.key_tick = None
+
+    def encode(self, engine, keyframe=False):
+        # (message, keyframe) for the engine's current tick, or
+        # (None, False) when nothing changed. Game over is always a
+        # keyframe, so viewers waiting on a resync still see the end
+        keyframe = (keyframe or self.key_tick is None or engine.grid is not self.grid
+                    or not 0 <= engine.ticks - self.key_tick < self.keyframe_every
+                    or (engine.game_over and not self.over))
+        if keyframe:
+            self.reset()
+            self.key_tick = engine.ticks
+            self.grid = engine.grid
+        flags = F_KEY if keyframe else 0
+        body = bytearray()
+
+        grid = engine.grid
+        if grid.version != self.version:
+            self.version = grid.version
+            colors = bytes(grid.colors)
+            packed = zlib.compress(colors)
+            changed = None if keyframe else [i for i, (a, b) in enumerate(zip(colors, self.colors)) if a != b]
+            if (changed is None or 2 * len(changed) > len(packed)
+                    or any(colors[i] > CELL_COLOR_MASK for i in changed)):
+                flags |= F_BOARD
+                encode_varint(len(packed), body)
+                body += packed
+            elif changed:
+                flags |= F_CELLS
+                encode_varint(len(changed), body)
+                for i in changed:
+                    encode_varint(i << CELL_COLOR_BITS | colors[i], body)
+            self.colors = colors
+
+        piece = engine.current_piece
+        pose = (piece.shape_idx, piece.rotation, piece.x, piece.y)
+        if pose != self.pose:
+            self.pose = pose
+            flags |= F_PIECE
+            body += bytes((piece.shape_idx, piece.rotation,
+                           piece.x + POSE_OFFSET, piece.y + POSE_OFFSET))
+
+        queue = tuple(p.shape_idx for p in engine.next_pieces)
+        if queue != self.queue:
+            self.queue = queue
+            flags |= F_QUEUE
+            body.append(len(queue))
+            body += bytes(queue)
+
+        hold = engine.held_piece.shape_idx if engine.held_piece else None
+        if hold != self.hold or keyframe:
+            self.hold = hold
+            flags |= F_HOLD
+            encode_varint(0 if hold is None else hold + 1, body)
+
+        stats = (engine.score, engine.lines, engine.level, engine.combo)
+        if stats != self.stats:
+            self.stats = stats
+            flags |= F_STATS
+            for value in stats[:3]:
+                encode_varint(value, body)
+            encode_varint(engine.combo + 1, body)
+
+        if engine.game_over and (not self.over or keyframe):
+            flags |= F_OVER
+        self.over = engine.game_over
+
+        if not flags:
+            return None, False
+        out = bytearray([MSG_UPDATE])
+        encode_varint(engine.ticks, out)
+        out.append(flags)
+        return bytes(out + body), keyframe
+
+
+class ViewerState:
+    # What a viewer knows about the game, rebuilt from UPDATE messages
+    def __init__(self):
+        self.colors = bytearray(GRID_WIDTH * GRID_HEIGHT)
+        self.tick = 0
+        self.piece = None     # (shape, rotation, x, y)
+        self.queue = ()
+        self.hold = None
+        self.score = self.lines = self.level = 0
+        self.combo = -1
+        self.game_over = False
+        self.synced = False   # Set by the first keyframe
+        self.updates = 0
+        self.keyframes = 0
+        self.bytes = 0
+
+    def apply(self, data):
+        if data[0] != MSG_UPDATE:
+            return False
+        tick, pos = decode_varint(data, 1)
+        flags = data[pos]
+        pos += 1
+        if flags & F_KEY:
+            self.synced = True
+            self.keyframes += 1
+            self.game_over = False
+        elif not self.synced:
+            return False  # Can't apply changes without a base
+        self.tick = tick
+        self.updates += 1
+
+        if flags & F_CELLS:
+            count, pos = decode_varint(data, pos)
+            for _ in range(count):
+                value, pos = decode_varint(data, pos)
+                self.colors[value >> CELL_COLOR_BITS] = value & CELL_COLOR_MASK
+        if flags & F_BOARD:
+            length, pos = decode_varint(data, pos)
+            self.colors = bytearray(zlib.decompress(data[pos:pos + length]))
+            pos += length
+        if flags & F_PIECE:
+            shape, rotation, x, y = data[pos:pos + 4]
+            self.piece = (shape, rotation, x - POSE_OFFSET, y - POSE_OFFSET)
+            pos += 4
+        if flags & F_QUEUE:
+            count = data[pos]
+            self.queue = tuple(data[pos + 1:pos + 1 + count])
+            pos += 1 + count
+        if flags & F_HOLD:
+            hold, pos = decode_varint(data, pos)
+            self.hold = hold - 1 if hold else None
+        if flags & F_STATS:
+            self.score, pos = decode_varint(data, pos)
+            self.lines, pos = decode_varint(data, pos)
+            self.level, pos = decode_varint(data, pos)
+            combo, pos = decode_varint(data, pos)
+            self.combo = combo - 1
+        if flags & F_OVER:
+            self.game_over = True
+        return True
+
+    def color(self, x, y):
+        # RGB of a cell, None when empty
+        idx = self.colors[y * GRID_WIDTH + x]
+        if not idx:
+            return None
+        return SHAPES_COLORS[idx - 1] if idx <= len(SHAPES_COLORS) else (90, 90, 90)
+
+    def render(self):
+        # The board as text: shape letters, '#' for garbage, '.' empty
+        # and '@' for the falling piece
+        rows = []
+        for y in range(GRID_HEIGHT):
+            cells = self.colors[y * GRID_WIDTH:(y + 1) * GRID_WIDTH]
+            rows.append([".IOTJLSZ"[i] if i < 8 else "#" for i in cells])
+        if self.piece is not None and not self.game_over:
+            shape, rotation, px, py = self.piece
+            for x, y in ORIENTATIONS[shape][rotation].cells:
+                if 0 <= py + y < GRID_HEIGHT and 0 <= px + x < GRID_WIDTH:
+                    rows[py + y][px + x] = "@"
+        rows = [''.join(row) for row in rows]
+        status = "GAME OVER" if self.game_over else ""
+        rows.append(f"tick {self.tick}  score {self.score}  lines {self.lines}  "
+                    f"level {self.level}  {status}")
+        return "\n".join(rows)
+
+
+# -------------------------------------------------------------------
+# Server
+# -------------------------------------------------------------------
+
+class Subscriber:
+    # One viewer's outgoing queue, written by its own task
+    def __init__(self, writer, limit=QUEUE_LIMIT):
+        self.writer = writer
+        self.limit = limit
+        self.queue = deque()
+        self.ready = asyncio.Event()
+        self.resync = False   # Fell behind: skipping to the next keyframe
+        self.dropped = 0
+        self.sent = 0
+
+    def push(self, data, keyframe):
+        if keyframe:
+            if self.resync:
+                self.queue.clear()
+                self.resync = False
+        elif self.resync:
+            self.dropped += 1
+            return
+        elif len(self.queue) >= self.limit:
+            self.dropped += len(self.queue) + 1
+            self.queue.clear()
+            self.resync = True
+            return
+        self.queue.append(data)
+        self.ready.set()
+
+    async def pump(self):
+        while True:
+            await self.ready.wait()
+            self.ready.clear()
+            if self.queue:
+                data = b''.join(self.queue)
+                self.queue.clear()
+                self.sent += len(data)
+                self.writer.write(data)
+                await self.writer.drain()
+
+
+class SpectatorServer:
+    # Runs on its own thread (see start()); publish() is called from
+    # the game thread once per tick
+    def __init__(self, keyframe_every=KEYFRAME_EVERY, queue_limit=QUEUE_LIMIT, write_buffer=WRITE_BUFFER):
+        self.encoder = DeltaEncoder(keyframe_every)
+        self.queue_limit = queue_limit
+        self.write_buffer = write_buffer
+        self.subscribers = set()
+        self.keyframe = None  # Framed last keyframe
+        self.since = []       # and the updates after it, for late joiners
+        self.loop = None
+        self.server = None
+        self.published = 0
+        self.bytes_published = 0
+        self.resyncs = 0
+
+    # -- game thread -------------------------------------------------
+
+    def publish(self, engine, keyframe=False):
+        # `keyframe` forces a full update
+        data, keyframe = self.encoder.encode(engine, keyframe)
+        if data is not None and self.loop is not None:
+            self.published += 1
+            self.bytes_published += len(data) + FRAME.size
+            self.loop.call_soon_threadsafe(self.broadcast, frame(data), keyframe)
+
+    def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        # Listens on a daemon thread; returns once it's up
+        ready = threading.Event()
+        threading.Thread(target=lambda: asyncio.run(self.serve(host, port, ready)),
+                         name="spectate", daemon=True).start()
+        ready.wait()
+        return self
+
+    def close(self):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.shutdown)
+
+    def attach(self, sock):
+        # Serves a viewer on an already connected socket, e.g. one end
+        # of a socketpair() (see local_broadcast())
+        async def serve():
+            reader, writer = await asyncio.open_connection(sock=sock)
+            await self.handle(reader, writer)
+        asyncio.run_coroutine_threadsafe(serve(), self.loop)
+
+    # -- server thread -----------------------------------------------
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT, ready=None):
+        self.server = await asyncio.start_server(self.handle, host, port)
+        self.loop = asyncio.get_running_loop()
+        if ready is not None:
+            ready.set()
+        async with self.server:
+            try:
+                await self.server.serve_forever()
+            except asyncio.CancelledError:
+                pass
+
+    def shutdown(self):
+        self.server.close()
+        for subscriber in self.subscribers:
+            subscriber.writer.close()
+
+    def broadcast(self, data, keyframe):
+        if keyframe:
+            self.keyframe = data
+            self.since = []
+        elif self.keyframe is not None:
+            self.since.append(data)
+        for subscriber in self.subscribers:
+            was_resyncing = subscriber.resync
+            subscriber.push(data, keyframe)
+            self.resyncs += subscriber.resync and not was_resyncing
+
+    async def handle(self, reader, writer):
+        writer.transport.set_write_buffer_limits(self.write_buffer)
+        sock = writer.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.write_buffer)
+        subscriber = Subscriber(writer, self.queue_limit)
+        if self.keyframe is not None:
+            # The catch-up is one queue entry, not len(since) + 1 of them
+            subscriber.push(b''.join([self.keyframe] + self.since), False)
+        self.subscribers.add(subscriber)
+        pump = asyncio.ensure_future(subscriber.pump())
+        try:
+            # Viewers don't send anything; this returns when they hang up
+            await reader.read()
+        except ConnectionError:
+            pass
+        finally:
+            self.subscribers.discard(subscriber)
+            pump.cancel()
+            writer.close()
+
+
+# -------------------------------------------------------------------
+# Headless viewer
+# -------------------------------------------------------------------
+
+async def watch(host=DEFAULT_HOST, port=DEFAULT_PORT, state=None, on_update=None,
+                stall=None, sock=None):
+    # Follows a broadcast into `state` until it ends, over `sock` if
+    # given. A stalled viewer reads nothing until the `stall`
+    # asyncio.Event is set
+    state = state or ViewerState()
+    # Without a small limit asyncio keeps reading into its own buffer
+    # (up to twice the limit) while a stalled viewer isn't
+    limits = {} if stall is None else {'limit': STALLED_READ_LIMIT}
+    if sock is not None:
+        reader, writer = await asyncio.open_connection(sock=sock, **limits)
+    else:
+        reader, writer = await asyncio.open_connection(host, port, **limits)
+    try:
+        if stall is not None:
+            await stall.wait()
+        while True:
+            data = await read_message(reader)
+            state.bytes += len(data) + FRAME.size
+            if state.apply(data) and on_update is not None:
+                on_update(state)
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+    return state
+
+
+def local_broadcast(viewers=100, slow=5, seconds=20, speed=1.0, port=DEFAULT_PORT, seed=None,
+                    write_buffer=LOCAL_WRITE_BUFFER):
+    # An AI game broadcast to `viewers` headless viewers, all in this
+    # process; returns a result dict. The first `slow` viewers stop
+    # reading until the game is over, so they fall past the queue limit
+    # and get resynced, then catch up and must end up in sync too. They
+    # are attached over socketpairs: a stalled TCP viewer on loopback
+    # makes the kernel drop segments, and the catch-up then waits on
+    # retransmit backoff (tens of seconds) rather than on the server
+    from ai import AIInput
+
+    server = SpectatorServer(write_buffer=write_buffer).start(DEFAULT_HOST, port)
+    states = [ViewerState() for _ in range(viewers)]
+    loop = asyncio.new_event_loop()
+
+    async def connect_all():
+        stall = asyncio.Event()
+        tasks = []
+        for i, state in enumerate(states):
+            if i < slow:
+                ours, theirs = socket.socketpair()
+                server.attach(ours)
+                task = watch(state=state, stall=stall, sock=theirs)
+            else:
+                task = watch(DEFAULT_HOST, port, state)
+            tasks.append(asyncio.ensure_future(task))
+            await asyncio.sleep(0)
+        return tasks, stall
+
+    threading.Thread(target=loop.run_forever, name="viewers", daemon=True).start()
+    tasks, stall = asyncio.run_coroutine_threadsafe(connect_all(), loop).result()
+    while len(server.subscribers) < viewers:
+        time.sleep(0.01)
+
+    engine = GameEngine(seed)
+    policy = AIInput()
+    tick = 1 / (TICK_RATE * speed) if speed else 0
+    next_tick = time.perf_counter()
+    publish_time = []
+    while engine.ticks < seconds * TICK_RATE and not engine.game_over:
+        action = policy(engine)
+        if action is not None:
+            engine.apply(action)
+        engine.step()
+        engine.events.clear()
+        start = time.perf_counter()
+        server.publish(engine)
+        publish_time.append(time.perf_counter() - start)
+        next_tick += tick
+        delay = next_tick - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+    # The final state goes out as a keyframe, so a viewer that was
+    # resynced gets it whole
+    server.publish(engine, keyframe=True)
+    loop.call_soon_threadsafe(stall.set)
+    deadline = time.perf_counter() + CATCH_UP_TIMEOUT
+    while (any(s.tick != engine.ticks for s in states)
+           and time.perf_counter() < deadline):
+        time.sleep(0.05)
+    last = server.encoder
+
+    def in_sync(viewers):
+        return sum(s.colors == last.colors and s.piece == last.pose and s.score == engine.score
+                   for s in viewers)
+
+    fast = states[slow:]
+    game_seconds = engine.ticks / TICK_RATE
+    publish_time.sort()
+    result = {
+        'viewers': viewers,
+        'ticks': engine.ticks,
+        'updates': server.published,
+        'bytes_per_sec': server.bytes_published / game_seconds if game_seconds else 0.0,
+        'publish_us_p50': publish_time[len(publish_time) // 2] * 1e6,
+        'publish_us_max': publish_time[-1] * 1e6,
+        'fast_in_sync': in_sync(fast),
+        'fast': len(fast),
+        'slow_in_sync': in_sync(states[:slow]),
+        'slow': slow,
+        'resyncs': server.resyncs,
+        'slow_keyframes': [s.keyframes for s in states[:slow]],
+    }
+    server.close()
+    for task in tasks:
+        loop.call_soon_threadsafe(task.cancel)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Spectator broadcast of a running game")
+    parser.add_argument("mode", choices=("view", "local"))
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--viewers", type=int, default=100, help="local: viewers to connect")
+    parser.add_argument("--slow", type=int, default=5,
+                        help="local: how many of them stall until the game is over")
+    parser.add_argument("--seconds", type=float, default=20, help="local: game seconds to broadcast")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="local: game speed multiplier (0 = as fast as possible)")
+    args = parser.parse_args()
+
+    if args.mode == "view":
+        last = [0.0]
+
+        def show(state):
+            now = time.perf_counter()
+            if now - last[0] >= 0.1 or state.game_over:
+                last[0] = now
+                print("\033[H\033[J" + state.render(), flush=True)
+
+        try:
+            asyncio.run(watch(args.host, args.port, on_update=show))
+        except OSError as e:
+            print(f"Can't watch {args.host}:{args.port}: {e}", file=sys.stderr)
+            sys.exit(1)
+        sys.exit(0)
+
+    r = local_broadcast(args.viewers, args.slow, args.seconds, args.speed, port=args.port)
+    print(f"{r['viewers']} viewers, {r['ticks']} ticks, {r['updates']} updates, "
+          f"{r['bytes_per_sec']:.0f} B/s per viewer")
+    print(f"publish p50 {r['publish_us_p50']:.1f} us, max {r['publish_us_max']:.1f} us")
+    print(f"fast viewers in sync: {r['fast_in_sync']}/{r['fast']}, "
+          f"stalled viewers in sync after catching up: {r['slow_in_sync']}/{r['slow']}, "
+          f"resyncs {r['resyncs']}, stalled viewers' keyframes {r['slow_keyframes']}")
+    ok = r['fast_in_sync'] == r['fast'] and r['slow_in_sync'] == r['slow']
+    sys.exit(0 if ok and (r['resyncs'] or not r['slow']) else 1)
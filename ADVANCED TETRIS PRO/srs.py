@@ -0,0 +1,149 @@
+# =================================================================
+# Precomputed Super Rotation System tables. Every piece has its 4
+# orientations built once at import, together with the kick lists for
+# each clockwise/counter-clockwise transition, so rotating in the game
+# is just an index lookup plus a few collision tests.
+#
+# Pieces keep the trimmed-shape convention used everywhere else: x/y is
+# the top-left corner of the filled cells, not of the SRS bounding box.
+# The box offsets are folded into the kick tables below.
+# =================================================================
+
+# Spawn orientation of each piece inside its SRS bounding box,
+# same order as SHAPES: I, O, T, J, L, S, Z
+SRS_BOXES = [
+    ["....",
+     "XXXX",
+     "....",
+     "...."],
+    ["XX",
+     "XX"],
+    [".X.",
+     "XXX",
+     "..."],
+    ["X..",
+     "XXX",
+     "..."],
+    ["..X",
+     "XXX",
+     "..."],
+    [".XX",
+     "XX.",
+     "..."],
+    ["XX.",
+     ".XX",
+     "..."],
+]
+
+I_PIECE = 0
+O_PIECE = 1
+T_PIECE = 2
+
+# SRS wall kicks, (dx, dy) with y pointing UP as in the guideline
+# tables. Keyed by (from_rotation, to_rotation); 0=spawn, 1=R, 2=180, 3=L
+JLSTZ_KICKS = {
+    (0, 1): [(0, 0), (-1, 0), (-1, 1), (0, -2), (-1, -2)],
+    (1, 0): [(0, 0), (1, 0), (1, -1), (0, 2), (1, 2)],
+    (1, 2): [(0, 0), (1, 0), (1, -1), (0, 2), (1, 2)],
+    (2, 1): [(0, 0), (-1, 0), (-1, 1), (0, -2), (-1, -2)],
+    (2, 3): [(0, 0), (1, 0), (1, 1), (0, -2), (1, -2)],
+    (3, 2): [(0, 0), (-1, 0), (-1, -1), (0, 2), (-1, 2)],
+    (3, 0): [(0, 0), (-1, 0), (-1, -1), (0, 2), (-1, 2)],
+    (0, 3): [(0, 0), (1, 0), (1, 1), (0, -2), (1, -2)],
+}
+
+I_KICKS = {
+    (0, 1): [(0, 0), (-2, 0), (1, 0), (-2, -1), (1, 2)],
+    (1, 0): [(0, 0), (2, 0), (-1, 0), (2, 1), (-1, -2)],
+    (1, 2): [(0, 0), (-1, 0), (2, 0), (-1, 2), (2, -1)],
+    (2, 1): [(0, 0), (1, 0), (-2, 0), (1, -2), (-2, 1)],
+    (2, 3): [(0, 0), (2, 0), (-1, 0), (2, 1), (-1, -2)],
+    (3, 2): [(0, 0), (-2, 0), (1, 0), (-2, -1), (1, 2)],
+    (3, 0): [(0, 0), (1, 0), (-2, 0), (1, -2), (-2, 1)],
+    (0, 3): [(0, 0), (-1, 0), (2, 0), (-1, 2), (2, -1)],
+}
+
+# T-spin corners of the 3x3 box, the two the T points at come first
+T_FRONT_CORNERS = [
+    ((0, 0), (2, 0)),
+    ((2, 0), (2, 2)),
+    ((0, 2), (2, 2)),
+    ((0, 0), (0, 2)),
+]
+
+
+class Orientation:
+    __slots__ = ('shape', 'masks', 'cells', 'width', 'height', 'col_mask',
+                 'ox', 'oy', 'corners')
+
+    def __init__(self, box_cells, rotation, piece):
+        xs = [x for x, _ in box_cells]
+        ys = [y for _, y in box_cells]
+        self.ox = min(xs)
+        self.oy = min(ys)
+        self.width = max(xs) - self.ox + 1
+        self.height = max(ys) - self.oy + 1
+        self.cells = tuple(sorted(((x - self.ox, y - self.oy) for x, y in box_cells),
+                                  key=lambda c: (c[1], c[0])))
+        self.shape = tuple(tuple(1 if (x, y) in self.cells else 0 for x in range(self.width))
+                           for y in range(self.height))
+        self.masks = tuple(sum(1 << x for x, cell in enumerate(row) if cell)
+                           for row in self.shape)
+        self.col_mask = 0
+        for mask in self.masks:
+            self.col_mask |= mask
+
+        # Corners relative to the trimmed position: front pair, then back pair
+        self.corners = None
+        if piece == T_PIECE:
+            front = T_FRONT_CORNERS[rotation]
+            back = tuple(c for c in ((0, 0), (2, 0), (0, 2), (2, 2)) if c not in front)
+            self.corners = tuple((cx - self.ox, cy - self.oy) for cx, cy in front + back)
+
+
+def _rotate_cw(cells, size):
+    return [(size - 1 - y, x) for x, y in cells]
+
+
+def _build():
+    orientations = []
+    kicks = []
+    for piece, rows in enumerate(SRS_BOXES):
+        size = len(rows)
+        cells = [(x, y) for y, row in enumerate(rows) for x, c in enumerate(row) if c == 'X']
+        states = []
+        for rotation in range(4):
+            if piece == O_PIECE:
+                states.append(Orientation(cells, 0, piece))
+            else:
+                states.append(Orientation(cells, rotation, piece))
+                cells = _rotate_cw(cells, size)
+        orientations.append(tuple(states))
+
+        # kicks[piece][rotation][direction] -> offsets to try on the
+        # trimmed x/y; direction 0 is clockwise, 1 counter-clockwise
+        table = JLSTZ_KICKS if piece != I_PIECE else I_KICKS
+        per_rotation = []
+        for rotation in range(4):
+            per_direction = []
+            for target in ((rotation + 1) % 4, (rotation - 1) % 4):
+                src, dst = states[rotation], states[target]
+                base_x, base_y = dst.ox - src.ox, dst.oy - src.oy
+                if piece == O_PIECE:
+                    offsets = ((0, 0),)
+                else:
+                    offsets = tuple((base_x + kx, base_y - ky)
+                                    for kx, ky in table[(rotation, target)])
+                per_direction.append(offsets)
+            per_rotation.append(tuple(per_direction))
+        kicks.append(tuple(per_rotation))
+    return tuple(orientations), tuple(kicks)
+
+
+ORIENTATIONS, KICKS = _build()
+BOX_SIZES = tuple(len(rows) for rows in SRS_BOXES)
+
+
+def spawn_x(shape_idx, grid_width):
+    # Guideline spawn: bounding box centred, rounded to the left
+    return (grid_width - BOX_SIZES[shape_idx]) // 2 + ORIENTATIONS[shape_idx][0].ox
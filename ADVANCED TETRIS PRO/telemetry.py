@@ -0,0 +1,614 @@
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import threading
+from collections import deque
+
+from board import BitBoard
+from srs import ORIENTATIONS
+from engine import GameEngine, Tetrimino, GRID_WIDTH, GRID_HEIGHT, SHAPES_COLORS, TICK_RATE
+from scoring import NO_T_SPIN
+from replay import encode_varint, decode_varint
+
+# =================================================================
+# Gameplay event stream. The engine already reports what happens
+# (moves, rotations, holds, drops, locks, clears, game over) as
+# (name, payload) tuples; EventBus.publish() turns each tick's worth
+# into typed records with the tick they happened on:
+#
+#   (tick, kind, a, b, c, d)   fields per kind in EVENT_FIELDS
+#
+# Records go into a ring of preallocated int slots, so the game loop
+# only pays for a few list stores per event: no locks, no allocation,
+# no I/O. If the ring is ever full the event is counted as dropped
+# rather than waited for. A background thread drains it every
+# FLUSH_INTERVAL (sooner once it's half full) and hands each batch to
+# the sinks:
+#
+#   JsonlSink    one JSON object per line, rotated by size
+#   BinarySink   varint log, a few bytes per event (like replays)
+#   Aggregator   per-player totals in memory: PPS, inputs per piece,
+#                finesse faults, hold usage, T-spins
+#
+#   python main.py --events             # log to events/
+#   python telemetry.py                 # per-player stats from events/
+#   python telemetry.py a.jsonl b.tpe   # ... or from the given logs
+#   python telemetry.py --bench         # cost of publishing per tick
+# =================================================================
+
+# Next to the game, like replays/ and scores.db, whatever the working directory
+EVENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "events")
+JSONL_NAME = "events.jsonl"
+JSONL_MAX_BYTES = 4 << 20
+JSONL_KEEP = 8            # Rotated files kept: events.1.jsonl ... events.8.jsonl
+BINARY_EXT = ".tpe"
+MAGIC = b'TPEV'
+VERSION = 1
+
+CAPACITY = 1 << 14        # Records the ring holds between drains
+FLUSH_INTERVAL = 0.5      # Seconds between drains
+RECORD = 6                # Slots per record
+
+EVENT_START = 0
+EVENT_MOVE = 1
+EVENT_ROTATE = 2
+EVENT_DROP = 3
+EVENT_HOLD = 4
+EVENT_LOCK = 5
+EVENT_CLEAR = 6
+EVENT_GARBAGE = 7
+EVENT_GAME_OVER = 8
+
+EVENT_NAMES = ('start', 'move', 'rotate', 'drop', 'hold', 'lock', 'clear', 'garbage', 'game_over')
+EVENT_FIELDS = (
+    ('player', 'mode', 'seed'),             # player: index into EventBus.players
+    ('dx', 'dy'),
+    ('direction', 't_spin'),
+    ('distance',),
+    ('shape',),
+    ('shape', 'rotation', 'x', 'y'),
+    ('lines', 't_spin', 'points', 'perfect'),
+    ('lines',),
+    ('score', 'lines', 'pieces'),
+)
+MODES = ('play', 'demo', 'versus')
+KIND_BITS = 4
+
+assert len(EVENT_NAMES) <= 1 << KIND_BITS
+
+
+def event_dict(record, players):
+    # A record as {'tick', 'event', fields...}; the START record's
+    # player and mode become names
+    tick, kind = record[0], record[1]
+    event = {'tick': tick, 'event': EVENT_NAMES[kind]}
+    event.update(zip(EVENT_FIELDS[kind], record[2:]))
+    if kind == EVENT_START:
+        event['player'] = players[event['player']]
+        event['mode'] = MODES[event['mode']]
+    return event
+
+
+class EventBus:
+    def __init__(self, sinks=(), capacity=CAPACITY, interval=FLUSH_INTERVAL):
+        self.capacity = capacity
+        self.slots = [0] * (capacity * RECORD)
+        self.head = 0      # Records written; only the game thread moves it
+        self.tail = 0      # Records drained; only the worker moves it
+        self.written = 0   # Records the sinks have had
+        self.dropped = 0
+        self.players = []  # Names, indexed by START records
+        self.sinks = list(sinks)
+        self.interval = interval
+        self.wake = threading.Event()
+        self.drained = threading.Condition()
+        self.closing = False
+
+        self.worker = threading.Thread(target=self._work, name="events", daemon=True)
+        self.worker.start()
+
+    # ---------------------------------------------------------------
+    # Game thread
+    # ---------------------------------------------------------------
+    def emit(self, tick, kind, a=0, b=0, c=0, d=0):
+        head = self.head
+        backlog = head - self.tail
+        if backlog >= self.capacity:
+            self.dropped += 1
+            return
+        slots = self.slots
+        i = head % self.capacity * RECORD
+        slots[i] = tick
+        slots[i + 1] = kind
+        slots[i + 2] = a
+        slots[i + 3] = b
+        slots[i + 4] = c
+        slots[i + 5] = d
+        self.head = head + 1  # Publishes the record to the worker
+        if backlog == self.capacity // 2:
+            self.wake.set()
+
+    def begin(self, engine, player, mode='play'):
+        # Marks the start of a game; everything after it is `player`'s
+        if player not in self.players:
+            self.players.append(player)
+        self.emit(engine.ticks, EVENT_START, self.players.index(player), MODES.index(mode), engine.seed)
+
+    def publish(self, engine, mark=0):
+        # Records the engine's events from index `mark` on, i.e. the ones
+        # reported since len(engine.events) was `mark`, at the current tick
+        events = engine.events
+        if len(events) <= mark:
+            return
+        tick = engine.ticks
+        emit = self.emit
+        for i in range(mark, len(events)):
+            name, payload = events[i]
+            if name == 'move':
+                emit(tick, EVENT_MOVE, payload[0], payload[1])
+            elif name == 'rotate':
+                emit(tick, EVENT_ROTATE, payload[0], int(payload[1]))
+            elif name == 'drop':
+                emit(tick, EVENT_DROP, payload)
+            elif name == 'hold':
+                emit(tick, EVENT_HOLD, payload)
+            elif name == 'lock':
+                emit(tick, EVENT_LOCK, *payload[2:])
+            elif name == 'clear':
+                rows, _, points, perfect, t_spin = payload
+                emit(tick, EVENT_CLEAR, len(rows), t_spin, points, int(perfect))
+            elif name == 'garbage':
+                emit(tick, EVENT_GARBAGE, payload)
+            elif name == 'game_over':
+                emit(tick, EVENT_GAME_OVER, payload, engine.lines, engine.piece_count)
+
+    # ---------------------------------------------------------------
+    # Worker
+    # ---------------------------------------------------------------
+    def _work(self):
+        while True:
+            self.wake.wait(self.interval)
+            self.wake.clear()
+            closing = self.closing
+            self.drain()
+            if closing:
+                break
+        for sink in self.sinks:
+            sink.close()
+
+    def drain(self):
+        head = self.head
+        slots, capacity = self.slots, self.capacity
+        batch = []
+        for n in range(self.tail, head):
+            i = n % capacity * RECORD
+            batch.append(tuple(slots[i:i + RECORD]))
+        self.tail = head  # Frees the slots for the game thread
+
+        if batch:
+            for sink in list(self.sinks):
+                try:
+                    sink.write(batch, self.players)
+                except (OSError, ValueError) as e:
+                    print(f"Event sink {type(sink).__name__} failed, dropping it: {e}", file=sys.stderr)
+                    self.sinks.remove(sink)
+        with self.drained:
+            self.written = head
+            self.drained.notify_all()
+
+    def flush(self, timeout=None):
+        # Blocks until everything emitted so far has reached the sinks
+        target = self.head
+        self.wake.set()
+        with self.drained:
+            return self.drained.wait_for(lambda: self.written >= target, timeout)
+
+    def close(self):
+        self.closing = True
+        self.wake.set()
+        self.worker.join()
+
+
+# =================================================================
+# Sinks: write(records, players) on the worker thread, then close()
+# =================================================================
+
+class JsonlSink:
+    # events.jsonl, rolled over to events.1.jsonl (and .2 ...) once it
+    # passes max_bytes. Every line names its player, so any one file
+    # can be read on its own
+    def __init__(self, directory=EVENT_DIR, max_bytes=JSONL_MAX_BYTES, keep=JSONL_KEEP):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.path = os.path.join(directory, JSONL_NAME)
+        self.max_bytes = max_bytes
+        self.keep = keep
+        self.player = None
+        self.file = open(self.path, "a", encoding="utf-8")
+        self.size = self.file.tell()
+
+    def rotated(self, n):
+        return rotated_jsonl(self.directory, n)
+
+    def rotate(self):
+        self.file.close()
+        for n in range(self.keep - 1, 0, -1):
+            if os.path.exists(self.rotated(n)):
+                os.replace(self.rotated(n), self.rotated(n + 1))
+        if self.keep:
+            os.replace(self.path, self.rotated(1))
+        else:
+            os.remove(self.path)
+        self.file = open(self.path, "w", encoding="utf-8")
+        self.size = 0
+
+    def write(self, records, players):
+        lines = []
+        for record in records:
+            event = event_dict(record, players)
+            if record[1] == EVENT_START:
+                self.player = event['player']
+            else:
+                event['player'] = self.player
+            lines.append(json.dumps(event, separators=(',', ':')) + "\n")
+        data = "".join(lines)
+        if self.size and self.size + len(data) > self.max_bytes:
+            self.rotate()
+        self.file.write(data)
+        self.file.flush()
+        self.size += len(data)
+
+    def close(self):
+        self.file.close()
+
+
+def zigzag(value):
+    return value << 1 if value >= 0 else (-value << 1) - 1
+
+
+def unzigzag(value):
+    return value >> 1 if not value & 1 else -((value + 1) >> 1)
+
+
+class BinarySink:
+    # One file per session:
+    #
+    #   header:  b'TPEV', version byte
+    #   records: varint (zigzag(tick delta) << 4 | kind), then one
+    #            zigzag varint per field of the kind; START carries
+    #            the player's name (varint length + UTF-8) instead of
+    #            an index, and its tick delta is from 0
+    def __init__(self, path=None, directory=EVENT_DIR):
+        if path is None:
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, time.strftime("%Y%m%d-%H%M%S") + BINARY_EXT)
+        self.path = path
+        self.file = open(path, "wb")
+        self.file.write(MAGIC + bytes([VERSION]))
+        self.last_tick = 0
+
+    def write(self, records, players):
+        out = bytearray()
+        for record in records:
+            tick, kind = record[0], record[1]
+            if kind == EVENT_START:
+                self.last_tick = 0
+            encode_varint(zigzag(tick - self.last_tick) << KIND_BITS | kind, out)
+            self.last_tick = tick
+            values = record[2:2 + len(EVENT_FIELDS[kind])]
+            if kind == EVENT_START:
+                name = players[values[0]].encode()
+                encode_varint(len(name), out)
+                out += name
+                values = values[1:]
+            for value in values:
+                encode_varint(zigzag(value), out)
+        self.file.write(out)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def read_binary(path):
+    # Events of a BinarySink file, as dicts like event_dict() makes
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:4] != MAGIC or len(data) < 5 or data[4] != VERSION:
+        raise ValueError(f"{path} is not a version {VERSION} event log")
+    pos = 5
+    last_tick = 0
+    while pos < len(data):
+        header, pos = decode_varint(data, pos)
+        kind = header & ((1 << KIND_BITS) - 1)
+        if kind == EVENT_START:
+            last_tick = 0
+        last_tick += unzigzag(header >> KIND_BITS)
+        event = {'tick': last_tick, 'event': EVENT_NAMES[kind]}
+        fields = EVENT_FIELDS[kind]
+        if kind == EVENT_START:
+            length, pos = decode_varint(data, pos)
+            event['player'] = data[pos:pos + length].decode()
+            pos += length
+            fields = fields[1:]
+        for field in fields:
+            value, pos = decode_varint(data, pos)
+            event[field] = unzigzag(value)
+        if kind == EVENT_START:
+            event['mode'] = MODES[event['mode']]
+        yield event
+
+
+def rotated_jsonl(directory, n):
+    stem, ext = os.path.splitext(JSONL_NAME)
+    return os.path.join(directory, f"{stem}.{n}{ext}")
+
+
+def jsonl_logs(directory=EVENT_DIR):
+    # JsonlSink's files, oldest first
+    rotated = []
+    n = 1
+    while os.path.exists(rotated_jsonl(directory, n)):
+        rotated.append(rotated_jsonl(directory, n))
+        n += 1
+    current = os.path.join(directory, JSONL_NAME)
+    return rotated[::-1] + ([current] if os.path.exists(current) else [])
+
+
+def log_files(directory=EVENT_DIR):
+    # The JSONL files hold the same events as the binary logs, so
+    # they're only read when there are no binary ones
+    return sorted(glob.glob(os.path.join(directory, "*" + BINARY_EXT))) or jsonl_logs(directory)
+
+
+def read_jsonl(path):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def read_events(path):
+    return read_binary(path) if path.endswith(BINARY_EXT) else read_jsonl(path)
+
+
+# =================================================================
+# Aggregation
+# =================================================================
+
+FINESSE_Y = 4  # Clear of the floor and the top, so only walls get in the way
+_finesse = {}
+
+
+def finesse_table(shape_idx):
+    # Fewest moves + rotations from spawn to each (rotation, x) on an
+    # empty board. Placements that cover the same cells (the other
+    # rotations of O, I, S, Z) share the best of their counts
+    table = _finesse.get(shape_idx)
+    if table is not None:
+        return table
+    grid = BitBoard(GRID_WIDTH, GRID_HEIGHT, SHAPES_COLORS)
+    piece = Tetrimino(shape_idx, y=FINESSE_Y)
+    start = (0, piece.x, piece.y)
+    inputs = {start: 0}
+    queue = deque([start])
+    while queue:
+        state = queue.popleft()
+        for step in ('left', 'right', 'cw', 'ccw'):
+            piece.set_rotation(state[0])
+            piece.x, piece.y = state[1], state[2]
+            if step == 'left':
+                moved = piece.move(-1, 0, grid)
+            elif step == 'right':
+                moved = piece.move(1, 0, grid)
+            else:
+                moved = piece.rotate(grid, 0, 1 if step == 'cw' else -1)
+            after = (piece.rotation, piece.x, piece.y)
+            if moved and after not in inputs:
+                inputs[after] = inputs[state] + 1
+                queue.append(after)
+
+    def footprint(rotation, x):
+        cells = ORIENTATIONS[shape_idx][rotation].cells
+        top = min(y for _, y in cells)
+        return frozenset((x + cx, cy - top) for cx, cy in cells)
+
+    best = {}
+    for (rotation, x, _), count in inputs.items():
+        key = footprint(rotation, x)
+        best[key] = min(best.get(key, count), count)
+    table = _finesse[shape_idx] = {(rotation, x): best[footprint(rotation, x)]
+                                   for rotation, x, _ in inputs}
+    return table
+
+
+STAT_FIELDS = ('games', 'ticks', 'pieces', 'inputs', 'judged', 'faults', 'holds', 'rotations',
+               't_spins', 'lines', 'soft_drops', 'hard_drops', 'garbage', 'best')
+
+
+class PlayerStats:
+    __slots__ = STAT_FIELDS + ('last_tick', 'piece_inputs', 'soft_dropped')
+
+    def __init__(self):
+        for field in STAT_FIELDS:
+            setattr(self, field, 0)
+        self.last_tick = 0
+        self.piece_inputs = 0     # Moves and rotations of the current piece
+        self.soft_dropped = False
+
+    def summary(self):
+        seconds = self.ticks / TICK_RATE
+        summary = {field: getattr(self, field) for field in STAT_FIELDS}
+        summary['seconds'] = seconds
+        summary['pps'] = self.pieces / seconds if seconds else 0.0
+        summary['inputs_per_piece'] = self.inputs / self.pieces if self.pieces else 0.0
+        summary['fault_rate'] = self.faults / self.judged if self.judged else 0.0
+        summary['hold_rate'] = self.holds / self.pieces if self.pieces else 0.0
+        return summary
+
+
+class Aggregator:
+    # Per-player totals, fed live as a sink or from log files with
+    # add(). Finesse: a piece that was placed without soft drop (so no
+    # tucks or spins) is judged against finesse_table(); a fault is
+    # any extra move or rotation. Auto-repeated moves count one per
+    # cell, like the engine's move events
+    def __init__(self):
+        self.players = {}
+        self.current = None
+        self.lock = threading.Lock()  # write() runs on the bus worker
+
+    def write(self, records, players):
+        with self.lock:
+            for record in records:
+                self.add(event_dict(record, players))
+
+    def close(self):
+        pass
+
+    def add(self, event):
+        name = event['event']
+        player = event.get('player', self.current)
+        stats = self.players.get(player)
+        if stats is None:
+            stats = self.players[player] = PlayerStats()
+        tick = event['tick']
+        if name == 'start':
+            self.current = player
+            stats.games += 1
+            stats.last_tick = tick
+            stats.piece_inputs = 0
+            stats.soft_dropped = False
+            return
+        stats.ticks += max(0, tick - stats.last_tick)
+        stats.last_tick = tick
+
+        if name == 'move':
+            if event['dy']:
+                stats.soft_drops += 1
+                stats.soft_dropped = True
+            else:
+                stats.inputs += 1
+                stats.piece_inputs += 1
+        elif name == 'rotate':
+            stats.inputs += 1
+            stats.rotations += 1
+            stats.piece_inputs += 1
+        elif name == 'drop':
+            stats.hard_drops += 1
+        elif name == 'hold':
+            stats.holds += 1
+            stats.piece_inputs = 0  # A new piece is in play
+            stats.soft_dropped = False
+        elif name == 'lock':
+            stats.pieces += 1
+            if not stats.soft_dropped:
+                optimal = finesse_table(event['shape']).get((event['rotation'], event['x']))
+                if optimal is not None:
+                    stats.judged += 1
+                    stats.faults += stats.piece_inputs > optimal
+            stats.piece_inputs = 0
+            stats.soft_dropped = False
+        elif name == 'clear':
+            stats.lines += event['lines']
+            stats.t_spins += event['t_spin'] != NO_T_SPIN
+        elif name == 'garbage':
+            stats.garbage += event['lines']
+        elif name == 'game_over':
+            stats.best = max(stats.best, event['score'])
+
+    def summary(self):
+        with self.lock:
+            return {player: stats.summary() for player, stats in self.players.items()}
+
+
+def format_summary(summary):
+    lines = [f"{'player':<10}{'games':>6}{'pieces':>8}{'pps':>7}{'inp/pc':>8}"
+             f"{'finesse':>9}{'holds':>7}{'tspins':>8}{'lines':>7}{'best':>9}"]
+    for player, s in sorted(summary.items(), key=lambda item: str(item[0])):
+        lines.append(f"{str(player):<10}{s['games']:>6}{s['pieces']:>8}{s['pps']:>7.2f}"
+                     f"{s['inputs_per_piece']:>8.2f}{s['fault_rate']:>8.1%} {s['hold_rate']:>6.1%}"
+                     f"{s['t_spins']:>8}{s['lines']:>7}{s['best']:>9}")
+    return "\n".join(lines)
+
+
+# =================================================================
+# Benchmark: what publishing costs the game loop
+# =================================================================
+
+def play(engine, ai, bus=None, mode='demo'):
+    # One AI game, publishing each tick to `bus` the way the game does
+    if bus is not None:
+        bus.begin(engine, 'ai', mode)
+    while not engine.game_over:
+        mark = len(engine.events)
+        action = ai(engine)
+        if action is not None:
+            engine.apply(action)
+        engine.step()
+        if bus is not None:
+            bus.publish(engine, mark)
+        engine.events.clear()
+
+
+def benchmark(games=3, seed=0):
+    from ai import AIInput
+    results = {}
+    for label, use_bus in (("no bus", False), ("bus", True)):
+        bus = EventBus([Aggregator()]) if use_bus else None
+        ticks = 0
+        start = time.perf_counter()
+        for game in range(games):
+            engine = GameEngine(seed=seed + game)
+            play(engine, AIInput(seed=seed + game), bus)
+            ticks += engine.ticks
+        elapsed = time.perf_counter() - start
+        results[label] = elapsed / ticks * 1e6
+        print(f"{label:<8} {ticks} ticks, {results[label]:.2f} us/tick")
+        if bus is not None:
+            events = bus.head
+            bus.flush()
+            bus.close()
+            print(f"         {events} events, {bus.dropped} dropped")
+            print(format_summary(bus.sinks[0].summary()))
+
+    # A single append, with the worker stopped so it can't interfere
+    bus = EventBus()
+    bus.close()
+    count = bus.capacity
+    emit = bus.emit
+    start = time.perf_counter()
+    for i in range(count):
+        emit(i, EVENT_MOVE, 1, 0)
+    results['emit_ns'] = (time.perf_counter() - start) / count * 1e9
+    print(f"emit     {results['emit_ns']:.0f} ns/event")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-player stats from gameplay event logs")
+    parser.add_argument("logs", nargs="*", default=[EVENT_DIR],
+                        help=f".jsonl or {BINARY_EXT} logs, or directories of them (default {EVENT_DIR}/)")
+    parser.add_argument("--json", action="store_true", help="print the stats as JSON")
+    parser.add_argument("--bench", action="store_true", help="time publishing on seeded AI games")
+    parser.add_argument("--games", type=int, default=3, help="games for --bench")
+    args = parser.parse_args()
+
+    if args.bench:
+        benchmark(args.games)
+        sys.exit(0)
+    paths = []
+    for path in args.logs:
+        paths += log_files(path) if os.path.isdir(path) else [path]
+    aggregator = Aggregator()
+    for path in paths:
+        try:
+            for event in read_events(path):
+                aggregator.add(event)
+        except (OSError, ValueError) as e:
+            print(f"Skipping {path}: {e}", file=sys.stderr)
+    summary = aggregator.summary()
+    print(json.dumps(summary, indent=1) if args.json else format_summary(summary))
@@ -0,0 +1,135 @@
+import random
+
+from engine import (
+    GameEngine, GRID_WIDTH, GRID_HEIGHT, TICK_RATE, LOCK_DELAY, SHAPES_COLORS,
+    GARBAGE_COLOR, CYAN, YELLOW, ACTION_RIGHT, ACTION_HARD_DROP, ACTION_COUNT,
+)
+from scoring import COMBO_SCORE, gravity_for_level
+
+I_PIECE = SHAPES_COLORS.index(CYAN)
+O_PIECE = SHAPES_COLORS.index(YELLOW)
+
+
+def board(rows, hole, extra=()):
+    # An engine whose bottom `rows` rows are full except column `hole`,
+    # plus single cells at `extra` (x, y)
+    engine = GameEngine(seed=0, move_cooldown=0, rotate_cooldown=0)
+    for y in range(GRID_HEIGHT - rows, GRID_HEIGHT):
+        for x in range(GRID_WIDTH):
+            if x != hole:
+                engine.grid.set_cell(x, y, GARBAGE_COLOR)
+    for x, y in extra:
+        engine.grid.set_cell(x, y, GARBAGE_COLOR)
+    return engine
+
+
+def drop(engine, shape, rotation, column):
+    # Hard-drops `shape` with its leftmost cell in `column` and locks it;
+    # returns the points scored for the clear alone
+    piece = engine.current_piece
+    piece.reset(shape)
+    piece.set_rotation(rotation)
+    piece.x = column - min((mask & -mask).bit_length() - 1 for mask in piece.masks if mask)
+    score = engine.score
+    engine.apply(ACTION_HARD_DROP)
+    distance = [payload for name, payload in engine.events if name == 'drop'][-1]
+    engine.step()
+    return engine.score - score - 2 * distance
+
+
+def test_tetris_clears_only_full_rows():
+    engine = board(4, 9, extra=[(0, GRID_HEIGHT - 5)])
+    points = drop(engine, I_PIECE, 1, 9)
+    assert engine.lines == 4
+    assert points == 800
+    assert engine.last_clear == "TETRIS" and engine.b2b
+    # The stray cell above the cleared rows fell to the floor
+    assert [engine.grid[GRID_HEIGHT - 1][x] for x in range(GRID_WIDTH)] == [GARBAGE_COLOR] + [None] * 9
+    assert engine.grid.cell_count == 1
+
+
+def test_back_to_back_tetris_and_combo():
+    engine = board(8, 9, extra=[(0, GRID_HEIGHT - 9)])
+    assert drop(engine, I_PIECE, 1, 9) == 800
+    assert engine.combo == 0
+    # Back-to-back is worth half again, plus one combo step
+    assert drop(engine, I_PIECE, 1, 9) == 1200 + COMBO_SCORE
+    assert engine.combo == 1 and engine.lines == 8
+
+
+def test_perfect_clear():
+    engine = board(2, 8)
+    for y in (GRID_HEIGHT - 1, GRID_HEIGHT - 2):
+        engine.grid.set_cell(9, y, None)
+    assert drop(engine, O_PIECE, 0, 8) == 300 + 1200
+    assert engine.grid.is_empty()
+
+
+def test_level_and_gravity_follow_lines():
+    engine = board(1, 9)
+    engine.lines = 9
+    assert drop(engine, I_PIECE, 1, 9) == 100
+    assert engine.level == 2
+    assert engine.gravity == 1 / (gravity_for_level(2) * TICK_RATE)
+
+
+def test_gravity_is_counted_in_ticks():
+    # Level 1 falls a row a second, whatever the frame rate
+    engine = GameEngine(seed=0)
+    piece = engine.current_piece
+    start = piece.y
+    engine.run_ticks(TICK_RATE - 1)
+    assert piece.y == start
+    engine.run_ticks(1)
+    assert piece.y == start + 1
+    engine.run_ticks(4 * TICK_RATE)
+    assert piece.y == start + 5
+
+
+def test_lock_delay_is_counted_in_ticks():
+    engine = GameEngine(seed=0)
+    piece = engine.current_piece
+    while not piece.locking:
+        engine.step()
+    ticks = 1
+    while engine.piece_count == 0:
+        engine.step()
+        ticks += 1
+    assert ticks == LOCK_DELAY
+
+
+def test_slid_off_a_ledge_keeps_falling():
+    # An O lands on a ledge (columns 0-5 filled from row 10 down) and is
+    # slid right over the empty columns: it has to fall to the floor
+    # rather than lock in mid-air when the first lock delay runs out
+    engine = GameEngine(0, move_cooldown=0, rotate_cooldown=0)
+    for y in range(10, GRID_HEIGHT):
+        for x in range(6):
+            engine.grid.set_cell(x, y, GARBAGE_COLOR)
+    piece = engine.current_piece
+    piece.reset(O_PIECE, x=3, y=0)
+    while not piece.locking:
+        engine.step()
+    while engine.apply(ACTION_RIGHT):
+        pass
+    ticks = 0
+    while engine.piece_count == 0:
+        y = piece.y
+        engine.step()
+        ticks += 1
+    assert ticks > LOCK_DELAY
+    assert y == GRID_HEIGHT - 2
+
+
+def test_same_seed_and_inputs_replay_exactly():
+    def play(seed):
+        engine = GameEngine(seed)
+        inputs = random.Random(seed)
+        for _ in range(3000):
+            if inputs.random() < 0.2:
+                engine.apply(inputs.randrange(ACTION_COUNT))
+            engine.step()
+        return engine.checksum(), engine.piece_count
+
+    assert play(5) == play(5)
+    assert play(5) != play(6)
@@ -0,0 +1,35 @@
+from engine import GameEngine, GRID_WIDTH, GRID_HEIGHT, GARBAGE_COLOR
+from snapshot import Snapshot, clone
+
+
+def garbage_engine():
+    # A game a few pieces in, with two garbage rows open at column 3
+    engine = GameEngine(seed=7)
+    for _ in range(200):
+        engine.step()
+    engine.grid.add_garbage(2, 3, GARBAGE_COLOR)
+    return engine
+
+
+def cells(engine):
+    return [list(row) for row in engine.grid]
+
+
+def test_garbage_survives_bytes_round_trip():
+    engine = garbage_engine()
+    copy = Snapshot.from_bytes(Snapshot.of(engine).to_bytes()).engine()
+    assert cells(copy) == cells(engine)
+    assert copy.grid[GRID_HEIGHT - 1][0] == GARBAGE_COLOR
+    assert copy.grid[GRID_HEIGHT - 1][3] is None
+    assert copy.checksum() == engine.checksum()
+
+
+def test_garbage_survives_clone_and_restore():
+    engine = garbage_engine()
+    snap = Snapshot.of(engine)
+    assert cells(clone(engine)) == cells(engine)
+
+    other = GameEngine(seed=1)
+    snap.restore(other)
+    assert cells(other) == cells(engine)
+    assert [other.grid[GRID_HEIGHT - 2][x] for x in range(GRID_WIDTH)].count(GARBAGE_COLOR) == GRID_WIDTH - 1
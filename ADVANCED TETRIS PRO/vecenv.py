@@ -0,0 +1,342 @@
+import numpy as np
+
+from srs import ORIENTATIONS, KICKS, spawn_x
+from scoring import (
+    LINE_SCORES, NO_T_SPIN, PERFECT_CLEAR_SCORES, B2B_PERFECT_TETRIS,
+    COMBO_SCORE, SOFT_DROP_SCORE, HARD_DROP_SCORE, LINES_PER_LEVEL, MAX_LEVEL,
+)
+from engine import (
+    GRID_WIDTH, GRID_HEIGHT, NEXT_QUEUE_SIZE, ACTION_LEFT, ACTION_RIGHT,
+    ACTION_SOFT_DROP, ACTION_ROTATE_CW, ACTION_ROTATE_CCW, ACTION_HARD_DROP,
+    ACTION_HOLD, ACTION_COUNT,
+)
+
+# =================================================================
+# Batched environment for training agents: K games stepped in lockstep
+# with reset()/step(actions), all state in NumPy arrays and every rule
+# applied to the whole batch at once.
+#
+#   board      (K, 20, 10) uint8   0 = empty, else piece index + 1
+#   piece      (K,)  current piece (same indices as SHAPES)
+#   rotation   (K,)  0..3, x/y the trimmed top-left as in the engine
+#   hold       (K,)  held piece or -1, can_hold (K,) bool
+#   queue      (K, NEXT_QUEUE_SIZE) next pieces
+#
+# Observations are these arrays themselves, not copies: they are
+# updated in place by every step()/reset(), so copy anything you want
+# to keep.
+#
+# Rules follow GameEngine: SRS rotation and kicks, 7-bag, hold once
+# per piece, guideline line/combo/back-to-back/perfect-clear scoring
+# and drop points, game over when a lock leaves blocks in the top row
+# or the next piece can't spawn. One step is one action (or NOOP)
+# followed by gravity; there are no input cooldowns or lock delay, a
+# piece locks when gravity can't move it. T-spins aren't detected.
+# =================================================================
+
+ACTION_NOOP = ACTION_COUNT
+NUM_ACTIONS = ACTION_COUNT + 1
+
+PIECE_COUNT = len(ORIENTATIONS)
+SPAWN_X = np.array([spawn_x(i, GRID_WIDTH) for i in range(PIECE_COUNT)], np.int16)
+
+# Cell offsets per piece/rotation: CELL_X/CELL_Y[piece, rotation] -> (4,)
+CELL_X = np.array([[[x for x, _ in o.cells] for o in states] for states in ORIENTATIONS], np.int16)
+CELL_Y = np.array([[[y for _, y in o.cells] for o in states] for states in ORIENTATIONS], np.int16)
+
+# KICK_X/KICK_Y[piece, rotation, direction] -> (5,) offsets to try,
+# direction 0 = clockwise; the O piece's single kick is repeated
+KICK_X = np.array([[[[offsets[min(i, len(offsets) - 1)][0] for i in range(5)]
+                     for offsets in per_rotation] for per_rotation in kicks] for kicks in KICKS], np.int16)
+KICK_Y = np.array([[[[offsets[min(i, len(offsets) - 1)][1] for i in range(5)]
+                     for offsets in per_rotation] for per_rotation in kicks] for kicks in KICKS], np.int16)
+
+LINE_POINTS = np.array(LINE_SCORES[NO_T_SPIN], np.int64)
+PERFECT_POINTS = np.array(PERFECT_CLEAR_SCORES, np.int64)
+BAG = np.arange(PIECE_COUNT, dtype=np.int8)
+
+
+class VecTetris:
+    def __init__(self, num_envs, seed=None, gravity_steps=1, autoreset=True):
+        # gravity_steps: steps per row of gravity
+        self.num_envs = num_envs
+        self.gravity_steps = gravity_steps
+        self.autoreset = autoreset
+        self.rng = np.random.default_rng(seed)
+        k = num_envs
+
+        self.board = np.zeros((k, GRID_HEIGHT, GRID_WIDTH), np.uint8)
+        self.piece = np.zeros(k, np.int8)
+        self.rotation = np.zeros(k, np.int8)
+        self.x = np.zeros(k, np.int16)
+        self.y = np.zeros(k, np.int16)
+        self.hold = np.full(k, -1, np.int8)
+        self.can_hold = np.ones(k, bool)
+        self.queue = np.zeros((k, NEXT_QUEUE_SIZE), np.int8)
+        self.bag = np.zeros((k, PIECE_COUNT), np.int8)
+        self.bag_pos = np.zeros(k, np.int8)
+
+        self.score = np.zeros(k, np.int64)
+        self.lines = np.zeros(k, np.int32)
+        self.level = np.ones(k, np.int32)
+        self.combo = np.full(k, -1, np.int32)
+        self.b2b = np.zeros(k, bool)
+        self.pieces = np.zeros(k, np.int32)
+        self.steps = np.zeros(k, np.int32)
+        self.fall = np.zeros(k, np.int32)
+        self.game_over = np.zeros(k, bool)
+
+        self.observation = {
+            'board': self.board,
+            'piece': self.piece,
+            'rotation': self.rotation,
+            'x': self.x,
+            'y': self.y,
+            'hold': self.hold,
+            'can_hold': self.can_hold,
+            'queue': self.queue,
+        }
+        self.all_envs = np.arange(k)
+        self.reset()
+
+    def reset(self, envs=None, seed=None):
+        # Resets every env, or just the given indices; returns the observation
+        if seed is not None:
+            self.rng = np.random.default_rng(seed)
+        idx = self.all_envs if envs is None else np.asarray(envs)
+        self.board[idx] = 0
+        self.bag_pos[idx] = PIECE_COUNT
+        self.hold[idx] = -1
+        self.can_hold[idx] = True
+        for field in (self.score, self.lines, self.pieces, self.steps, self.fall):
+            field[idx] = 0
+        self.level[idx] = 1
+        self.combo[idx] = -1
+        self.b2b[idx] = False
+        self.game_over[idx] = False
+
+        self.piece[idx] = self._draw(idx)
+        for i in range(NEXT_QUEUE_SIZE):
+            self.queue[idx, i] = self._draw(idx)
+        self._spawn(idx, self.piece[idx])
+        return self.observation
+
+    def step(self, actions):
+        # actions: (K,) ints, the engine's ACTION_* or ACTION_NOOP.
+        # Returns (observation, reward, done, info); reward is the score
+        # gained this step, finished envs are reset when autoreset is on
+        # and info['final_score'/'final_lines'] hold their results
+        actions = np.asarray(actions)
+        reward = np.zeros(self.num_envs, np.int64)
+        cleared = np.zeros(self.num_envs, np.int32)
+        alive = ~self.game_over
+        self.steps[alive] += 1
+
+        for action, dx in ((ACTION_LEFT, -1), (ACTION_RIGHT, 1)):
+            idx = np.flatnonzero(alive & (actions == action))
+            if idx.size:
+                ok = ~self._collides(idx, self.piece[idx], self.rotation[idx], self.x[idx] + dx, self.y[idx])
+                self.x[idx[ok]] += dx
+
+        for action, direction in ((ACTION_ROTATE_CW, 0), (ACTION_ROTATE_CCW, 1)):
+            idx = np.flatnonzero(alive & (actions == action))
+            if idx.size:
+                self._rotate(idx, direction)
+
+        idx = np.flatnonzero(alive & (actions == ACTION_SOFT_DROP))
+        if idx.size:
+            ok = ~self._collides(idx, self.piece[idx], self.rotation[idx], self.x[idx], self.y[idx] + 1)
+            moved = idx[ok]
+            self.y[moved] += 1
+            reward[moved] += SOFT_DROP_SCORE
+
+        idx = np.flatnonzero(alive & (actions == ACTION_HOLD) & self.can_hold)
+        if idx.size:
+            self._hold(idx)
+
+        # Hard drops lock right away; everything else gets gravity and
+        # locks when it can't fall
+        dropped = alive & (actions == ACTION_HARD_DROP)
+        idx = np.flatnonzero(dropped)
+        if idx.size:
+            distance = self._drop_distance(idx)
+            self.y[idx] += distance
+            reward[idx] += HARD_DROP_SCORE * distance
+
+        self.fall[alive] += 1
+        falling = alive & ~dropped & (self.fall >= self.gravity_steps)
+        idx = np.flatnonzero(falling)
+        landed = np.zeros(self.num_envs, bool)
+        if idx.size:
+            self.fall[idx] = 0
+            blocked = self._collides(idx, self.piece[idx], self.rotation[idx], self.x[idx], self.y[idx] + 1)
+            self.y[idx[~blocked]] += 1
+            landed[idx[blocked]] = True
+
+        idx = np.flatnonzero(dropped | landed)
+        if idx.size:
+            self._lock(idx, reward, cleared)
+
+        self.score += reward
+        done = self.game_over.copy()
+        info = {'lines': cleared}
+        if self.autoreset and done.any():
+            finished = np.flatnonzero(done)
+            info['final_score'] = np.where(done, self.score, 0)
+            info['final_lines'] = np.where(done, self.lines, 0)
+            info['final_pieces'] = np.where(done, self.pieces, 0)
+            self.reset(finished)
+        return self.observation, reward, done, info
+
+    # ---------------------------------------------------------------
+    # Batched rules; `idx` is always an array of distinct env indices
+    # ---------------------------------------------------------------
+
+    def _draw(self, idx):
+        # Next piece from each env's 7-bag, refilling the empty ones
+        empty = idx[self.bag_pos[idx] >= PIECE_COUNT]
+        if empty.size:
+            self.bag[empty] = self.rng.permuted(np.tile(BAG, (empty.size, 1)), axis=1)
+            self.bag_pos[empty] = 0
+        pieces = self.bag[idx, self.bag_pos[idx]]
+        self.bag_pos[idx] += 1
+        return pieces
+
+    def _collides(self, idx, piece, rotation, x, y):
+        # x/y are (n,) positions, or (n, m) to test m positions per env
+        dx = CELL_X[piece, rotation]
+        dy = CELL_Y[piece, rotation]
+        rows = idx[:, None]
+        if x.ndim == 2:
+            dx = dx[:, None, :]
+            dy = dy[:, None, :]
+            rows = idx[:, None, None]
+        cx = x[..., None] + dx
+        cy = y[..., None] + dy
+        outside = (cx < 0) | (cx >= GRID_WIDTH) | (cy >= GRID_HEIGHT)
+        filled = self.board[rows, np.clip(cy, 0, GRID_HEIGHT - 1), np.clip(cx, 0, GRID_WIDTH - 1)] != 0
+        return (outside | (filled & (cy >= 0))).any(-1)
+
+    def _rotate(self, idx, direction):
+        piece = self.piece[idx]
+        rotation = self.rotation[idx]
+        target = (rotation + (1 if direction == 0 else -1)) % 4
+        xs = self.x[idx, None] + KICK_X[piece, rotation, direction]
+        ys = self.y[idx, None] + KICK_Y[piece, rotation, direction]
+        fits = ~self._collides(idx, piece, target, xs, ys)
+        ok = fits.any(1)
+        kick = fits.argmax(1)[ok]
+        rows = np.flatnonzero(ok)
+        turned = idx[ok]
+        self.x[turned] = xs[rows, kick]
+        self.y[turned] = ys[rows, kick]
+        self.rotation[turned] = target[ok]
+
+    def _drop_distance(self, idx):
+        distance = np.zeros(idx.size, np.int16)
+        falling = np.arange(idx.size)
+        for _ in range(GRID_HEIGHT):
+            envs = idx[falling]
+            blocked = self._collides(envs, self.piece[envs], self.rotation[envs],
+                                     self.x[envs], self.y[envs] + distance[falling] + 1)
+            falling = falling[~blocked]
+            if not falling.size:
+                break
+            distance[falling] += 1
+        return distance
+
+    def _spawn(self, idx, pieces):
+        self.piece[idx] = pieces
+        self.rotation[idx] = 0
+        self.x[idx] = SPAWN_X[pieces]
+        self.y[idx] = 0
+        self.fall[idx] = 0
+
+    def _advance_queue(self, idx):
+        # Pops the front of each queue, refilling from the bag
+        pieces = self.queue[idx, 0]
+        self.queue[idx, :-1] = self.queue[idx, 1:]
+        self.queue[idx, -1] = self._draw(idx)
+        return pieces
+
+    def _hold(self, idx):
+        held = self.hold[idx]
+        empty = held < 0
+        incoming = held.copy()
+        if empty.any():
+            incoming[empty] = self._advance_queue(idx[empty])
+        self.hold[idx] = self.piece[idx]
+        self._spawn(idx, incoming)
+        self.can_hold[idx] = False
+
+    def _lock(self, idx, reward, cleared):
+        piece = self.piece[idx]
+        rotation = self.rotation[idx]
+        cx = self.x[idx, None] + CELL_X[piece, rotation]
+        cy = self.y[idx, None] + CELL_Y[piece, rotation]
+        inside = cy >= 0  # Cells above the grid are lost, as in the engine
+        rows = np.broadcast_to(idx[:, None], cy.shape)
+        self.board[rows[inside], cy[inside], cx[inside]] = np.broadcast_to(piece[:, None] + 1, cy.shape)[inside]
+
+        # Line clears: stable-sort full rows to the top, then empty them
+        board = self.board[idx]
+        full = (board != 0).all(2)
+        lines = full.sum(1)
+        clearing = np.flatnonzero(lines)
+        if clearing.size:
+            order = np.argsort(~full[clearing], axis=1, kind='stable')
+            shifted = np.take_along_axis(board[clearing], order[:, :, None], axis=1)
+            shifted[np.arange(GRID_HEIGHT)[None, :] < lines[clearing, None]] = 0
+            self.board[idx[clearing]] = shifted
+        cleared[idx] = lines
+
+        # Scoring, as scoring.score_clear() without T-spins
+        level = self.level[idx]
+        b2b = self.b2b[idx]
+        difficult = lines == 4
+        base = LINE_POINTS[lines]
+        base = np.where(difficult & b2b, base * 3 // 2, base)
+        points = base * level
+        combo = np.where(lines > 0, self.combo[idx] + 1, -1)
+        points += np.where(combo > 0, COMBO_SCORE * combo * level, 0)
+        perfect = (lines > 0) & ~self.board[idx].any((1, 2))
+        bonus = np.where(difficult & b2b, B2B_PERFECT_TETRIS, PERFECT_POINTS[lines])
+        points += np.where(perfect, bonus * level, 0)
+        self.combo[idx] = combo
+        self.b2b[idx] = np.where(lines > 0, difficult, b2b)
+        self.lines[idx] += lines
+        self.level[idx] = np.minimum(MAX_LEVEL, 1 + self.lines[idx] // LINES_PER_LEVEL)
+        reward[idx] += points
+
+        # Lock out: blocks left in the top row end the game
+        topped = self.board[idx, 0].any(1)
+        self.game_over[idx[topped]] = True
+        idx = idx[~topped]
+        if not idx.size:
+            return
+        self._spawn(idx, self._advance_queue(idx))
+        self.can_hold[idx] = True
+        self.pieces[idx] += 1
+        blocked = self._collides(idx, self.piece[idx], self.rotation[idx], self.x[idx], self.y[idx])
+        self.game_over[idx[blocked]] = True
+
+
+if __name__ == "__main__":
+    # Random-action throughput: python vecenv.py --envs 1024 --steps 500
+    import time
+    import argparse
+    parser = argparse.ArgumentParser(description="Batched environment throughput with random actions")
+    parser.add_argument("--envs", type=int, default=1024, help="games stepped in lockstep")
+    parser.add_argument("--steps", type=int, default=500, help="steps to time")
+    args = parser.parse_args()
+    k, steps = args.envs, args.steps
+    env = VecTetris(k, seed=0)
+    rng = np.random.default_rng(0)
+    start = time.perf_counter()
+    games = 0
+    for _ in range(steps):
+        _, _, done, _ = env.step(rng.integers(0, NUM_ACTIONS, k))
+        games += int(done.sum())
+    seconds = time.perf_counter() - start
+    print(f"{k} envs x {steps} steps in {seconds:.2f}s: {k * steps / seconds:,.0f} env-steps/sec, "
+          f"{games} games finished")
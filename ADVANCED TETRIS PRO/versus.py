@@ -0,0 +1,531 @@
+import sys
+import time
+import queue
+import random
+import socket
+import struct
+import asyncio
+import argparse
+import threading
+
+from engine import GameEngine, GRID_WIDTH, TICK_RATE
+from replay import encode_varint, decode_varint
+
+# =================================================================
+# Versus play over a local relay. Every client runs its own game as
+# the authority for its board and mirrors each opponent by replaying
+# that player's input stream, so the wire only carries inputs and
+# garbage, never boards:
+#
+#   client -> relay -> every other client in the room
+#
+#   INPUT    player, upto tick, records: varint (tick_delta << 3 | code)
+#            with code 0..6 an engine action, or 7 = garbage taken,
+#            followed by varint (lines << 4 | hole)
+#   GARBAGE  from, to, lines, hole     (attack sent to one opponent)
+#   CHECK    player, tick, crc32       (board checksum every CHECK_EVERY)
+#
+# A player's clears go out as GARBAGE to a random opponent; the target
+# queues it (GameEngine.receive_garbage) and writes it into its own
+# input stream at the tick it took it, so every mirror of the target
+# raises the same garbage at the same tick.
+#
+# Sync is delay-based: a mirror only advances up to the last tick its
+# player has confirmed (`upto`), so opponents are shown a few ticks
+# behind. Mirrors compare their checksum with the one the player sent
+# for the same tick; a mismatch is a desync.
+#
+# Inputs are flushed every SEND_EVERY ticks; a player sends roughly
+# 100-300 bytes/s.
+#
+#   python versus.py relay --players 2
+#   python versus.py bot --input ai            # AI player
+#   python main.py --versus localhost:7777     # keyboard player
+#   python versus.py local --players 4         # relay + bots, one process
+# =================================================================
+
+DEFAULT_HOST = "localhost"
+DEFAULT_PORT = 7777
+SEND_EVERY = 3      # Ticks per INPUT message
+CHECK_EVERY = 60    # Ticks between checksums
+WRITE_BUFFER = 16 * 1024  # Bytes the relay buffers per player before holding back senders
+DRAIN_TIMEOUT = 5.0       # Seconds a player may stay backed up before the relay drops it
+
+# Keyboard players repeat moves themselves (see controls.py), so
+# versus games run every engine without input cooldowns
+RULES = {'move_cooldown': 0, 'rotate_cooldown': 0}
+
+MSG_HELLO = 1    # client -> relay, no body
+MSG_START = 2    # seed, players, your player number
+MSG_INPUT = 3
+MSG_GARBAGE = 4
+MSG_CHECK = 5
+MSG_DESYNC = 6   # player, tick
+MSG_LEAVE = 7    # player (sent by the relay)
+
+CODE_GARBAGE = 7
+FRAME = struct.Struct('>H')  # Length prefix of every message
+
+
+def message(kind, *values):
+    out = bytearray([kind])
+    for value in values:
+        encode_varint(value, out)
+    return bytes(out)
+
+
+def parse(data):
+    # (kind, [varints...]) for every message but INPUT
+    values = []
+    pos = 1
+    while pos < len(data):
+        value, pos = decode_varint(data, pos)
+        values.append(value)
+    return data[0], values
+
+
+class InputStream:
+    # The local player's records, as the engine's recorder
+    def __init__(self):
+        self.buffer = bytearray()
+        self.last_tick = 0
+
+    def record(self, tick, action):
+        encode_varint((tick - self.last_tick) << 3 | action, self.buffer)
+        self.last_tick = tick
+
+    def garbage(self, tick, lines, hole):
+        self.record(tick, CODE_GARBAGE)
+        encode_varint(lines << 4 | hole, self.buffer)
+
+    def flush(self, player, upto):
+        msg = bytearray([MSG_INPUT])
+        encode_varint(player, msg)
+        encode_varint(upto, msg)
+        msg += self.buffer
+        self.buffer.clear()
+        return bytes(msg)
+
+
+class Mirror:
+    # An opponent's game, re-simulated from their input stream
+    def __init__(self, player, seed):
+        self.player = player
+        self.engine = GameEngine(seed, **RULES)
+        self.records = []  # (tick, code, garbage)
+        self.next_record = 0
+        self.last_tick = 0
+        self.upto = 0
+        self.sums = {}      # tick -> our checksum
+        self.expected = {}  # tick -> theirs
+        self.desync = None
+        self.left = False
+
+    def feed(self, data, pos):
+        self.upto, pos = decode_varint(data, pos)
+        while pos < len(data):
+            value, pos = decode_varint(data, pos)
+            self.last_tick += value >> 3
+            code = value & 7
+            garbage = None
+            if code == CODE_GARBAGE:
+                value, pos = decode_varint(data, pos)
+                garbage = (value >> 4, value & 15)
+            self.records.append((self.last_tick, code, garbage))
+
+    def advance(self):
+        engine = self.engine
+        records = self.records
+        while engine.ticks < self.upto and not engine.game_over:
+            while self.next_record < len(records) and records[self.next_record][0] <= engine.ticks:
+                _, code, garbage = records[self.next_record]
+                self.next_record += 1
+                if code == CODE_GARBAGE:
+                    engine.receive_garbage(*garbage)
+                else:
+                    engine.apply(code)
+            engine.step()
+            if engine.ticks % CHECK_EVERY == 0:
+                self.sums[engine.ticks] = engine.checksum()
+                self.compare(engine.ticks)
+        del records[:self.next_record]
+        self.next_record = 0
+        engine.events.clear()
+
+    def check(self, tick, crc):
+        self.expected[tick] = crc
+        self.compare(tick)
+
+    def compare(self, tick):
+        if tick in self.sums and tick in self.expected:
+            if self.sums.pop(tick) != self.expected.pop(tick) and self.desync is None:
+                self.desync = tick
+
+    @property
+    def alive(self):
+        return not (self.engine.game_over or self.left)
+
+
+class VersusSession:
+    # One player's side of a match: the local engine, its outgoing
+    # stream and a mirror per opponent. Transport-agnostic: feed it
+    # received messages, send whatever collects in `outbox`
+    def __init__(self, player, players, seed, engine=None):
+        self.player = player
+        self.seed = seed
+        self.engine = engine or GameEngine(**RULES)
+        for key, value in RULES.items():
+            setattr(self.engine, key, value)
+        self.engine.reset(seed)
+        self.stream = InputStream()
+        self.engine.recorder = self.stream
+        self.mirrors = {p: Mirror(p, seed) for p in range(players) if p != player}
+        self.rng = random.Random(seed * 31 + player)
+        self.outbox = []
+        self.sent_upto = 0
+        self.desyncs = []
+        self.garbage_sent = 0
+        self.garbage_taken = 0
+
+    def receive(self, data):
+        kind = data[0]
+        if kind == MSG_INPUT:
+            player, pos = decode_varint(data, 1)
+            self.mirrors[player].feed(data, pos)
+            return
+        kind, values = parse(data)
+        if kind == MSG_GARBAGE:
+            sender, target, lines, hole = values
+            if target == self.player and not self.engine.game_over:
+                # Taken now, between ticks, and recorded for our mirrors
+                self.stream.garbage(self.engine.ticks, lines, hole)
+                self.engine.receive_garbage(lines, hole)
+                self.garbage_taken += lines
+        elif kind == MSG_CHECK:
+            player, tick, crc = values
+            self.mirrors[player].check(tick, crc)
+        elif kind == MSG_DESYNC:
+            player, tick = values
+            self.desyncs.append((player, tick))
+        elif kind == MSG_LEAVE:
+            self.mirrors[values[0]].left = True
+
+    def after_tick(self):
+        # Call once after every local engine.step()
+        engine = self.engine
+        if engine.attack:
+            targets = [m.player for m in self.mirrors.values() if m.alive]
+            if targets:
+                target = self.rng.choice(targets)
+                self.outbox.append(message(MSG_GARBAGE, self.player, target, engine.attack,
+                                           self.rng.randrange(GRID_WIDTH)))
+                self.garbage_sent += engine.attack
+            engine.attack = 0
+
+        if engine.ticks % SEND_EVERY == 0 or engine.game_over:
+            if engine.ticks != self.sent_upto or self.stream.buffer:
+                self.outbox.append(self.stream.flush(self.player, engine.ticks))
+                self.sent_upto = engine.ticks
+        if engine.ticks % CHECK_EVERY == 0 and not engine.game_over:
+            self.outbox.append(message(MSG_CHECK, self.player, engine.ticks, engine.checksum()))
+
+    def advance_mirrors(self):
+        for mirror in self.mirrors.values():
+            mirror.advance()
+            if mirror.desync is not None and (mirror.player, mirror.desync) not in self.desyncs:
+                self.desyncs.append((mirror.player, mirror.desync))
+                self.outbox.append(message(MSG_DESYNC, mirror.player, mirror.desync))
+
+    def drain(self):
+        out = self.outbox
+        self.outbox = []
+        return out
+
+    @property
+    def finished(self):
+        # At most one player left standing, and every mirror caught up
+        alive = [m for m in self.mirrors.values() if m.alive]
+        if not self.engine.game_over:
+            return not alive
+        return len(alive) <= 1 and all(
+            m.left or m.engine.game_over or m.engine.ticks >= m.upto for m in alive)
+
+    def winner(self):
+        if not self.engine.game_over:
+            return self.player
+        alive = [m.player for m in self.mirrors.values() if m.alive]
+        return alive[0] if len(alive) == 1 else None
+
+
+# -------------------------------------------------------------------
+# Transport: asyncio TCP, length-prefixed messages
+# -------------------------------------------------------------------
+
+async def read_message(reader):
+    header = await reader.readexactly(FRAME.size)
+    return await reader.readexactly(FRAME.unpack(header)[0])
+
+
+def frame(data):
+    return FRAME.pack(len(data)) + data
+
+
+class Relay:
+    # Groups connections into rooms of `players` in arrival order and
+    # forwards every message to the rest of the room. It never looks
+    # at game state, so one relay can host many matches
+    def __init__(self, players=2, seed=None):
+        self.players = players
+        self.rng = random.Random(seed)
+        self.waiting = []
+        self.seats = {}  # writer -> (room, player)
+        self.rooms = 0
+        self.bytes_in = 0
+
+    async def handle(self, reader, writer):
+        # Bound the kernel's send buffer too, or it soaks up megabytes
+        # before drain() ever waits
+        writer.transport.set_write_buffer_limits(WRITE_BUFFER)
+        sock = writer.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, WRITE_BUFFER)
+        try:
+            if (await read_message(reader))[0] != MSG_HELLO:
+                writer.close()
+                return
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+            return
+
+        self.waiting.append(writer)
+        if len(self.waiting) == self.players:
+            room, self.waiting = self.waiting, []
+            self.rooms += 1
+            seed = self.rng.getrandbits(63)
+            for player, member in enumerate(room):
+                self.seats[member] = (room, player)
+                member.write(frame(message(MSG_START, seed, self.players, player)))
+
+        try:
+            while True:
+                data = await read_message(reader)
+                self.bytes_in += len(data) + FRAME.size
+                if writer in self.seats:  # Clients only talk once started
+                    await self.drain(self.broadcast(writer, frame(data)))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if writer in self.waiting:
+                self.waiting.remove(writer)
+            elif writer in self.seats:
+                self.broadcast(writer, frame(message(MSG_LEAVE, self.seats[writer][1])))
+                del self.seats[writer]
+            writer.close()
+
+    def broadcast(self, sender, data):
+        # Returns the members it wrote to
+        sent = []
+        for member in self.seats[sender][0]:
+            if member is not sender and not member.is_closing():
+                member.write(data)
+                sent.append(member)
+        return sent
+
+    async def drain(self, members):
+        # Messages can't be dropped (mirrors replay every input), so a
+        # sender isn't read again until the players it wrote to are
+        # under WRITE_BUFFER. One that stays backed up DRAIN_TIMEOUT is
+        # disconnected and the rest of the room gets its LEAVE
+        for member in members:
+            try:
+                await asyncio.wait_for(member.drain(), DRAIN_TIMEOUT)
+            except asyncio.TimeoutError:
+                member.transport.abort()  # close() would wait to flush
+            except ConnectionError:
+                pass
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT, ready=None):
+        server = await asyncio.start_server(self.handle, host, port)
+        if ready is not None:
+            ready.set()
+        async with server:
+            await server.serve_forever()
+
+
+def start_relay(players=2, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    # Runs a Relay on a daemon thread; returns once it's listening
+    relay = Relay(players)
+    ready = threading.Event()
+    threading.Thread(target=lambda: asyncio.run(relay.serve(host, port, ready)),
+                     name="relay", daemon=True).start()
+    ready.wait()
+    return relay
+
+
+class VersusClient:
+    # Connection to a relay, run on its own thread so a frame-paced game
+    # loop can just poll(): received messages land in `inbox`
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        self.inbox = queue.Queue()
+        self.loop = None
+        self.writer = None
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.closed = False
+        connected = threading.Event()
+        self.thread = threading.Thread(target=lambda: asyncio.run(self._run(host, port, connected)),
+                                       name="versus", daemon=True)
+        self.thread.start()
+        connected.wait()
+        if self.writer is None:
+            raise ConnectionError(f"Can't reach a relay at {host}:{port}")
+
+    async def _run(self, host, port, connected):
+        try:
+            reader, self.writer = await asyncio.open_connection(host, port)
+        except OSError:
+            connected.set()
+            return
+        self.loop = asyncio.get_running_loop()
+        self.writer.write(frame(bytes([MSG_HELLO])))
+        connected.set()
+        try:
+            while True:
+                data = await read_message(reader)
+                self.bytes_in += len(data) + FRAME.size
+                self.inbox.put(data)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.closed = True
+            self.writer.close()
+
+    def send(self, messages):
+        data = b''.join(frame(m) for m in messages)
+        if data and not self.closed:
+            self.bytes_out += len(data)
+            self.loop.call_soon_threadsafe(self.writer.write, data)
+
+    def poll(self):
+        messages = []
+        while True:
+            try:
+                messages.append(self.inbox.get_nowait())
+            except queue.Empty:
+                return messages
+
+    def wait_start(self, timeout=None):
+        # Blocks until the room is full; returns (seed, players, player)
+        data = self.inbox.get(timeout=timeout)
+        kind, values = parse(data)
+        if kind != MSG_START:
+            raise ConnectionError(f"Expected START, got message {kind}")
+        return tuple(values)
+
+    def close(self):
+        if self.loop is not None and not self.closed:
+            self.loop.call_soon_threadsafe(self.writer.close)
+
+
+# -------------------------------------------------------------------
+# Headless players
+# -------------------------------------------------------------------
+
+def play_bot(host=DEFAULT_HOST, port=DEFAULT_PORT, input_name='ai', speed=1.0, max_ticks=60 * TICK_RATE):
+    # Plays one match with an input policy from bench.INPUTS, paced at
+    # `speed` times real time; returns a result dict
+    from bench import INPUTS
+
+    client = VersusClient(host, port)
+    seed, players, player = client.wait_start()
+    session = VersusSession(player, players, seed)
+    engine = session.engine
+    policy = INPUTS[input_name](seed * 31 + player)
+    tick = 1 / (TICK_RATE * speed) if speed else 0
+    start = next_tick = time.perf_counter()
+
+    while not session.finished and engine.ticks < max_ticks and not client.closed:
+        for data in client.poll():
+            session.receive(data)
+        if not engine.game_over:
+            action = policy(engine)
+            if action is not None:
+                engine.apply(action)
+            engine.step()
+            engine.events.clear()
+            session.after_tick()
+        session.advance_mirrors()
+        client.send(session.drain())
+
+        next_tick += tick
+        delay = next_tick - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+    # Let the last inputs reach the others before hanging up
+    session.after_tick()
+    client.send(session.drain())
+    seconds = engine.ticks / TICK_RATE
+    result = {
+        'player': player,
+        'winner': session.winner() if session.finished else None,
+        'ticks': engine.ticks,
+        'lines': engine.lines,
+        'sent': session.garbage_sent,
+        'taken': session.garbage_taken,
+        'desyncs': session.desyncs,
+        'bytes_out': client.bytes_out,
+        'bytes_per_sec': client.bytes_out / seconds if seconds else 0.0,
+        'wall': time.perf_counter() - start,
+    }
+    time.sleep(0.2)
+    client.close()
+    return result
+
+
+def local_match(players=2, input_name='ai', speed=1.0, port=DEFAULT_PORT, max_ticks=60 * TICK_RATE):
+    # Relay plus `players` bots on threads, all on localhost
+    start_relay(players, DEFAULT_HOST, port)
+    results = [None] * players
+    threads = []
+    for i in range(players):
+        def run(i=i):
+            results[i] = play_bot(DEFAULT_HOST, port, input_name, speed, max_ticks)
+        thread = threading.Thread(target=run)
+        thread.start()
+        threads.append(thread)
+        time.sleep(0.05)  # Join in order
+    for thread in threads:
+        thread.join()
+    return sorted(results, key=lambda r: r['player'])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Versus play over a local relay")
+    parser.add_argument("mode", choices=("relay", "bot", "local"))
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--players", type=int, default=2, help="players per match")
+    parser.add_argument("--input", default='ai', help="bot input policy (see bench.py)")
+    parser.add_argument("--speed", type=float, default=1.0, help="bot speed multiplier (0 = flat out)")
+    parser.add_argument("--max-seconds", type=float, default=60, help="game seconds before a bot gives up")
+    args = parser.parse_args()
+    max_ticks = int(args.max_seconds * TICK_RATE)
+
+    if args.mode == "relay":
+        print(f"Relay on {args.host}:{args.port}, {args.players} players per match")
+        asyncio.run(Relay(args.players).serve(args.host, args.port))
+        sys.exit(0)
+
+    if args.mode == "bot":
+        results = [play_bot(args.host, args.port, args.input, args.speed, max_ticks)]
+    else:
+        results = local_match(args.players, args.input, args.speed, args.port, max_ticks)
+
+    failed = False
+    for r in results:
+        print(f"player {r['player']}: winner={r['winner']} ticks={r['ticks']} lines={r['lines']} "
+              f"garbage sent={r['sent']} taken={r['taken']} "
+              f"{r['bytes_per_sec']:.0f} B/s desyncs={r['desyncs'] or 'none'}")
+        failed |= bool(r['desyncs'])
+    sys.exit(1 if failed else 0)